@@ -0,0 +1,105 @@
+"""Measure set-build and lookup throughput of candidates and requirements.
+
+The "legacy" rows use the previous identities, which hash and compare
+`str(self)` each time, to compare against.
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+from petpeeve.candidates import Candidate
+from petpeeve.requirements import Requirement
+from pip._vendor.packaging.requirements import Requirement as BaseRequirement
+
+
+class LegacyCandidate(object):
+    def __init__(self, name, version, extras=None, url=None):
+        self.name = name
+        self.extras = extras
+        self.url = url
+        self.version = version
+
+    def __str__(self):
+        parts = [self.name]
+        if self.extras:
+            parts.append('[{}]'.format(','.join(sorted(self.extras))))
+        if self.version:
+            parts.append('=={}'.format(self.version))
+        if self.url:
+            parts.append(' @ {}'.format(self.url))
+        return ''.join(parts)
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+
+class LegacyRequirement(BaseRequirement):
+    def __hash__(self):
+        return hash(str(self))
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+
+def iter_requirement_strings(count):
+    for i in range(count):
+        yield (
+            'package-{i}[extra-{e}]>={i}.0,<{j}.0,!={i}.5; '
+            'python_version >= "2.7" and sys_platform != "win{e}"'.format(
+                i=i, j=i + 1, e=i % 7,
+            )
+        )
+
+
+def iter_candidate_args(count):
+    for i in range(count):
+        yield 'package-{}'.format(i), '{}.{}'.format(i // 10, i % 10), ['x']
+
+
+def measure(label, items, repeat):
+    probes = list(items)
+    build = min(timeit.repeat(lambda: set(items), number=1, repeat=repeat))
+    pool = set(items)
+    lookup = min(timeit.repeat(
+        lambda: sum(1 for p in probes if p in pool), number=1, repeat=repeat,
+    ))
+    print('{:<20} set-build {:>10,.0f}/s  lookup {:>10,.0f}/s'.format(
+        label, len(items) / build, len(probes) / lookup,
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    options = parser.parse_args()
+
+    strings = list(iter_requirement_strings(options.count))
+    args = list(iter_candidate_args(options.count))
+
+    print('{} items'.format(options.count))
+    measure(
+        'legacy requirement',
+        [LegacyRequirement(s) for s in strings], options.repeat,
+    )
+    measure(
+        'requirement',
+        [Requirement.parse(s)[0] for s in strings], options.repeat,
+    )
+    measure(
+        'legacy candidate',
+        [LegacyCandidate(n, v, extras=e) for n, v, e in args], options.repeat,
+    )
+    measure(
+        'candidate',
+        [Candidate(n, v, extras=e) for n, v, e in args], options.repeat,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Compare a full resolve with an incremental one after a small change.
+
+A lock is made from the graph's roots, then one root gets a new lower bound
+and the requirements are resolved again, both from scratch and from the
+lock. The fake index sleeps on every request, like a real index.
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+from petpeeve.locks import Lock, resolve_incremental
+from petpeeve.requirements import Requirement
+from petpeeve.resolvers import Resolver
+
+from fake_index import FakeIndex, GRAPHS
+
+
+def _measure(graph, latency, resolve):
+    index = FakeIndex(graph, latency=latency)
+    start = time.time()
+    resolution = resolve(Resolver(index))
+    return resolution, time.time() - start, sum(index.requests.values())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('graph', nargs='?', default='forest')
+    parser.add_argument('--size', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.02)
+    options = parser.parse_args()
+
+    graph, roots = GRAPHS[options.graph](options.size)
+    requirements = [Requirement.parse(r)[0] for r in roots]
+    resolution, _, _ = _measure(
+        graph, options.latency, lambda r: r.resolve(requirements),
+    )
+    lock = Lock.from_resolution(requirements, resolution)
+
+    changed = list(requirements)
+    changed[-1] = Requirement.parse('{}>=1.0'.format(changed[-1].name))[0]
+    print('{} (size {}), {:.0f} ms per request, changed {}'.format(
+        options.graph, options.size, options.latency * 1000, changed[-1],
+    ))
+    full = _measure(graph, options.latency, lambda r: r.resolve(changed))
+    incremental = _measure(
+        graph, options.latency,
+        lambda r: resolve_incremental(r, changed, lock),
+    )
+    for label, (resolution, seconds, requests) in [
+            ('full', full), ('incremental', incremental)]:
+        print('  {:<12} {:>6.2f}s  {:>4} requests  {:>4} packages'.format(
+            label, seconds, requests, len(resolution.candidates),
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""Measure index lookups end to end, against a local fake PyPI.
+
+The server from `fake_pypi` runs in this process. Each measurement runs in a
+child process with its own cache directory. "cold" starts with an empty
+cache. "warm" runs again with the cache the cold run left behind. For each
+index flavour, the child calls `build_index(url).get_candidates` on every
+project, and `get_dependencies` on the newest `--dependency-versions` of
+each. The result is printed as JSON, to compare across versions.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:     # Windows.
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:     # Python 2.
+    tracemalloc = None
+
+import petpeeve
+
+from fake_pypi import add_repository_arguments, build_server
+
+
+FLAVOURS = [
+    ('json', '/simple'),    # build_index() picks JSONEnabledIndex.
+    ('simple', '/index'),   # build_index() picks SimpleIndex.
+]
+
+
+def _get_max_rss():
+    """Peak resident memory of this process, in bytes.
+    """
+    if resource is None:
+        return None
+    value = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return value
+    return value * 1024
+
+
+def _measure(func, items, workers):
+    start = time.time()
+    results, errors = [], 0
+    for result in func(items, max_workers=workers):
+        if result.error is not None:
+            errors += 1
+        else:
+            results.append(result.result)
+    elapsed = time.time() - start
+    return results, {
+        'count': len(items),
+        'errors': errors,
+        'seconds': elapsed,
+        'per_second': len(items) / elapsed if elapsed else None,
+    }
+
+
+def run_worker(config):
+    """Run the workload, in the child process, and report as a dict.
+    """
+    from petpeeve.caches import get_default_cache
+    from petpeeve.indexes import build_index
+    from petpeeve.requirements import Requirement
+
+    if config['tracemalloc'] and tracemalloc is not None:
+        tracemalloc.start()
+    start = time.time()
+    index = build_index(config['url'])
+    requirements = [
+        Requirement.parse('proj-{}'.format(i))[0]
+        for i in range(config['projects'])
+    ]
+    found, candidates_result = _measure(
+        index.get_candidates_many, requirements, config['workers'],
+    )
+    candidates = [
+        candidate
+        for result in found
+        for candidate in result[:config['dependency_versions']]
+    ]
+    _, dependencies_result = _measure(
+        index.get_dependencies_many, candidates, config['workers'],
+    )
+    report = {
+        'seconds': time.time() - start,
+        'get_candidates': candidates_result,
+        'get_dependencies': dependencies_result,
+        'http_cache': get_default_cache().get_statistics(),
+        'max_rss_bytes': _get_max_rss(),
+        'traced_peak_bytes': None,
+    }
+    if config['tracemalloc'] and tracemalloc is not None:
+        report['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+    return report
+
+
+def run_child(config, cache_dir):
+    env = dict(os.environ, HOME=cache_dir, XDG_CACHE_HOME=cache_dir)
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), '--worker',
+         json.dumps(config)],
+        env=env,
+    )
+    return json.loads(output.decode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_repository_arguments(parser)
+    parser.add_argument('--dependency-versions', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--flavours', default='json,simple')
+    parser.add_argument('--tracemalloc', action='store_true')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.worker:
+        json.dump(run_worker(json.loads(options.worker)), sys.stdout)
+        return
+
+    flavours = options.flavours.split(',')
+    results = []
+    with build_server(options) as server:
+        for flavour, path in FLAVOURS:
+            if flavour not in flavours:
+                continue
+            config = {
+                'url': server.url + path,
+                'projects': options.projects,
+                'dependency_versions': options.dependency_versions,
+                'workers': options.workers,
+                'tracemalloc': options.tracemalloc,
+            }
+            cache_dir = tempfile.mkdtemp()
+            try:
+                for cache in ('cold', 'warm'):
+                    server.statistics.reset()
+                    report = run_child(config, cache_dir)
+                    report.update(server.statistics.as_dict())
+                    report.update({'index': flavour, 'cache': cache})
+                    results.append(report)
+                    print('{:<6} {:<4} {:>7.2f}s {:>6} requests {:>11} bytes'
+                          .format(flavour, cache, report['seconds'],
+                                  report['requests'], report['bytes']),
+                          file=sys.stderr)
+            finally:
+                shutil.rmtree(cache_dir)
+
+    document = {
+        'petpeeve': petpeeve.__version__,
+        'python': platform.python_version(),
+        'platform': sys.platform,
+        'parameters': {
+            name: value for name, value in vars(options).items()
+            if name not in ('output', 'worker')
+        },
+        'results': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+    else:
+        json.dump(document, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+
+if __name__ == '__main__':
+    main()
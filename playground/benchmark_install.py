@@ -0,0 +1,120 @@
+"""Measure installing many wheels serially and in parallel.
+
+Wheels are generated into a temporary directory, each with a package of
+`--modules` Python files, and installed from there into fresh prefixes.
+Fetching each wheel sleeps `--latency` seconds, like a download would.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+from petpeeve.candidates import Candidate
+from petpeeve.installs import Installer, get_scheme
+from pip._vendor.distlib.wheel import Wheel
+
+
+MODULE_SOURCE = '''
+import collections
+
+
+class Thing{i}(object):
+    def __init__(self, value):
+        self.value = value
+
+    def double(self):
+        return [self.value] * 2
+
+
+def make_things(count):
+    return collections.deque(Thing{i}(n) for n in range(count))
+'''
+
+
+class LocalWheel(object):
+    def __init__(self, path, latency):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.latency = latency
+
+    def as_wheel(self, offline=False, transport=None):
+        time.sleep(self.latency)
+        return Wheel(self.path)
+
+
+class LocalIndex(object):
+    """Serve generated wheels to the installer, without a cache.
+    """
+    transport = None
+
+    def __init__(self, paths, latency):
+        self.paths = paths
+        self.latency = latency
+
+    def get_install_link(self, candidate):
+        return LocalWheel(self.paths[candidate.name], self.latency)
+
+
+def make_wheel(directory, name, modules):
+    path = os.path.join(directory, '{}-1.0-py2.py3-none-any.whl'.format(name))
+    dist_info = '{}-1.0.dist-info'.format(name)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('{}/__init__.py'.format(name), '')
+        for i in range(modules):
+            zf.writestr(
+                '{}/module_{}.py'.format(name, i),
+                MODULE_SOURCE.format(i=i) * 20,
+            )
+        zf.writestr(dist_info + '/METADATA', (
+            'Metadata-Version: 2.1\nName: {}\nVersion: 1.0\n'.format(name)
+        ))
+        zf.writestr(dist_info + '/WHEEL', (
+            'Wheel-Version: 1.0\nRoot-Is-Purelib: true\n'
+            'Tag: py2-none-any\nTag: py3-none-any\n'
+        ))
+        zf.writestr(dist_info + '/RECORD', '')
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--wheels', type=int, default=200)
+    parser.add_argument('--modules', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--latency', type=float, default=0.05)
+    options = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = {}
+        for i in range(options.wheels):
+            name = 'package_{}'.format(i)
+            paths[name] = make_wheel(directory, name, options.modules)
+        index = LocalIndex(paths, options.latency)
+        candidates = [Candidate(name, '1.0') for name in sorted(paths)]
+        print('{} wheels of {} modules, {:.0f} ms to fetch each'.format(
+            options.wheels, options.modules, options.latency * 1000,
+        ))
+        for label, workers, processes in [
+                ('serial', 1, 1),
+                ('parallel', options.workers, options.processes)]:
+            prefix = os.path.join(directory, label)
+            installer = Installer(
+                index, scheme=get_scheme(prefix),
+                workers=workers, processes=processes,
+            )
+            start = time.time()
+            installer.install(candidates)
+            print('  {:<9} {:>6.2f}s'.format(label, time.time() - start))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
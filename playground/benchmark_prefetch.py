@@ -0,0 +1,49 @@
+"""Measure resolution wall time with speculative prefetching.
+
+The fake index sleeps on every request, so the time is mostly spent waiting,
+like it would be on a real index.
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+from petpeeve.requirements import Requirement
+from petpeeve.resolvers import Resolver
+
+from fake_index import FakeIndex, GRAPHS
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('graph', nargs='?', default='layered')
+    parser.add_argument('--size', type=int, default=6)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--depths', default='0,1,2,3')
+    parser.add_argument('--workers', type=int, default=8)
+    options = parser.parse_args()
+
+    graph, roots = GRAPHS[options.graph](options.size)
+    requirements = [Requirement.parse(r)[0] for r in roots]
+    print('{} (size {}), {:.0f} ms per request'.format(
+        options.graph, options.size, options.latency * 1000,
+    ))
+    for depth in (int(d) for d in options.depths.split(',')):
+        index = FakeIndex(graph, latency=options.latency)
+        resolver = Resolver(
+            index, prefetch_depth=depth, prefetch_workers=options.workers,
+        )
+        start = time.time()
+        stats = resolver.resolve(requirements).statistics
+        print(
+            '  depth {}: {:>6.2f}s  {:>4} requests  '
+            '{:>4} prefetched  {:>4} used'.format(
+                depth, time.time() - start, sum(index.requests.values()),
+                stats.prefetched, stats.prefetch_hits,
+            ),
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Measure Requirement.parse on repeating requires_dist strings.
+
+Each package version usually declares the same dependencies as the one
+before it, so a large resolution parses the same strings over and over.
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+from petpeeve.requirements import Requirement
+
+
+REQUIRES_DIST = [
+    'chardet (<3.1.0,>=3.0.2)',
+    'idna (<2.8,>=2.5)',
+    'urllib3 (<1.24,>=1.21.1)',
+    'certifi (>=2017.4.17)',
+    "pyOpenSSL (>=0.14); extra == 'security'",
+    "cryptography (>=1.3.4); extra == 'security'",
+    "PySocks (!=1.5.7,>=1.5.6); extra == 'socks'",
+    ('win-inet-pton; sys_platform == "win32" and '
+     'python_version == "2.7" and extra == \'socks\''),
+]
+
+
+def parse_all(parse, strings):
+    for s in strings:
+        parse(s)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--versions', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    options = parser.parse_args()
+
+    strings = REQUIRES_DIST * options.versions
+    uncached = getattr(Requirement.parse, '__wrapped__', None)
+    rows = [('cached', Requirement.parse)]
+    if uncached is not None:
+        rows.insert(0, ('uncached', lambda s: uncached(Requirement, s)))
+
+    print('{} strings'.format(len(strings)))
+    for name, parse in rows:
+        best = min(timeit.repeat(
+            lambda: parse_all(parse, strings), number=1,
+            repeat=options.repeat,
+        ))
+        print('{:>8}: {:10,.0f} parses/s'.format(name, len(strings) / best))
+
+
+if __name__ == '__main__':
+    main()
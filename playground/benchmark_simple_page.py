@@ -0,0 +1,96 @@
+"""Compare HTML and JSON (PEP 691) simple page parsing on a large page.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import timeit
+
+from petpeeve.indexes.simpleapi import (
+    SIMPLE_API_JSON_CONTENT_TYPE, _parse_package_page,
+)
+from pip._vendor import requests
+from pip._vendor.requests.structures import CaseInsensitiveDict
+
+
+PAGE_URL = 'https://example.com/simple/bigpackage/'
+
+FILE_URL = 'https://files.example.com/packages/{h}/{fn}'
+
+
+def iter_files(count):
+    for i in range(count):
+        version = '{}.{}.{}'.format(i // 100, (i // 10) % 10, i % 10)
+        if i % 2:
+            fn = 'bigpackage-{}-py2.py3-none-any.whl'.format(version)
+        else:
+            fn = 'bigpackage-{}.tar.gz'.format(version)
+        yield {
+            'filename': fn,
+            'url': FILE_URL.format(h='{:064x}'.format(i), fn=fn),
+            'hashes': {'sha256': '{:064x}'.format(i)},
+            'requires-python': '>=2.7,!=3.0.*',
+            'core-metadata': {'sha256': '{:064x}'.format(i + 1)},
+        }
+
+
+def build_html(files):
+    anchors = [
+        '<a href="{url}#sha256={sha256}" data-requires-python="{rp}" '
+        'data-core-metadata="sha256={meta}">{fn}</a><br/>'.format(
+            url=f['url'], sha256=f['hashes']['sha256'],
+            rp=f['requires-python'].replace('>', '&gt;'),
+            meta=f['core-metadata']['sha256'], fn=f['filename'],
+        )
+        for f in files
+    ]
+    return '<html><body>\n{}\n</body></html>'.format('\n'.join(anchors))
+
+
+def build_json(files):
+    return json.dumps({
+        'meta': {'api-version': '1.0'},
+        'name': 'bigpackage',
+        'files': files,
+    })
+
+
+def build_response(content, content_type):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = PAGE_URL
+    response.encoding = 'utf-8'
+    response.headers = CaseInsensitiveDict({'Content-Type': content_type})
+    response._content = content.encode('utf-8')
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    options = parser.parse_args()
+
+    files = list(iter_files(options.files))
+    responses = [
+        ('html', build_response(build_html(files), 'text/html')),
+        ('json', build_response(
+            build_json(files), SIMPLE_API_JSON_CONTENT_TYPE,
+        )),
+    ]
+    print('{} files on the page'.format(options.files))
+    for name, response in responses:
+        links = _parse_package_page('bigpackage', PAGE_URL, response)
+        assert len(links) == options.files, (name, len(links))
+        best = min(timeit.repeat(
+            lambda: _parse_package_page('bigpackage', PAGE_URL, response),
+            number=1, repeat=options.repeat,
+        ))
+        print('{:>4}: {:8.1f} ms  ({:,} bytes)'.format(
+            name, best * 1000, len(response.content),
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Compare resolving for each environment separately with one universal run.
+
+The fake index sleeps on every request, like a real index.
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+from petpeeve.environments import MarkerEnvironment
+from petpeeve.requirements import Requirement
+from petpeeve.resolvers import Resolver
+
+from fake_index import FakeIndex, GRAPHS
+
+
+DEFAULT_ENVIRONMENTS = ','.join(
+    '{}-{}'.format(platform, python)
+    for platform in ('linux', 'macos', 'windows')
+    for python in ('2.7', '3.6', '3.7')
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('graph', nargs='?', default='cross-platform')
+    parser.add_argument('--size', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--environments', default=DEFAULT_ENVIRONMENTS)
+    options = parser.parse_args()
+
+    graph, roots = GRAPHS[options.graph](options.size)
+    requirements = [Requirement.parse(r)[0] for r in roots]
+    environments = [
+        MarkerEnvironment.parse(name)
+        for name in options.environments.split(',')
+    ]
+    print('{} (size {}), {:.0f} ms per request, {} environments'.format(
+        options.graph, options.size, options.latency * 1000,
+        len(environments),
+    ))
+
+    index = FakeIndex(graph, latency=options.latency)
+    start = time.time()
+    for environment in environments:
+        Resolver(index, environment=environment).resolve(requirements)
+    print('  separate   {:>6.2f}s  {:>4} requests'.format(
+        time.time() - start, sum(index.requests.values()),
+    ))
+
+    index = FakeIndex(graph, latency=options.latency)
+    start = time.time()
+    universal = Resolver(index).resolve_universal(requirements, environments)
+    print('  universal  {:>6.2f}s  {:>4} requests  {:>4} pins'.format(
+        time.time() - start, sum(index.requests.values()),
+        len(list(universal.iter_pins())),
+    ))
+
+    index = FakeIndex(graph, latency=options.latency)
+    start = time.time()
+    Resolver(index, environment=environments[0]).resolve(requirements)
+    print('  one        {:>6.2f}s  {:>4} requests'.format(
+        time.time() - start, sum(index.requests.values()),
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""An in-memory index, and dependency graphs that are hard to resolve.
+
+A graph maps each name to `{version: [requirement, ...]}`, with requirements
+written like Requires-Dist entries.
+"""
+
+import threading
+import time
+
+from petpeeve.candidates import Candidate
+from petpeeve.requirements import RequirementSpecification
+from petpeeve.versions import VersionIndex
+from pip._vendor.packaging.utils import canonicalize_name
+from pip._vendor.packaging.version import parse as parse_version
+
+
+class FakeIndex(object):
+    """Serve a dependency graph with the index API the resolver uses.
+
+    Each call sleeps `latency` seconds, like a request to a real index.
+    `requests` counts how many times each method was called.
+    """
+    def __init__(self, graph, latency=0):
+        self.graph = {
+            canonicalize_name(name): {
+                parse_version(v): list(deps) for v, deps in versions.items()
+            }
+            for name, versions in graph.items()
+        }
+        self._version_indexes = {
+            name: VersionIndex(versions)
+            for name, versions in self.graph.items()
+        }
+        self.latency = latency
+        self.requests = {'candidates': 0, 'specifications': 0}
+        self._lock = threading.Lock()
+
+    def _request(self, kind):
+        with self._lock:
+            self.requests[kind] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def iter_candidates(self, requirement, prereleases=False):
+        self._request('candidates')
+        name = canonicalize_name(requirement.name)
+        versions = self._version_indexes.get(name, VersionIndex([]))
+        for version in versions.iter_matching(
+                requirement.specifier, prereleases):
+            yield Candidate.from_requirement(requirement, version)
+
+    def get_candidates(self, requirement):
+        return list(self.iter_candidates(requirement, None))
+
+    def get_specification(self, candidate, offline=False):
+        self._request('specifications')
+        versions = self.graph[canonicalize_name(candidate.name)]
+        return RequirementSpecification.from_data(versions[candidate.version])
+
+    def get_dependencies(self, candidate, offline=False):
+        spec = self.get_specification(candidate, offline=offline)
+        return spec.get_dependencies(candidate.extras)
+
+    def get_hashes(self, candidate):
+        return []
+
+
+def pinning_storm(count):
+    """Every boto3 pins its botocore, and the CLI pins an old one.
+
+    Only the oldest boto3 works with the CLI. The newest versions all look
+    fine until botocore is reached.
+    """
+    graph = {'boto3': {}, 'botocore': {}, 'awscli': {}, 's3transfer': {}}
+    for i in range(count):
+        version = '1.{}'.format(i)
+        graph['botocore'][version] = []
+        graph['boto3'][version] = [
+            'botocore=={}'.format(version), 's3transfer>=0.1',
+        ]
+    graph['s3transfer']['0.1'] = ['botocore>=1.0']
+    graph['awscli']['1.0'] = ['botocore==1.0', 's3transfer']
+    return graph, ['boto3', 'awscli']
+
+
+def late_conflict(width, choices):
+    """A conflict found only after deciding many unrelated packages.
+
+    The root needs `width` unrelated packages with `choices` versions each,
+    and `trap`, whose only dependency chain ends in something the root
+    forbids. Chronological backtracking tries every combination of the
+    unrelated packages before blaming `trap`.
+    """
+    graph = {
+        'trap': {'1.0': ['chain-1']},
+        'chain-1': {'1.0': ['chain-2']},
+        'chain-2': {'1.0': ['bottom>=2']},
+        'bottom': {'1.0': [], '2.0': []},
+    }
+    roots = []
+    for i in range(width):
+        name = 'wide-{}'.format(i)
+        graph[name] = {'{}.0'.format(v): [] for v in range(1, choices + 1)}
+        roots.append(name)
+    return graph, roots + ['trap', 'bottom<2']
+
+
+def backjump(count):
+    """Only the oldest `a` works, found after a long detour through `b`.
+
+    Every other version of `a` depends on a `c` that `b` rejects.
+    """
+    graph = {'a': {}, 'b': {}, 'c': {}}
+    for i in range(1, count + 1):
+        graph['c']['{}.0'.format(i)] = []
+        if i == 1:
+            graph['a']['1.0'] = ['c']
+        else:
+            graph['a']['{}.0'.format(i)] = ['c=={}.0'.format(i)]
+        graph['b']['{}.0'.format(i)] = ['c<2']
+    return graph, ['a', 'b']
+
+
+def extras_diamond(count):
+    """Extras pulling in conflicting ranges of a shared dependency.
+    """
+    graph = {'app': {}, 'lib': {}, 'shared': {}}
+    for i in range(1, count + 1):
+        graph['shared']['{}.0'.format(i)] = []
+        graph['lib']['{}.0'.format(i)] = [
+            'shared>={}.0'.format(i),
+            'shared<{}.0; extra == "legacy"'.format(count - i + 2),
+        ]
+    graph['app']['1.0'] = ['lib[legacy]', 'shared>={}.0'.format(count // 2)]
+    return graph, ['app']
+
+
+def layered(depth, width=4, choices=5):
+    """Layers of packages, each depending on two of the next layer.
+    """
+    graph = {}
+    for layer in range(depth):
+        for i in range(width):
+            deps = []
+            if layer + 1 < depth:
+                deps = [
+                    'layer-{}-{}>=1.0'.format(layer + 1, (i + k) % width)
+                    for k in range(2)
+                ]
+            graph['layer-{}-{}'.format(layer, i)] = {
+                '{}.0'.format(v): deps for v in range(1, choices + 1)
+            }
+    return graph, ['layer-0-{}'.format(i) for i in range(width)]
+
+
+def forest(count, depth=4, choices=5):
+    """Independent chains of packages, one root each.
+    """
+    graph = {}
+    for tree in range(count):
+        for level in range(depth):
+            deps = []
+            if level + 1 < depth:
+                deps = ['tree-{}-{}'.format(tree, level + 1)]
+            graph['tree-{}-{}'.format(tree, level)] = {
+                '{}.0'.format(v): deps for v in range(1, choices + 1)
+            }
+    return graph, ['tree-{}-0'.format(tree) for tree in range(count)]
+
+
+def cross_platform(count, choices=5):
+    """Packages with dependencies that depend on the platform and Python.
+
+    Each package needs a shared core, a backport on Python 2, and a
+    platform-specific helper. The newest core needs Python 3, so Python 2
+    gets an older one.
+    """
+    graph = {
+        'core': {'{}.0'.format(v): [] for v in range(1, choices + 1)},
+        'backport': {'1.0': []},
+        'win-helper': {'1.0': []},
+        'posix-helper': {'1.0': []},
+    }
+    for i in range(count):
+        graph['pkg-{}'.format(i)] = {
+            '{}.0'.format(v): [
+                'core',
+                'core<{}.0; python_version < "3"'.format(choices),
+                'backport; python_version < "3"',
+                'win-helper; sys_platform == "win32"',
+                'posix-helper; sys_platform != "win32"',
+            ]
+            for v in range(1, choices + 1)
+        }
+    return graph, ['pkg-{}'.format(i) for i in range(count)]
+
+
+GRAPHS = {
+    'pinning-storm': lambda size: pinning_storm(size),
+    'late-conflict': lambda size: late_conflict(size, 3),
+    'backjump': lambda size: backjump(size),
+    'extras-diamond': lambda size: extras_diamond(size),
+    'layered': lambda size: layered(size),
+    'forest': lambda size: forest(size),
+    'cross-platform': lambda size: cross_platform(size),
+}
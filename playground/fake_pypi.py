@@ -0,0 +1,478 @@
+"""A local stand-in for PyPI, serving a generated repository over HTTP.
+
+Projects are named "proj-0", "proj-1", and so on. Each version depends on
+`fanout` projects with higher numbers, so the graph has no cycles. Every
+version has a wheel, padded to about `size` bytes, and some have an sdist
+with static PKG-INFO (Metadata 2.2).
+
+Served like PyPI:
+
+* /simple/<name>/ (HTML, or PEP 691 JSON if asked for), also at
+  /index/<name>/, which `build_index()` treats as a simple-only index.
+* /pypi/<name>/json and /pypi/<name>/<version>/json.
+* /files/<filename>, with range requests, and /files/<filename>.metadata
+  (PEP 658) unless disabled.
+
+Run this file to serve a repository for manual testing.
+"""
+
+from __future__ import print_function
+
+import argparse
+import binascii
+import hashlib
+import io
+import json
+import random
+import tarfile
+import threading
+import time
+import zipfile
+
+from pip._vendor.six.moves import BaseHTTPServer, socketserver
+from pip._vendor.six.moves.urllib_parse import urlsplit
+
+
+SIMPLE_JSON_CONTENT_TYPE = 'application/vnd.pypi.simple.v1+json'
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _padding(seed, size):
+    """Incompressible bytes, the same for the same seed.
+    """
+    if not size:
+        return b''
+    bits = random.Random(seed).getrandbits(8 * size)
+    return binascii.unhexlify('{:0{}x}'.format(bits, 2 * size))
+
+
+class Release(object):
+    def __init__(self, name, version, requires_dist, has_sdist):
+        self.name = name
+        self.version = version
+        self.requires_dist = requires_dist
+        self.has_sdist = has_sdist
+
+    @property
+    def stem(self):
+        return '{}-{}'.format(self.name.replace('-', '_'), self.version)
+
+    @property
+    def wheel_filename(self):
+        return self.stem + '-py2.py3-none-any.whl'
+
+    @property
+    def sdist_filename(self):
+        return '{}-{}.tar.gz'.format(self.name, self.version)
+
+    @property
+    def filenames(self):
+        if self.has_sdist:
+            return [self.wheel_filename, self.sdist_filename]
+        return [self.wheel_filename]
+
+    def get_metadata(self, metadata_version='2.1'):
+        lines = [
+            'Metadata-Version: {}'.format(metadata_version),
+            'Name: {}'.format(self.name),
+            'Version: {}'.format(self.version),
+        ]
+        lines.extend('Requires-Dist: {}'.format(r) for r in self.requires_dist)
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _build_wheel(release, size):
+    dist_info = release.stem + '.dist-info'
+    package = release.name.replace('-', '_')
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_STORED) as zf:
+        zf.writestr('{}/__init__.py'.format(package), '')
+        zf.writestr(
+            '{}/_data.bin'.format(package),
+            _padding(release.wheel_filename, size),
+        )
+        zf.writestr(dist_info + '/METADATA', release.get_metadata())
+        zf.writestr(dist_info + '/WHEEL', (
+            'Wheel-Version: 1.0\nRoot-Is-Purelib: true\n'
+            'Tag: py2-none-any\nTag: py3-none-any\n'
+        ))
+        zf.writestr(dist_info + '/RECORD', '')
+    return buf.getvalue()
+
+
+def _add_tar_member(tf, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = 0
+    tf.addfile(info, io.BytesIO(data))
+
+
+def _build_sdist(release, size):
+    top = '{}-{}'.format(release.name, release.version)
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w:gz') as tf:
+        _add_tar_member(tf, top + '/PKG-INFO', release.get_metadata('2.2'))
+        _add_tar_member(tf, top + '/setup.py', (
+            'from setuptools import setup\nsetup()\n'
+        ).encode('ascii'))
+        _add_tar_member(
+            tf, top + '/data.bin', _padding(release.sdist_filename, size),
+        )
+    return buf.getvalue()
+
+
+class Repository(object):
+    """A generated set of projects, and their files.
+
+    `count` projects have `versions` versions each. Each version depends on
+    up to `fanout` other projects. `size` is the padding put into each
+    artifact, and `sdists` the fraction of versions that also have an sdist.
+    All files are built up front, so serving them costs the same in every
+    run.
+    """
+    def __init__(self, count=100, versions=5, fanout=3, size=64 * 1024,
+                 sdists=0.2, seed=0):
+        self.size = size
+        self.projects = {}
+        rng = random.Random(seed)
+        for i in range(count):
+            name = 'proj-{}'.format(i)
+            dependees = rng.sample(
+                range(i + 1, count), min(fanout, count - i - 1),
+            )
+            releases = []
+            for v in range(versions):
+                requires_dist = [
+                    'proj-{}>=1.{}'.format(d, rng.randrange(versions))
+                    for d in sorted(dependees)
+                ]
+                releases.append(Release(
+                    name, '1.{}'.format(v), requires_dist,
+                    has_sdist=(rng.random() < sdists),
+                ))
+            self.projects[name] = releases
+        self._releases = {}
+        self._files = {}
+        self._hashes = {}
+        for releases in self.projects.values():
+            for release in releases:
+                self._releases[release.wheel_filename] = release
+                self._add_file(
+                    release.wheel_filename, _build_wheel(release, size),
+                )
+                if release.has_sdist:
+                    self._releases[release.sdist_filename] = release
+                    self._add_file(
+                        release.sdist_filename, _build_sdist(release, size),
+                    )
+
+    def _add_file(self, filename, data):
+        self._files[filename] = data
+        self._hashes[filename] = _sha256(data)
+
+    def __len__(self):
+        return len(self.projects)
+
+    def find_release(self, filename):
+        return self._releases.get(filename)
+
+    def get_file(self, filename):
+        """Get the content of a file, or `None` if there is no such file.
+        """
+        return self._files.get(filename)
+
+    def get_hash(self, filename):
+        """Get the SHA-256 hex digest of a file.
+        """
+        return self._hashes[filename]
+
+
+class Statistics(object):
+    """Requests served and bytes sent, by kind of request.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}
+            self.bytes = {}
+
+    def add(self, kind, size):
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+            self.bytes[kind] = self.bytes.get(kind, 0) + size
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'requests': sum(self.requests.values()),
+                'bytes': sum(self.bytes.values()),
+                'requests_by_kind': dict(self.requests),
+                'bytes_by_kind': dict(self.bytes),
+            }
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, kind, body, content_type, status=200, headers=()):
+        etag = '"{}"'.format(_sha256(body)[:16])
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            status, body = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header(
+            'Cache-Control', 'max-age={}'.format(self.server.max_age),
+        )
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.statistics.add(kind, len(body))
+
+    def _not_found(self):
+        self._send('not-found', b'Not Found', 'text/plain', status=404)
+
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        parts = [p for p in urlsplit(self.path).path.split('/') if p]
+        if len(parts) == 2 and parts[0] in ('simple', 'index'):
+            self._serve_simple(parts[1])
+        elif len(parts) in (3, 4) and parts[0] == 'pypi' and \
+                parts[-1] == 'json':
+            self._serve_json(*parts[1:-1])
+        elif len(parts) == 2 and parts[0] == 'files':
+            self._serve_file(parts[1])
+        else:
+            self._not_found()
+
+    def _iter_files(self, name):
+        repository = self.server.repository
+        for release in repository.projects[name]:
+            for filename in release.filenames:
+                yield release, filename, repository.get_hash(filename)
+
+    def _serve_simple(self, name):
+        if name not in self.server.repository.projects:
+            return self._not_found()
+        accept = self.headers.get('Accept', '')
+        metadata_files = self.server.metadata_files
+        if SIMPLE_JSON_CONTENT_TYPE in accept and self.server.simple_json:
+            files = []
+            for release, filename, digest in self._iter_files(name):
+                metadata = False
+                if metadata_files and filename.endswith('.whl'):
+                    metadata = {'sha256': _sha256(release.get_metadata())}
+                files.append({
+                    'filename': filename,
+                    'url': '../../files/{}'.format(filename),
+                    'hashes': {'sha256': digest},
+                    'core-metadata': metadata,
+                })
+            body = json.dumps({
+                'meta': {'api-version': '1.0'}, 'name': name, 'files': files,
+            }).encode('utf-8')
+            return self._send('simple', body, SIMPLE_JSON_CONTENT_TYPE)
+        anchors = []
+        for release, filename, digest in self._iter_files(name):
+            metadata = ''
+            if metadata_files and filename.endswith('.whl'):
+                metadata = ' data-core-metadata="sha256={}"'.format(
+                    _sha256(release.get_metadata()),
+                )
+            anchors.append(
+                '<a href="../../files/{0}#sha256={1}"{2}>{0}</a><br>'.format(
+                    filename, digest, metadata,
+                ),
+            )
+        body = '<html><body>\n{}\n</body></html>\n'.format('\n'.join(anchors))
+        self._send('simple', body.encode('utf-8'), 'text/html')
+
+    def _get_urls(self, release):
+        repository = self.server.repository
+        urls = []
+        for filename in release.filenames:
+            data = repository.get_file(filename)
+            urls.append({
+                'filename': filename,
+                'url': '/files/{}'.format(filename),
+                'digests': {'sha256': repository.get_hash(filename)},
+                'packagetype': (
+                    'bdist_wheel' if filename.endswith('.whl') else 'sdist'
+                ),
+                'size': len(data),
+                'requires_python': None,
+                'yanked': False,
+            })
+        return urls
+
+    def _get_info(self, release):
+        return {
+            'name': release.name,
+            'version': release.version,
+            'requires_dist': release.requires_dist or None,
+            'requires_python': None,
+        }
+
+    def _serve_json(self, name, version=None):
+        releases = self.server.repository.projects.get(name)
+        if releases is None:
+            return self._not_found()
+        if version is None:
+            data = {
+                'info': self._get_info(releases[-1]),
+                'releases': {
+                    r.version: self._get_urls(r) for r in releases
+                },
+                'urls': self._get_urls(releases[-1]),
+            }
+        else:
+            matched = [r for r in releases if r.version == version]
+            if not matched:
+                return self._not_found()
+            data = {
+                'info': self._get_info(matched[0]),
+                'urls': self._get_urls(matched[0]),
+            }
+        body = json.dumps(data).encode('utf-8')
+        self._send('json', body, 'application/json')
+
+    def _serve_file(self, filename):
+        repository = self.server.repository
+        if filename.endswith('.metadata') and self.server.metadata_files:
+            release = repository.find_release(filename[:-len('.metadata')])
+            if release is None:
+                return self._not_found()
+            return self._send(
+                'metadata', release.get_metadata(), 'text/plain',
+            )
+        data = repository.get_file(filename)
+        if data is None:
+            return self._not_found()
+        content_range = self._parse_range(len(data))
+        if content_range is None:
+            return self._send('file', data, 'application/octet-stream')
+        start, end = content_range
+        self._send(
+            'file-range', data[start:end + 1], 'application/octet-stream',
+            status=206, headers=[('Content-Range', 'bytes {}-{}/{}'.format(
+                start, end, len(data),
+            ))],
+        )
+
+    def _parse_range(self, length):
+        """Parse a single "bytes=" range into inclusive `(start, end)`.
+        """
+        value = self.headers.get('Range', '')
+        if not value.startswith('bytes=') or ',' in value:
+            return None
+        first, _, last = value[len('bytes='):].partition('-')
+        try:
+            if not first:
+                start, end = max(0, length - int(last)), length - 1
+            else:
+                start = int(first)
+                end = min(int(last), length - 1) if last else length - 1
+        except ValueError:
+            return None
+        if start > end:
+            return None
+        return start, end
+
+
+class FakePyPI(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Serve a `Repository` on localhost, in a background thread.
+
+    Each request sleeps `latency` seconds first. Responses may be cached
+    for `max_age` seconds. `metadata_files` and `simple_json` turn PEP 658
+    metadata files and PEP 691 JSON pages on and off.
+    """
+    daemon_threads = True
+
+    def __init__(self, repository, port=0, latency=0, max_age=600,
+                 metadata_files=True, simple_json=True):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', port), Handler)
+        self.repository = repository
+        self.latency = latency
+        self.max_age = max_age
+        self.metadata_files = metadata_files
+        self.simple_json = simple_json
+        self.statistics = Statistics()
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+
+def add_repository_arguments(parser):
+    parser.add_argument('--projects', type=int, default=100)
+    parser.add_argument('--versions', type=int, default=5)
+    parser.add_argument('--fanout', type=int, default=3)
+    parser.add_argument('--size', type=int, default=64 * 1024)
+    parser.add_argument('--sdists', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--max-age', type=int, default=600)
+    parser.add_argument(
+        '--no-metadata-files', dest='metadata_files', action='store_false',
+    )
+    parser.add_argument(
+        '--no-simple-json', dest='simple_json', action='store_false',
+    )
+
+
+def build_server(options, port=0):
+    repository = Repository(
+        count=options.projects, versions=options.versions,
+        fanout=options.fanout, size=options.size, sdists=options.sdists,
+        seed=options.seed,
+    )
+    return FakePyPI(
+        repository, port=port, latency=options.latency,
+        max_age=options.max_age, metadata_files=options.metadata_files,
+        simple_json=options.simple_json,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    add_repository_arguments(parser)
+    options = parser.parse_args()
+    with build_server(options, port=options.port) as server:
+        print('Serving {} projects at {}/simple'.format(
+            len(server.repository), server.url,
+        ))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
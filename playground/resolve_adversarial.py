@@ -0,0 +1,115 @@
+"""Resolve adversarial graphs, and compare with chronological backtracking.
+
+The baseline resolver walks packages depth first, and on a conflict goes
+back to the most recent decision. It gives up after `--max-states`.
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+from petpeeve.requirements import Requirement
+from petpeeve.resolvers import Resolver, ResolutionImpossible
+from pip._vendor.packaging.utils import canonicalize_name
+
+from fake_index import FakeIndex, GRAPHS
+
+
+class TooManyStates(Exception):
+    pass
+
+
+class ChronologicalResolver(object):
+    def __init__(self, index, max_states):
+        self.index = index
+        self.max_states = max_states
+        self.states = 0
+        self.backtracks = 0
+
+    def _candidates(self, requirement):
+        return list(self.index.iter_candidates(requirement))
+
+    def _requirements_of(self, candidate):
+        spec = self.index.get_specification(candidate)
+        return sorted(spec.get_dependencies(candidate.extras), key=str)
+
+    def _resolve(self, pinned, pending):
+        if not pending:
+            return pinned
+        requirement, rest = pending[0], pending[1:]
+        name = canonicalize_name(requirement.name)
+        if name in pinned:
+            if not requirement.specifier.contains(pinned[name].version, True):
+                return None
+            return self._resolve(pinned, rest)
+        for candidate in self._candidates(requirement):
+            self.states += 1
+            if self.states > self.max_states:
+                raise TooManyStates()
+            pinned[name] = candidate
+            found = self._resolve(
+                pinned, rest + self._requirements_of(candidate),
+            )
+            if found is not None:
+                return found
+            del pinned[name]
+            self.backtracks += 1
+        return None
+
+    def resolve(self, requirements):
+        return self._resolve({}, list(requirements))
+
+
+def run(label, func):
+    start = time.time()
+    try:
+        outcome = func()
+    except (ResolutionImpossible, TooManyStates) as e:
+        outcome = type(e).__name__
+    print('  {:<14} {:>8.3f}s  {}'.format(label, time.time() - start, outcome))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('graphs', nargs='*', default=sorted(GRAPHS))
+    parser.add_argument('--size', type=int, default=10)
+    parser.add_argument('--max-states', type=int, default=100000)
+    parser.add_argument('--explain', action='store_true')
+    options = parser.parse_args()
+
+    for name in options.graphs:
+        graph, roots = GRAPHS[name](options.size)
+        requirements = [Requirement.parse(r)[0] for r in roots]
+        print('{} (size {})'.format(name, options.size))
+
+        def pubgrub():
+            resolution = Resolver(FakeIndex(graph)).resolve(requirements)
+            stats = resolution.statistics
+            return '{} pinned, {} states, {} backtracks, {} learned'.format(
+                len(resolution.candidates), stats.decisions,
+                stats.backtracks, stats.learned,
+            )
+
+        def chronological():
+            resolver = ChronologicalResolver(
+                FakeIndex(graph), options.max_states,
+            )
+            result = resolver.resolve(requirements)
+            return '{}, {} states, {} backtracks'.format(
+                'no solution' if result is None else
+                '{} pinned'.format(len(result)),
+                resolver.states, resolver.backtracks,
+            )
+
+        run('pubgrub', pubgrub)
+        run('chronological', chronological)
+        if options.explain:
+            try:
+                Resolver(FakeIndex(graph)).resolve(requirements)
+            except ResolutionImpossible as e:
+                print(e)
+
+
+if __name__ == '__main__':
+    main()
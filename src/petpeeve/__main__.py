@@ -1,30 +1,197 @@
+from __future__ import print_function
+
 import argparse
+import functools
+import json
 import logging
+import os
 import sys
+import time
+
+from . import __version__, instrumentation
+from .caches import get_default_cache
+from .environments import MarkerEnvironment, get_marker
+from .indexes import build_index
+from .installs import InstallError, Installer, get_scheme
+from .locks import Lock, resolve_incremental
+from .requirements import read_requirements_file
+from .resolvers import (
+    DirectURLError, Resolver, ResolutionImpossible, UniversalResolution,
+)
+
 
+logger = logging.getLogger('petpeeve')
 
 pip_logger = logging.getLogger('pip')
 
 
 def parse_args():
     parser = argparse.ArgumentParser(prog='petpeeve')
-    parser.add_argument('requirements.txt', dest='requirements_filename')
+    parser.add_argument(
+        'requirements_filename', metavar='requirements.txt',
+    )
     parser.add_argument('--index-url', required=True)
-    parser.add_argument('--verbose', store_const=True, default=False)
-    parser.add_argument('--pre', store_const=True, default=False)
-    parser.add_argument('--clear', store_const=True, default=False)
-    parser.add_argument('--debug', store_const=True, default=False)
-    parser.add_argument('--system', store_const=True, default=False)
+    parser.add_argument(
+        '--lock', dest='lock_filename', metavar='FILE',
+        help='write a lock file',
+    )
+    parser.add_argument(
+        '--incremental', action='store_true', default=False,
+        help='reuse pins from the existing lock file where possible',
+    )
+    parser.add_argument(
+        '--environment', dest='environments', metavar='NAME',
+        action='append', type=MarkerEnvironment.parse,
+        help='resolve for an environment, e.g. linux-3.7 (repeatable)',
+    )
+    parser.add_argument(
+        '--install', action='store_true', default=False,
+        help='install the resolved packages',
+    )
+    parser.add_argument(
+        '--prefix', metavar='DIR',
+        help='install under this prefix instead of the running Python',
+    )
+    parser.add_argument(
+        '--no-compile', dest='compile', action='store_false', default=True,
+        help='do not compile installed files to bytecode',
+    )
+    parser.add_argument(
+        '--profile-report', metavar='FILE',
+        help='write where time went, as JSON',
+    )
+    parser.add_argument('--verbose', action='store_true', default=False)
+    parser.add_argument('--pre', action='store_true', default=False)
+    parser.add_argument('--clear', action='store_true', default=False)
+    parser.add_argument('--debug', action='store_true', default=False)
+    parser.add_argument('--system', action='store_true', default=False)
     return parser.parse_known_args()
 
 
+def _read_previous_lock(filename):
+    if not os.path.exists(filename):
+        logger.info('No lock at %s, resolving everything', filename)
+        return None
+    try:
+        return Lock.read(filename)
+    except (IOError, OSError, ValueError) as e:
+        logger.warning('Ignoring unreadable lock %s: %s', filename, e)
+        return None
+
+
+def _print_pins(resolution):
+    if not isinstance(resolution, UniversalResolution):
+        for name in sorted(resolution.candidates):
+            print(resolution.candidates[name])
+        return
+    for name, version, found in resolution.iter_pins():
+        pin = '{}=={}'.format(name, version)
+        marker = get_marker([e for e, _ in found], resolution.environments)
+        print(pin if marker is None else '{}; {}'.format(pin, marker))
+
+
+def _get_resolution_statistics(resolution):
+    if resolution is None:
+        return []
+    if not isinstance(resolution, UniversalResolution):
+        return [dict(resolution.statistics._asdict(), environment=None)]
+    return [
+        dict(result.statistics._asdict(), environment=environment.name)
+        for environment, result in zip(
+            resolution.environments, resolution.resolutions)
+    ]
+
+
+def _write_profile_report(filename, profile, seconds, resolution):
+    report = profile.as_dict()
+    report.update({
+        'petpeeve': __version__,
+        'seconds': seconds,
+        'http_cache': get_default_cache().get_statistics(),
+        'resolutions': _get_resolution_statistics(resolution),
+    })
+    with open(filename, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def _run(options):
+    requirements = read_requirements_file(options.requirements_filename)
+    index = build_index(options.index_url)
+    resolver = Resolver(index, prereleases=options.pre)
+
+    previous = None
+    if options.incremental:
+        previous = _read_previous_lock(options.lock_filename)
+    if previous is not None:
+        resolve = functools.partial(
+            resolve_incremental, resolver, lock=previous,
+        )
+    else:
+        resolve = resolver.resolve
+    try:
+        if options.environments:
+            resolution = resolver.resolve_universal(
+                requirements, options.environments, resolve=resolve,
+            )
+        else:
+            resolution = resolve(requirements)
+    except (ResolutionImpossible, DirectURLError) as e:
+        sys.exit(str(e))
+
+    _print_pins(resolution)
+    if isinstance(resolution, UniversalResolution):
+        for environment, result in zip(
+                resolution.environments, resolution.resolutions):
+            logger.info('%s: %s', environment.name, result.statistics)
+    else:
+        logger.info('%s', resolution.statistics)
+
+    if options.lock_filename:
+        lock = Lock.from_resolution(
+            requirements, resolution, index=index, previous=previous,
+        )
+        lock.write(options.lock_filename)
+
+    if options.install:
+        installer = Installer(
+            index, scheme=get_scheme(options.prefix), compile=options.compile,
+        )
+        try:
+            installer.install(resolution.candidates.values())
+        except InstallError as e:
+            sys.exit(str(e))
+    return resolution
+
+
 def main():
     options, unknown_args = parse_args()
     sys.argv = [sys.argv[0]] + unknown_args
+    logging.basicConfig(format='%(levelname)s: %(message)s')
     if options.verbose:
         pip_logger.setLevel(logging.INFO)
+        logger.setLevel(logging.INFO)
     if options.debug:
         pip_logger.setLevel(logging.DEBUG)
+        logger.setLevel(logging.DEBUG)
+    if options.incremental and not options.lock_filename:
+        sys.exit('--incremental needs --lock')
+    if options.install and options.environments:
+        sys.exit('--install cannot be used with --environment')
+
+    if not options.profile_report:
+        _run(options)
+        return
+    # Written even if we exit early, to show where the time went until then.
+    profile = instrumentation.enable()
+    start = time.time()
+    resolution = None
+    try:
+        resolution = _run(options)
+    finally:
+        instrumentation.disable()
+        _write_profile_report(
+            options.profile_report, profile, time.time() - start, resolution,
+        )
 
 
 if __name__ == '__main__':
@@ -0,0 +1,60 @@
+from __future__ import absolute_import
+
+import sys
+
+from pip._vendor import six
+
+
+try:
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+except ImportError:     # Python 2 without the futures backport. Run serially.
+    SERIAL = True
+
+    class _Future(object):
+        def __init__(self, fn, args, kwargs):
+            self._result = None
+            self._exc_info = None
+            try:
+                self._result = fn(*args, **kwargs)
+            except Exception:
+                self._exc_info = sys.exc_info()
+
+        def cancel(self):
+            return False
+
+        def done(self):
+            return True
+
+        def add_done_callback(self, fn):
+            fn(self)
+
+        def exception(self, timeout=None):
+            if self._exc_info:
+                return self._exc_info[1]
+            return None
+
+        def result(self, timeout=None):
+            if self._exc_info:
+                six.reraise(*self._exc_info)
+            return self._result
+
+    class ThreadPoolExecutor(object):     # noqa
+        def __init__(self, max_workers=None):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            self.shutdown()
+
+        def submit(self, fn, *args, **kwargs):
+            return _Future(fn, args, kwargs)
+
+        def shutdown(self, wait=True):
+            pass
+
+    def as_completed(fs, timeout=None):     # noqa
+        return iter(list(fs))
+else:
+    SERIAL = False
@@ -0,0 +1,8 @@
+from __future__ import absolute_import
+
+
+try:
+    from importlib.util import cache_from_source
+except ImportError:     # Python 2 writes bytecode next to the source.
+    def cache_from_source(path):
+        return path + 'c'
@@ -0,0 +1,26 @@
+from __future__ import absolute_import
+
+import errno
+import os
+import sys
+
+
+try:
+    replace = os.replace
+except AttributeError:
+    def replace(src, dst):
+        # os.rename() does not overwrite on Windows. This is not atomic, but
+        # is the best we can do without os.replace().
+        if sys.platform.startswith('win') and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def makedirs(path):
+    """Like `os.makedirs(path, exist_ok=True)`, but works on Python 2.
+    """
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
@@ -0,0 +1,286 @@
+import asyncio
+import collections
+import functools
+import ssl
+import zlib
+
+from pip._vendor import requests, six
+from pip._vendor.requests.structures import CaseInsensitiveDict
+from pip._vendor.requests.utils import get_encoding_from_headers
+
+from .transports import DEFAULT_TIMEOUT
+
+
+DEFAULT_CONCURRENCY = 64    # Should be reasonable?
+
+DEFAULT_MAX_IDLE = 8    # Idle connections kept per host.
+
+MAX_REDIRECTS = 10
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+def async_lru_cache(maxsize):
+    """Memoize a coroutine function.
+
+    Concurrent calls with the same arguments share one task, so a page is
+    only fetched once even if many lookups ask for it at the same time.
+    Failed calls are not memoized.
+    """
+    def _decorator(f):
+        cache = collections.OrderedDict()
+
+        def _forget(key, task):
+            if not task.cancelled() and task.exception() is None:
+                return
+            if cache.get(key) is task:
+                del cache[key]
+
+        @functools.wraps(f)
+        def wrapper(*args):
+            try:
+                task = cache.pop(args)
+            except KeyError:
+                task = asyncio.ensure_future(f(*args))
+                task.add_done_callback(functools.partial(_forget, args))
+            cache[args] = task
+            if len(cache) > maxsize:
+                cache.popitem(last=False)
+            # Shield the shared task, so one caller cancelling does not
+            # cancel it for everyone else.
+            return asyncio.shield(task)
+
+        return wrapper
+
+    return _decorator
+
+
+async def _read_chunked(reader):
+    chunks = []
+    while True:
+        line = await reader.readline()
+        size = int(line.split(b';', 1)[0].strip(), 16)
+        if size == 0:
+            break
+        chunks.append(await reader.readexactly(size))
+        await reader.readline()
+    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+        pass    # Ignore trailers.
+    return b''.join(chunks)
+
+
+def _decode_content(headers, content):
+    encoding = headers.get('Content-Encoding', '').lower()
+    if encoding == 'gzip':
+        return zlib.decompress(content, 16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        return zlib.decompress(content)
+    return content
+
+
+class AsyncTransport(object):
+    """asyncio counterpart of `Transport`.
+
+    This implements a minimal HTTP/1.1 client on top of asyncio streams, so
+    thousands of requests can be in flight without a thread for each. At most
+    `concurrency` requests are sent at the same time; the rest wait on a
+    semaphore. `timeout` applies to each request, including redirects.
+
+    Connections are kept alive and reused, like the pooled sessions of
+    `Transport`; up to `max_idle` idle connections are kept for each host.
+
+    Responses are `requests.Response` instances, so they can be handled by
+    the same code as the synchronous transport. Proxies are not supported.
+    """
+    def __init__(
+            self, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT,
+            cache=None, ssl_context=None, max_idle=DEFAULT_MAX_IDLE):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.cache = cache
+        if ssl_context is None:
+            ssl_context = ssl.create_default_context()
+        self.ssl_context = ssl_context
+        self.max_idle = max_idle
+        self._semaphore = None
+        self._idle = collections.defaultdict(list)
+        self._loop = None
+
+    def close(self):
+        """Close idle connections.
+        """
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+    def _check_loop(self):
+        # The semaphore and connections belong to the loop they were made
+        # in. Start afresh if run in another one.
+        loop = asyncio.get_event_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._idle.clear()
+            self._loop = loop
+
+    def _get_semaphore(self):
+        self._check_loop()
+        return self._semaphore
+
+    def _get_idle(self, key):
+        self._check_loop()
+        return self._idle[key]
+
+    async def _connect(self, key):
+        """Get a connection to `key`, a `(scheme, host, port)` tuple.
+
+        Returns `(reader, writer, reused)`.
+        """
+        idle = self._get_idle(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.transport.is_closing():
+                return reader, writer, True
+            writer.close()
+        scheme, host, port = key
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=(self.ssl_context if scheme == 'https' else None),
+        )
+        return reader, writer, False
+
+    def _release(self, key, reader, writer):
+        idle = self._get_idle(key)
+        if len(idle) < self.max_idle:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def _send(self, url, headers):
+        parts = six.moves.urllib_parse.urlsplit(url)
+        secure = (parts.scheme == 'https')
+        port = parts.port or (443 if secure else 80)
+        key = (parts.scheme, parts.hostname, port)
+        target = six.moves.urllib_parse.urlunsplit(
+            ('', '', parts.path or '/', parts.query, ''),
+        )
+        request_headers = collections.OrderedDict([
+            ('Host', parts.netloc.rpartition('@')[-1]),
+            ('User-Agent', 'petpeeve'),
+            ('Accept-Encoding', 'gzip, deflate'),
+        ])
+        request_headers.update(headers)
+        lines = ['GET {} HTTP/1.1'.format(target)]
+        lines.extend(
+            '{}: {}'.format(k, v) for k, v in request_headers.items()
+        )
+        lines.extend(['', ''])
+        request = '\r\n'.join(lines).encode('latin-1')
+
+        while True:
+            reader, writer, reused = await self._connect(key)
+            try:
+                writer.write(request)
+                status_line = (await reader.readline()).decode('latin-1')
+            except (ConnectionError, OSError):
+                writer.close()
+                if reused:  # The server closed it while idle; try afresh.
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if not status_line and reused:
+                writer.close()
+                continue
+            break
+
+        keep_alive = False
+        try:
+            status_parts = status_line.rstrip('\r\n').split(' ', 2)
+            if not status_line.startswith('HTTP/') or len(status_parts) < 2:
+                raise requests.ConnectionError(
+                    'bad status line {!r}'.format(status_line),
+                )
+            status_code = int(status_parts[1])
+            reason = status_parts[2] if len(status_parts) > 2 else ''
+
+            response_headers = CaseInsensitiveDict()
+            while True:
+                line = (await reader.readline()).decode('latin-1')
+                if line in ('\r\n', '\n', ''):
+                    break
+                k, _, v = line.partition(':')
+                response_headers[k.strip()] = v.strip()
+
+            keep_alive = (
+                status_parts[0] == 'HTTP/1.1' and
+                response_headers.get('Connection', '').lower() != 'close'
+            )
+            if status_code in (204, 304) or 100 <= status_code < 200:
+                content = b''
+            elif 'chunked' in response_headers.get('Transfer-Encoding', ''):
+                content = await _read_chunked(reader)
+            elif 'Content-Length' in response_headers:
+                length = int(response_headers['Content-Length'])
+                content = await reader.readexactly(length)
+            else:
+                # The body ends when the server closes the connection.
+                keep_alive = False
+                content = await reader.read()
+        except BaseException:
+            keep_alive = False
+            raise
+        finally:
+            if keep_alive:
+                self._release(key, reader, writer)
+            else:
+                writer.close()
+
+        response = requests.Response()
+        response.status_code = status_code
+        response.reason = reason
+        response.url = url
+        response.headers = response_headers
+        response.encoding = get_encoding_from_headers(response_headers)
+        response._content = _decode_content(response_headers, content)
+        return response
+
+    async def _get(self, url, headers):
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self._send(url, headers)
+            if response.status_code not in REDIRECT_STATUSES:
+                return response
+            url = six.moves.urllib_parse.urljoin(
+                url, response.headers['Location'],
+            )
+        raise requests.TooManyRedirects(
+            'exceeded {} redirects'.format(MAX_REDIRECTS),
+        )
+
+    async def get(self, url, headers=None):
+        """Send a GET request. Returns a `requests.Response` instance.
+        """
+        async with self._get_semaphore():
+            return await asyncio.wait_for(
+                self._get(url, headers or {}), self.timeout,
+            )
+
+    async def get_metadata(self, url, headers=None):
+        """GET a metadata document, e.g. a simple page, through the cache.
+
+        The cache lives on disk, so it is read and written in the loop's
+        default executor, not to block the loop.
+        """
+        if self.cache is None:
+            return await self.get(url, headers=headers)
+        loop = asyncio.get_event_loop()
+        entry, response = await loop.run_in_executor(
+            None, self.cache.check, url, headers,
+        )
+        if response is not None:
+            return response
+        request_headers = self.cache.get_request_headers(entry, headers)
+        response = await self.get(url, headers=request_headers)
+        return await loop.run_in_executor(
+            None, self.cache.update, url, entry, response, headers,
+        )
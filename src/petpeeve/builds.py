@@ -0,0 +1,226 @@
+import collections
+import functools
+import logging
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+from pip._vendor import six
+
+from ._compat.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger('petpeeve.builds')
+
+
+DEFAULT_BUILD_TIMEOUT = 600     # Should be reasonable?
+
+BUILD_LOG_TAIL_LINES = 40   # Kept to show when a build fails.
+
+BUILD_POLL_INTERVAL = 0.1   # How often to check for a timeout, in seconds.
+
+BUILD_KILL_GRACE = 1    # Time to drain output after killing, in seconds.
+
+
+class BuildError(Exception):
+    """A build subprocess failed.
+
+    `output` contains the last lines the build printed.
+    """
+    def __init__(self, name, message, output):
+        super(BuildError, self).__init__(name, message)
+        self.name = name
+        self.message = message
+        self.output = output
+
+    def __str__(self):
+        return '{}: {}\n{}'.format(
+            self.name, self.message, '\n'.join(self.output),
+        )
+
+
+class BuildTimeout(BuildError):
+    pass
+
+
+def get_cpu_count():
+    """Get the number of CPUs, or 1 if it cannot be told.
+    """
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def _get_group_kwargs():
+    """Popen arguments to start the process in a new process group.
+    """
+    if sys.platform.startswith('win'):
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    if six.PY3:
+        return {'start_new_session': True}
+    return {'preexec_fn': os.setsid}
+
+
+def _kill_group(proc):
+    """Kill the process and everything it started.
+    """
+    try:
+        if sys.platform.startswith('win'):
+            subprocess.call(
+                ['taskkill', '/F', '/T', '/PID', str(proc.pid)],
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            )
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:     # Already exited.
+        pass
+
+
+def _read_output(stream, name, tail, lock):
+    try:
+        for line in iter(stream.readline, b''):
+            line = line.decode('utf-8', 'replace').rstrip()
+            with lock:
+                tail.append(line)
+            logger.debug('[%s] %s', name, line)
+    finally:
+        stream.close()
+
+
+def run_build(args, cwd, name, timeout=None):
+    """Run a build command, streaming its output to the logger.
+
+    Each line of output is logged at DEBUG level, prefixed by `name`. The
+    build runs in its own process group, which is killed as a whole if the
+    build runs longer than `timeout` seconds, so processes it started (e.g.
+    a compiler) do not keep it going.
+
+    Raises `BuildTimeout` if the build is killed, or `BuildError` if it exits
+    with a non-zero status.
+    """
+    proc = subprocess.Popen(
+        args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        **_get_group_kwargs()
+    )
+    killed = threading.Event()
+
+    def _kill():
+        killed.set()
+        _kill_group(proc)
+
+    tail = collections.deque(maxlen=BUILD_LOG_TAIL_LINES)
+    tail_lock = threading.Lock()
+    # Output is read on a thread, so a process that escaped the group and
+    # still holds the pipe cannot hold up a killed build.
+    reader = threading.Thread(
+        target=_read_output, args=(proc.stdout, name, tail, tail_lock),
+    )
+    reader.daemon = True
+    reader.start()
+    timer = None
+    if timeout:
+        timer = threading.Timer(timeout, _kill)
+        timer.daemon = True
+        timer.start()
+    try:
+        proc.wait()
+        while reader.is_alive() and not killed.is_set():
+            reader.join(BUILD_POLL_INTERVAL)
+        if killed.is_set():
+            reader.join(BUILD_KILL_GRACE)
+    finally:
+        if timer is not None:
+            timer.cancel()
+    with tail_lock:
+        output = list(tail)
+    if killed.is_set():
+        raise BuildTimeout(
+            name, 'timed out after {} seconds'.format(timeout), output,
+        )
+    if proc.returncode != 0:
+        raise BuildError(
+            name, 'exited with status {}'.format(proc.returncode), output,
+        )
+
+
+class BuildScheduler(object):
+    """Run builds concurrently, at most `max_builds` at the same time.
+
+    Builds run as subprocesses; the pool threads only wait for them, so a
+    build does not block anything else. `max_builds` defaults to the number
+    of CPUs. Submitting a build with the same key as one in flight returns
+    the existing future instead of building again.
+
+    `timeout` is the time limit of each build, in seconds.
+    """
+    def __init__(self, max_builds=None, timeout=DEFAULT_BUILD_TIMEOUT):
+        if max_builds is None:
+            max_builds = get_cpu_count()
+        self.max_builds = max_builds
+        self.timeout = timeout
+        self._executor = None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<{type} max_builds={max_builds}>'.format(
+            type=type(self).__name__,
+            max_builds=self.max_builds,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def submit(self, key, func, *args, **kwargs):
+        """Schedule `func(*args, **kwargs)` to run.
+
+        Returns a future. If a call with the same `key` is still running or
+        waiting to run, its future is returned instead.
+        """
+        with self._lock:
+            try:
+                return self._in_flight[key]
+            except KeyError:
+                pass
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_builds)
+            future = self._executor.submit(func, *args, **kwargs)
+            self._in_flight[key] = future
+        future.add_done_callback(functools.partial(self._forget, key))
+        return future
+
+
+_default_scheduler = None
+
+_default_scheduler_lock = threading.Lock()
+
+
+def get_default_scheduler():
+    """Get the build scheduler shared by all indexes in this process.
+
+    Sharing it is what lets identical builds from different threads be
+    deduplicated.
+    """
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = BuildScheduler()
+    return _default_scheduler
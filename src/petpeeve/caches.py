@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from pip._vendor import requests
+from pip._vendor.requests.structures import CaseInsensitiveDict
+
+from petpeeve._compat.os import makedirs, replace
+from petpeeve.pip_internal import locations
+
+
+# Lives next to pip's own caches, e.g. the wheel cache.
+HTTP_CACHE_DIR = os.path.join(locations.USER_CACHE_DIR, 'petpeeve', 'http')
+
+HTTP_CACHE_MAX_SIZE = 256 * 1024 * 1024     # Should be reasonable?
+
+# Response headers worth keeping. Everything else is dropped.
+STORED_HEADERS = (
+    'Cache-Control', 'Content-Type', 'Date', 'ETag', 'Last-Modified',
+)
+
+
+def _parse_max_age(cache_control):
+    """Parse a Cache-Control header value into max-age seconds.
+
+    Returns 0 if the response must always be revalidated.
+    """
+    max_age = 0
+    for directive in cache_control.split(','):
+        name, _, value = directive.strip().partition('=')
+        name = name.strip().lower()
+        if name in ('no-cache', 'no-store', 'must-revalidate'):
+            return 0
+        if name == 'max-age':
+            try:
+                max_age = int(value.strip().strip('"'))
+            except ValueError:
+                return 0
+    return max_age
+
+
+class CacheEntry(object):
+    """A stored response, with validators to revalidate it.
+    """
+    def __init__(self, url, headers, encoding, body, stored_at):
+        self.url = url
+        self.headers = headers
+        self.encoding = encoding
+        self.body = body
+        self.stored_at = stored_at
+
+    @classmethod
+    def from_response(cls, response):
+        headers = {
+            k: response.headers[k]
+            for k in STORED_HEADERS if k in response.headers
+        }
+        return cls(
+            url=response.url, headers=headers, encoding=response.encoding,
+            body=response.content, stored_at=time.time(),
+        )
+
+    @classmethod
+    def load(cls, f):
+        meta = json.loads(f.readline().decode('utf-8'))
+        return cls(body=f.read(), **meta)
+
+    def dump(self, f):
+        meta = {
+            'url': self.url,
+            'headers': self.headers,
+            'encoding': self.encoding,
+            'stored_at': self.stored_at,
+        }
+        f.write(json.dumps(meta).encode('utf-8'))
+        f.write(b'\n')
+        f.write(self.body)
+
+    def is_fresh(self):
+        max_age = _parse_max_age(self.headers.get('Cache-Control', ''))
+        return time.time() < self.stored_at + max_age
+
+    def is_revalidatable(self):
+        return 'ETag' in self.headers or 'Last-Modified' in self.headers
+
+    def get_conditional_headers(self):
+        headers = {}
+        if 'ETag' in self.headers:
+            headers['If-None-Match'] = self.headers['ETag']
+        if 'Last-Modified' in self.headers:
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
+
+    def refresh(self, headers):
+        """Update the entry with headers from a 304 response.
+        """
+        for k in STORED_HEADERS:
+            if k in headers:
+                self.headers[k] = headers[k]
+        self.stored_at = time.time()
+
+    def to_response(self):
+        """Build a `requests.Response` as if the body is freshly downloaded.
+        """
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = self.url
+        response.encoding = self.encoding
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.body
+        return response
+
+
+def _get_size(path):
+    """Size of the file at `path`, or 0 if there is none.
+    """
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class HTTPCache(object):
+    """An on-disk cache for index metadata, e.g. simple pages and JSON data.
+
+    Responses are stored with their validators (ETag and Last-Modified), and
+    revalidated with conditional GETs, so an unchanged page costs a 304
+    instead of a full download. Fresh responses (as told by Cache-Control)
+    are served without touching the network at all.
+
+    The cache is bounded by `max_size` bytes. Least recently used entries
+    are evicted when the limit is exceeded.
+    """
+    def __init__(self, directory=HTTP_CACHE_DIR, max_size=HTTP_CACHE_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<{type} {directory!r}>'.format(
+            type=type(self).__name__,
+            directory=self.directory,
+        )
+
+    def get_statistics(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'evictions': self.evictions,
+            }
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _get_path(self, url, headers):
+        # Include Accept in the key, since it decides what the server sends.
+        accept = (headers or {}).get('Accept', '')
+        key = '{}\n{}'.format(url, accept).encode('utf-8')
+        return os.path.join(self.directory, hashlib.sha224(key).hexdigest())
+
+    def lookup(self, url, headers=None):
+        """Find a stored entry for the URL.
+
+        Returns a `CacheEntry` instance, or `None` if nothing is stored.
+        """
+        path = self._get_path(url, headers)
+        try:
+            with open(path, 'rb') as f:
+                entry = CacheEntry.load(f)
+            os.utime(path, None)    # Mark as recently used.
+        except (IOError, OSError, ValueError):
+            return None
+        return entry
+
+    def store(self, url, entry, headers=None):
+        """Store an entry for the URL, evicting old entries if needed.
+
+        Nothing is stored if the cache directory cannot be written to.
+        """
+        path = self._get_path(url, headers)
+        try:
+            makedirs(self.directory)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory)
+        except (IOError, OSError):
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                entry.dump(f)
+            size = os.path.getsize(temp_path)
+            # Under the lock, so the size of the replaced entry is right.
+            with self._lock:
+                size -= _get_size(path)
+                replace(temp_path, path)
+                if self._size is None:
+                    self._size = self._compute_size()
+                else:
+                    self._size += size
+                if self._size > self.max_size:
+                    self._evict()
+        except (IOError, OSError):
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def _iter_entries(self):
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield path, stat
+
+    def _compute_size(self):
+        return sum(stat.st_size for _, stat in self._iter_entries())
+
+    def _evict(self):
+        entries = sorted(self._iter_entries(), key=lambda e: e[1].st_mtime)
+        self._size = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if self._size <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            self._size -= stat.st_size
+            self.evictions += 1
+
+    def check(self, url, headers=None):
+        """Check the cache before sending a request.
+
+        Returns a 2-tuple `(entry, response)`. If the stored entry is still
+        fresh, `response` is built from it, and should be used directly.
+        Otherwise `response` is `None`, and a request should be sent, with
+        headers from `get_request_headers(entry)`.
+        """
+        entry = self.lookup(url, headers)
+        if entry is not None and entry.is_fresh():
+            self._count('hits')
+            return entry, entry.to_response()
+        return entry, None
+
+    def get_request_headers(self, entry, headers=None):
+        request_headers = dict(headers or {})
+        if entry is not None:
+            request_headers.update(entry.get_conditional_headers())
+        return request_headers
+
+    def update(self, url, entry, response, headers=None):
+        """Update the cache with a response.
+
+        Returns the response to use, built from `entry` if the server tells
+        us it is not modified.
+        """
+        if entry is not None and response.status_code == 304:
+            self._count('revalidations')
+            entry.refresh(response.headers)
+            self.store(url, entry, headers)
+            return entry.to_response()
+        self._count('misses')
+        if response.status_code == 200:
+            entry = CacheEntry.from_response(response)
+            if entry.is_revalidatable() or entry.is_fresh():
+                self.store(url, entry, headers)
+        return response
+
+    def get(self, url, fetch=None, headers=None):
+        """GET the URL through the cache.
+
+        `fetch` is called like `requests.get` (the default) to access the
+        network. A stored response is returned directly if it is still fresh,
+        or revalidated with a conditional GET otherwise. Returns a
+        `requests.Response` instance.
+        """
+        if fetch is None:
+            fetch = requests.get
+        entry, response = self.check(url, headers)
+        if response is not None:
+            return response
+        request_headers = self.get_request_headers(entry, headers)
+        response = fetch(url, headers=request_headers)
+        return self.update(url, entry, response, headers)
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    """Get the HTTP cache shared by all indexes in this process.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = HTTPCache()
+    return _default_cache
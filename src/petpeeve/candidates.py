@@ -1,14 +1,54 @@
+import weakref
+
+from pip._vendor import six
+from pip._vendor.packaging.utils import canonicalize_name
+from pip._vendor.packaging.version import parse as parse_version
+
 from .utils import is_version_specified
 
 
+# Candidates are immutable, so identical ones can share one object. Entries go
+# away when nothing else references the candidate.
+_interned = weakref.WeakValueDictionary()
+
+
 class Candidate(object):
     """A "pinned" dependency.
+
+    Candidates are interned: creating one identical to an existing candidate
+    returns the existing object. Identity is decided by `key`, computed once
+    on creation, so hashing and comparison are cheap. A version given as a
+    string is parsed, so `version` is always a parsed version (or `None`).
     """
-    def __init__(self, name, version, extras=None, url=None):
+    __slots__ = ['name', 'extras', 'url', 'version', 'key', '_hash',
+                 '__weakref__']
+
+    def __new__(cls, name, version, extras=None, url=None):
+        extras = frozenset(extras or ())
+        if isinstance(version, six.string_types):
+            version = parse_version(version) if version else None
+        # Compare versions by their text, so "1.0" and "1.0.0" stay apart.
+        key = (
+            canonicalize_name(name), extras,
+            str(version) if version else None, url,
+        )
+        try:
+            return _interned[key]
+        except KeyError:
+            pass
+        self = super(Candidate, cls).__new__(cls)
         self.name = name
         self.extras = extras
         self.url = url
         self.version = version
+        self.key = key
+        self._hash = hash(key)
+        return _interned.setdefault(key, self)
+
+    def __reduce__(self):
+        # Parsed versions do not pickle; their text is parsed back the same.
+        version = str(self.version) if self.version else None
+        return (type(self), (self.name, version, self.extras, self.url))
 
     @classmethod
     def pin_from(cls, requirement, version):
@@ -16,6 +56,15 @@ class Candidate(object):
             raise ValueError('{v} does not satisfy {r}'.format(
                 v=version, r=requirement,
             ))
+        return cls.from_requirement(requirement, version)
+
+    @classmethod
+    def from_requirement(cls, requirement, version):
+        """Pin a requirement to a version, without checking the specifier.
+
+        Use this when the version is already known to match, e.g. it comes
+        from `VersionIndex.filter()`.
+        """
         return cls(
             name=requirement.name,
             extras=requirement.extras,
@@ -24,7 +73,7 @@ class Candidate(object):
         )
 
     def __repr__(self):
-        return 'Candidate({!r})'.format(self)
+        return 'Candidate({!r})'.format(str(self))
 
     def __str__(self):
         parts = [self.name]
@@ -37,7 +86,17 @@ class Candidate(object):
         return ''.join(parts)
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
 
     def __eq__(self, other):
-        return str(self) == str(other)
+        if self is other:
+            return True
+        if not isinstance(other, Candidate):
+            return NotImplemented
+        return self.key == other.key
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
@@ -0,0 +1,190 @@
+import collections
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from pip._vendor.packaging.utils import canonicalize_name
+
+from petpeeve._compat.os import makedirs
+from petpeeve.pip_internal import locations
+
+from .requirements import (
+    RequirementSpecification, dump_requirements, load_requirements,
+)
+
+
+logger = logging.getLogger('petpeeve.databases')
+
+
+# Lives next to the HTTP cache.
+METADATA_DB_PATH = os.path.join(
+    locations.USER_CACHE_DIR, 'petpeeve', 'metadata.sqlite3',
+)
+
+# Artifact value of specifications not read from a particular artifact, e.g.
+# from the JSON API's release data.
+ANY_ARTIFACT = ''
+
+# Bumped when the table changes. Older tables are dropped; it is a cache.
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS specifications (
+    name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    artifact TEXT NOT NULL,
+    source TEXT NOT NULL,
+    requires_python TEXT,
+    base TEXT NOT NULL,
+    extras TEXT NOT NULL,
+    PRIMARY KEY (name, version, artifact, source)
+)
+"""
+
+
+class MetadataDatabase(object):
+    """A persistent store of dependency specifications, backed by SQLite.
+
+    Specifications are keyed by distribution name (normalized), version, the
+    checksum of the artifact they are read from, and their source, the URL
+    of the index they came from. Indexes can serve different distributions
+    under the same name and version, e.g. a private mirror and PyPI, so a
+    lookup without a checksum only finds entries from the same source.
+    Published metadata does not change, so entries are never revalidated or
+    expired.
+
+    The connection is shared between threads, and serialized with a lock.
+    The database is only a cache: if it cannot be opened, e.g. because the
+    cache directory is not writable, it is left unused, with a warning.
+    """
+    def __init__(self, path=METADATA_DB_PATH):
+        self.path = path
+        self._connection = None
+        self._unavailable = False
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<{type} {path!r}>'.format(
+            type=type(self).__name__,
+            path=self.path,
+        )
+
+    def _connect(self):
+        """Get the connection, or `None` if the database cannot be opened.
+        """
+        if self._connection is None and not self._unavailable:
+            try:
+                if self.path != ':memory:':
+                    makedirs(os.path.dirname(self.path))
+                connection = sqlite3.connect(
+                    self.path, check_same_thread=False,
+                )
+                version, = connection.execute(
+                    'PRAGMA user_version',
+                ).fetchone()
+                if version != SCHEMA_VERSION:
+                    connection.execute('DROP TABLE IF EXISTS specifications')
+                    connection.execute(
+                        'PRAGMA user_version = {:d}'.format(SCHEMA_VERSION),
+                    )
+                connection.execute(SCHEMA)
+                connection.commit()
+            except (sqlite3.Error, OSError) as e:
+                logger.warning('Cannot open %s: %s', self.path, e)
+                self._unavailable = True
+                return None
+            self._connection = connection
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def get(self, name, version, artifact=None, source=None):
+        """Look up a stored specification.
+
+        If `artifact` is given, a specification read from that artifact is
+        returned, whatever its source; the checksum identifies the file.
+        Otherwise, a specification of any artifact of the version stored
+        from `source` is returned. Returns a `RequirementSpecification`
+        instance, or `None` if nothing is stored.
+        """
+        query = (
+            'SELECT artifact, requires_python, base, extras '
+            'FROM specifications WHERE name = ? AND version = ?'
+        )
+        params = [canonicalize_name(name), str(version)]
+        if artifact is not None:
+            query += ' AND artifact = ?'
+            params.append(artifact)
+        else:
+            query += ' AND source = ?'
+            params.append(source or '')
+        query += ' ORDER BY artifact LIMIT 1'
+        try:
+            with self._lock:
+                connection = self._connect()
+                if connection is None:
+                    return None
+                row = connection.execute(query, params).fetchone()
+        except sqlite3.Error as e:
+            logger.warning('Failed to read %s: %s', self.path, e)
+            return None
+        if row is None:
+            return None
+        artifact, requires_python, base, extras = row
+        extras = collections.defaultdict(set, (
+            (extra, load_requirements(strings))
+            for extra, strings in json.loads(extras).items()
+        ))
+        return RequirementSpecification(
+            load_requirements(json.loads(base)), extras,
+            requires_python=requires_python, artifact=artifact or None,
+        )
+
+    def put(self, name, version, specification, source=None):
+        """Store a specification, found on the index at URL `source`.
+
+        It is keyed by `specification.artifact`, or `ANY_ARTIFACT` if that
+        is not known.
+        """
+        extras = {
+            extra: dump_requirements(requirements)
+            for extra, requirements in specification.extras.items()
+        }
+        row = (
+            canonicalize_name(name), str(version),
+            specification.artifact or ANY_ARTIFACT,
+            source or '',
+            specification.requires_python,
+            json.dumps(dump_requirements(specification.base)),
+            json.dumps(extras, sort_keys=True),
+        )
+        try:
+            with self._lock:
+                connection = self._connect()
+                if connection is None:
+                    return
+                connection.execute(
+                    'INSERT OR REPLACE INTO specifications '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', row,
+                )
+                connection.commit()
+        except sqlite3.Error as e:   # Only a cache; nothing is lost.
+            logger.warning('Failed to write %s: %s', self.path, e)
+
+
+_default_database = None
+
+
+def get_default_database():
+    """Get the metadata database shared by all indexes in this process.
+    """
+    global _default_database
+    if _default_database is None:
+        _default_database = MetadataDatabase()
+    return _default_database
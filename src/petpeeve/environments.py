@@ -0,0 +1,207 @@
+"""Environments to evaluate markers in, for resolving for other machines.
+
+A universal resolution resolves the same requirements for several target
+environments. Each is a `MarkerEnvironment`, which caches the results of
+evaluating markers, so a marker is only evaluated once per environment no
+matter how many times it shows up in metadata.
+"""
+
+import re
+
+from pip._vendor.packaging.markers import default_environment
+from pip._vendor.packaging.specifiers import InvalidSpecifier, SpecifierSet
+
+
+# Marker variables describing a platform, for environments named like
+# "linux-3.7". Values are those of CPython on 64-bit x86.
+PLATFORMS = {
+    'linux': {
+        'os_name': 'posix',
+        'sys_platform': 'linux',
+        'platform_system': 'Linux',
+        'platform_machine': 'x86_64',
+    },
+    'macos': {
+        'os_name': 'posix',
+        'sys_platform': 'darwin',
+        'platform_system': 'Darwin',
+        'platform_machine': 'x86_64',
+    },
+    'windows': {
+        'os_name': 'nt',
+        'sys_platform': 'win32',
+        'platform_system': 'Windows',
+        'platform_machine': 'AMD64',
+    },
+}
+
+# Variables to tell environments apart with, in the order they are tried
+# when writing a marker for some of them.
+MARKER_VARIABLES = [
+    'python_version',
+    'sys_platform',
+    'platform_system',
+    'os_name',
+    'platform_machine',
+    'implementation_name',
+    'platform_python_implementation',
+    'python_full_version',
+    'implementation_version',
+    'platform_release',
+    'platform_version',
+]
+
+
+class MarkerEnvironment(object):
+    """Values of marker variables in an environment.
+
+    `values` is a dict like `packaging.markers.default_environment()`. The
+    `key` of an environment is made from the values, so environments with
+    the same values (even if named differently) have the same key.
+    """
+    def __init__(self, values, name=None):
+        self.values = dict(values)
+        self.values.setdefault('extra', '')
+        self.name = name
+        self.key = frozenset(self.values.items())
+        self._markers = {}
+        self._requires_python = {}
+
+    def __repr__(self):
+        return '<{type} {name}>'.format(
+            type=type(self).__name__,
+            name=self.name,
+        )
+
+    @classmethod
+    def current(cls):
+        """Get the environment we run in.
+        """
+        return cls(default_environment(), name='current')
+
+    @classmethod
+    def parse(cls, s):
+        """Build an environment from a name like "linux-3.7" or "windows-2.7".
+
+        The platform part is a key of `PLATFORMS`. The Python version can
+        also include the patch version, e.g. "macos-3.6.8". Raises
+        `ValueError` if the name is not understood.
+        """
+        match = re.match(r'^(\w+)-(\d+)\.(\d+)(?:\.(\d+))?$', s)
+        if not match or match.group(1) not in PLATFORMS:
+            raise ValueError('unknown environment {!r}'.format(s))
+        platform, major, minor, patch = match.groups()
+        full_version = '{}.{}.{}'.format(major, minor, patch or 0)
+        values = dict(PLATFORMS[platform])
+        if major == '2' and values['sys_platform'] == 'linux':
+            values['sys_platform'] = 'linux2'
+        values.update({
+            'python_version': '{}.{}'.format(major, minor),
+            'python_full_version': full_version,
+            'implementation_name': 'cpython',
+            'implementation_version': full_version,
+            'platform_python_implementation': 'CPython',
+            'platform_release': '',
+            'platform_version': '',
+        })
+        return cls(values, name=s)
+
+    def applies(self, requirement):
+        """Check whether a requirement's marker is true in this environment.
+
+        `requirement` is a `Requirement`. Results are remembered by the
+        marker's string, which the requirement already keeps in its `key`.
+        """
+        if requirement.marker is None:
+            return True
+        marker = requirement.key[-1]
+        try:
+            return self._markers[marker]
+        except KeyError:
+            pass
+        result = requirement.marker.evaluate(self.values)
+        self._markers[marker] = result
+        return result
+
+    def allows_python(self, requires_python):
+        """Check whether the Python version matches a Requires-Python value.
+
+        An unparsable value allows everything.
+        """
+        if not requires_python:
+            return True
+        try:
+            return self._requires_python[requires_python]
+        except KeyError:
+            pass
+        try:
+            specifier = SpecifierSet(requires_python)
+        except InvalidSpecifier:
+            result = True
+        else:
+            result = specifier.contains(
+                self.values['python_full_version'], prereleases=True,
+            )
+        self._requires_python[requires_python] = result
+        return result
+
+
+def _get_distinguishing_variables(environments):
+    """Pick variables that tell the environments apart.
+
+    Variables are picked in the order of `MARKER_VARIABLES`, skipping those
+    that do not tell more environments apart.
+    """
+    variables = []
+    groups = len(set(e.key for e in environments))
+    distinct = 1
+    for variable in MARKER_VARIABLES:
+        if distinct >= groups:
+            break
+        count = len(set(
+            tuple(e.values.get(v) for v in variables + [variable])
+            for e in environments
+        ))
+        if count > distinct:
+            variables.append(variable)
+            distinct = count
+    return variables
+
+
+def _format_alternatives(clauses):
+    if len(clauses) == 1:
+        return clauses[0]
+    return ' or '.join('({})'.format(c) for c in clauses)
+
+
+def get_marker(selected, environments):
+    """Write a marker that is true in the selected environments only.
+
+    `selected` and `environments` are lists of `MarkerEnvironment`, with
+    the first a subset of the second. Returns a marker string, or `None` if
+    every environment is selected.
+    """
+    keys = set(e.key for e in selected)
+    if all(e.key in keys for e in environments):
+        return None
+    variables = _get_distinguishing_variables(environments)
+
+    # A single variable is enough if the selected environments are exactly
+    # those with some values of it, e.g. every Windows environment.
+    for variable in variables:
+        values = set(e.values.get(variable) for e in selected)
+        if all((e.values.get(variable) in values) == (e.key in keys)
+               for e in environments):
+            return _format_alternatives([
+                '{} == "{}"'.format(variable, value)
+                for value in sorted(values)
+            ])
+
+    clauses = []
+    for values in sorted(set(
+            tuple(e.values.get(v) for v in variables) for e in selected)):
+        clauses.append(' and '.join(
+            '{} == "{}"'.format(variable, value)
+            for variable, value in zip(variables, values)
+        ))
+    return _format_alternatives(clauses)
@@ -2,37 +2,98 @@ import logging
 
 from pip._vendor import six
 
-from petpeeve.links import WheelNotFoundError
+from petpeeve.caches import get_default_cache
+from petpeeve.databases import get_default_database
+from petpeeve.instrumentation import count
+from petpeeve.links import parse_link, WheelNotFoundError
+from petpeeve.transports import Transport
 
 from . import legacyjsonapi, simpleapi
+from .batch import BatchMixin
 from .exceptions import APIError
 
 
 logger = logging.getLogger('petpeeve.indexes')
 
 
-class JSONEnabledIndex(object):
+class JSONEnabledIndex(BatchMixin):
     """An index server, maybe with "legacy" JSON API available. Like pypi.org.
+
+    Both APIs share `transport`, so connections to the host are reused.
+    Artifacts are selected for `target`, a `TargetEnvironment`, or the
+    environment we run in if not given.
+
+    If `database` (a `MetadataDatabase` instance) is given, it is consulted
+    before anything else, and dependency specifications found by other
+    means are stored into it.
     """
-    def __init__(self, simple_url, json_url):
-        self.simple = simpleapi.IndexServer(simple_url)
-        self.legacy_json = legacyjsonapi.IndexServer(json_url)
+    def __init__(
+            self, simple_url, json_url, transport=None, target=None,
+            database=None):
+        if transport is None:
+            transport = Transport()
+        self.transport = transport
+        self.database = database
+        self.simple = simpleapi.IndexServer(
+            simple_url, transport=transport, target=target,
+        )
+        self.legacy_json = legacyjsonapi.IndexServer(
+            json_url, transport=transport,
+        )
 
-    def get_dependencies(self, candidate, offline=False):
+    def _find_specification(self, candidate, offline):
         try:
             logger.debug('Trying Wheel cache...')
-            return self.simple.get_dependencies(candidate, offline=True)
+            spec = self.simple.get_specification(candidate, offline=True)
         except WheelNotFoundError:
             pass
+        else:
+            count('index.specification.wheel_cache')
+            return spec
         if not candidate.url:
             try:
                 logger.debug('Trying JSON API...')
-                return self.legacy_json.get_dependencies(candidate)
+                spec = self.legacy_json.get_specification(candidate)
             except APIError:    # JSON API is not available.
                 if offline:
                     raise
+            else:
+                count('index.specification.json_api')
+                return spec
         logger.debug('Trying to download an artifact for inspection...')
-        return self.simple.get_dependencies(candidate, offline=False)
+        spec = self.simple.get_specification(candidate, offline=False)
+        count('index.specification.artifact')
+        return spec
+
+    def get_specification(self, candidate, offline=False):
+        artifact = _get_artifact(candidate)
+        # A URL without a checksum can point to anything; don't store it.
+        if self.database is None or (candidate.url and not artifact):
+            return self._find_specification(candidate, offline)
+        spec = self.database.get(
+            candidate.name, candidate.version, artifact,
+            source=self.simple.base_url,
+        )
+        if spec is not None:
+            logger.debug('Found in metadata database')
+            count('index.specification.database')
+            return spec
+        spec = self._find_specification(candidate, offline)
+        self.database.put(
+            candidate.name, candidate.version, spec,
+            source=self.simple.base_url,
+        )
+        return spec
+
+    def get_dependencies(self, candidate, offline=False):
+        spec = self.get_specification(candidate, offline=offline)
+        return spec.get_dependencies(candidate.extras)
+
+    def get_hashes(self, candidate):
+        return self.simple.get_hashes(candidate)
+
+    def get_install_link(self, candidate):
+        return self.simple.get_install_link(candidate)
 
     def get_candidates(self, requirement):
         try:
@@ -41,20 +102,58 @@ class JSONEnabledIndex(object):
             pass
         return self.simple.get_candidates(requirement)
 
+    def iter_candidates(self, requirement, prereleases=False):
+        try:
+            return self.legacy_json.iter_candidates(requirement, prereleases)
+        except APIError:    # JSON API is not available.
+            pass
+        return self.simple.iter_candidates(requirement, prereleases)
+
 
 class SimpleIndex(simpleapi.IndexServer):
     """A "simple" index server, with only simple API available.
     """
 
 
-def build_index(url):
+def _get_artifact(candidate):
+    """Get the checksum of a candidate's artifact, if it points to one.
+    """
+    if not candidate.url:
+        return None
+    return parse_link(candidate.url).checksum or None
+
+
+def _get_json_url(url):
+    ps = six.moves.urllib_parse.urlsplit(url)
+    if ps.path in ('/simple', '/simple/'):
+        return six.moves.urllib_parse.urlunsplit(ps._replace(path='/pypi'))
+    return None
+
+
+def build_index(url, transport=None, target=None, database=None):
     """Introspect the URL to choose an appropriate index.
 
     If the URL's path is "/simple", we assume it provides the JSON API.
     Otherwise we use it as a simple-only API.
+
+    All network access goes through `transport`, a `Transport` instance. If
+    not given, a new transport is created, using the on-disk HTTP cache
+    shared by the whole process.
+
+    Artifacts are selected for `target`, a `TargetEnvironment`, or the
+    environment we run in if not given.
+
+    Dependency specifications are stored in `database`, a
+    `MetadataDatabase`, or the default on-disk one if not given.
     """
-    ps = six.moves.urllib_parse.urlsplit(url)
-    if ps.path in ('/simple', '/simple/'):
-        json_url = six.moves.urllib_parse.urlunsplit(ps._replace(path='/pypi'))
-        return JSONEnabledIndex(url, json_url)
-    return SimpleIndex(url)
+    if transport is None:
+        transport = Transport(cache=get_default_cache())
+    if database is None:
+        database = get_default_database()
+    json_url = _get_json_url(url)
+    if json_url:
+        return JSONEnabledIndex(
+            url, json_url, transport=transport, target=target,
+            database=database,
+        )
+    return SimpleIndex(url, transport=transport, target=target)
@@ -0,0 +1,123 @@
+import asyncio
+import functools
+import logging
+
+from petpeeve.aio import AsyncTransport
+from petpeeve.caches import get_default_cache
+from petpeeve.databases import get_default_database
+from petpeeve.links import WheelNotFoundError
+
+from . import _get_artifact, _get_json_url
+from .exceptions import APIError
+from .legacyjsonapi.aio import AsyncIndexServer as AsyncLegacyJSONIndexServer
+from .simpleapi.aio import AsyncIndexServer as AsyncSimpleIndexServer
+
+
+logger = logging.getLogger('petpeeve.indexes')
+
+
+class AsyncJSONEnabledIndex(object):
+    """asyncio counterpart of `JSONEnabledIndex`.
+
+    The metadata database is SQLite on disk, so it is accessed in the
+    loop's default executor, not to block the loop.
+    """
+    def __init__(
+            self, simple_url, json_url, transport=None, target=None,
+            database=None):
+        if transport is None:
+            transport = AsyncTransport()
+        self.transport = transport
+        self.database = database
+        self.simple = AsyncSimpleIndexServer(
+            simple_url, transport=transport, target=target,
+        )
+        self.legacy_json = AsyncLegacyJSONIndexServer(
+            json_url, transport=transport,
+        )
+
+    async def _find_specification(self, candidate, offline):
+        try:
+            logger.debug('Trying Wheel cache...')
+            return await self.simple.get_specification(
+                candidate, offline=True,
+            )
+        except WheelNotFoundError:
+            pass
+        if not candidate.url:
+            try:
+                logger.debug('Trying JSON API...')
+                return await self.legacy_json.get_specification(candidate)
+            except APIError:    # JSON API is not available.
+                if offline:
+                    raise
+        logger.debug('Trying to download an artifact for inspection...')
+        return await self.simple.get_specification(candidate, offline=False)
+
+    async def get_specification(self, candidate, offline=False):
+        artifact = _get_artifact(candidate)
+        if self.database is None or (candidate.url and not artifact):
+            return await self._find_specification(candidate, offline)
+        loop = asyncio.get_event_loop()
+        spec = await loop.run_in_executor(None, functools.partial(
+            self.database.get, candidate.name, candidate.version, artifact,
+            source=self.simple.base_url,
+        ))
+        if spec is not None:
+            logger.debug('Found in metadata database')
+            return spec
+        spec = await self._find_specification(candidate, offline)
+        await loop.run_in_executor(None, functools.partial(
+            self.database.put, candidate.name, candidate.version, spec,
+            source=self.simple.base_url,
+        ))
+        return spec
+
+    async def get_dependencies(self, candidate, offline=False):
+        spec = await self.get_specification(candidate, offline=offline)
+        return spec.get_dependencies(candidate.extras)
+
+    async def get_hashes(self, candidate):
+        return await self.simple.get_hashes(candidate)
+
+    async def get_install_link(self, candidate):
+        return await self.simple.get_install_link(candidate)
+
+    async def get_candidates(self, requirement):
+        try:
+            return await self.legacy_json.get_candidates(requirement)
+        except APIError:    # JSON API is not available.
+            pass
+        return await self.simple.get_candidates(requirement)
+
+    async def iter_candidates(self, requirement, prereleases=False):
+        try:
+            return await self.legacy_json.iter_candidates(
+                requirement, prereleases,
+            )
+        except APIError:    # JSON API is not available.
+            pass
+        return await self.simple.iter_candidates(requirement, prereleases)
+
+
+class AsyncSimpleIndex(AsyncSimpleIndexServer):
+    """asyncio counterpart of `SimpleIndex`.
+    """
+
+
+def build_async_index(url, transport=None, target=None, database=None):
+    """asyncio counterpart of `build_index`.
+
+    Requires Python 3.5 or later.
+    """
+    if transport is None:
+        transport = AsyncTransport(cache=get_default_cache())
+    if database is None:
+        database = get_default_database()
+    json_url = _get_json_url(url)
+    if json_url:
+        return AsyncJSONEnabledIndex(
+            url, json_url, transport=transport, target=target,
+            database=database,
+        )
+    return AsyncSimpleIndex(url, transport=transport, target=target)
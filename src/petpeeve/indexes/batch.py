@@ -0,0 +1,71 @@
+import collections
+import functools
+
+from petpeeve._compat.futures import ThreadPoolExecutor, as_completed
+
+
+DEFAULT_MAX_WORKERS = 8     # Should be reasonable?
+
+
+BatchResult = collections.namedtuple('BatchResult', [
+    'item',
+    'result',
+    'error',
+])
+
+
+def iter_completed(func, items, max_workers):
+    """Call `func` on each item in a thread pool.
+
+    Yields a `BatchResult` for each item as soon as it completes. If the call
+    raises an exception, it is set as `error`, and `result` is `None`.
+    Unstarted calls are cancelled if the iterator is abandoned.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {}
+    try:
+        for item in items:
+            futures[executor.submit(func, item)] = item
+        for future in as_completed(futures):
+            item = futures[future]
+            error = future.exception()
+            if error is not None:
+                yield BatchResult(item, None, error)
+            else:
+                yield BatchResult(item, future.result(), None)
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+class BatchMixin(object):
+    """Mixin providing concurrent batch variants of index lookups.
+
+    The subclass should implement `get_dependencies` and `get_candidates`.
+    Calls are fanned out over a thread pool with at most `max_workers`
+    threads, so network access does not block each other.
+    """
+    max_workers = DEFAULT_MAX_WORKERS
+
+    def get_dependencies_many(self, candidates, max_workers=None, **kwargs):
+        """Discover dependencies for multiple candidates.
+
+        Extra keyword arguments are passed to `get_dependencies`. Returns an
+        iterator of `BatchResult` instances, in the order they complete.
+        """
+        return iter_completed(
+            functools.partial(self.get_dependencies, **kwargs), candidates,
+            max_workers=max_workers or self.max_workers,
+        )
+
+    def get_candidates_many(self, requirements, max_workers=None):
+        """Find candidates for multiple requirements.
+
+        Returns an iterator of `BatchResult` instances, in the order they
+        complete.
+        """
+        return iter_completed(
+            self.get_candidates, requirements,
+            max_workers=max_workers or self.max_workers,
+        )
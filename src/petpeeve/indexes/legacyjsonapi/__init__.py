@@ -1,13 +1,17 @@
 import posixpath
 
-from pip._vendor import requests
 from pip._vendor.packaging.version import parse as parse_version
 
 from petpeeve._compat.functools import lru_cache
 from petpeeve.candidates import Candidate
+from petpeeve.instrumentation import register_cache, timed
 from petpeeve.requirements import RequirementSpecification
+from petpeeve.transports import Transport
+from petpeeve.versions import VersionIndex
 
+from ..batch import BatchMixin
 from ..exceptions import APIError, PackageNotFound, VersionNotFound
+from ..yanks import iter_unyanked
 
 
 # Should be reasonable?
@@ -15,63 +19,151 @@ PYPI_PACKAGE_CACHE_SIZE = 512
 PYPI_VERSION_CACHE_SIZE = 1024
 
 
-class IndexServer(object):
+def _get_api_url(base_url, *parts):
+    return posixpath.join(posixpath.join(base_url, *parts), 'json')
 
-    def __init__(self, base_url):
+
+@timed('json_api.decode')
+def _decode(response):
+    return response.json()
+
+
+def _read_json(response, not_found_error):
+    if response.status_code == 404:
+        raise not_found_error
+    elif not response.ok:
+        raise APIError(response.reason)
+    return _decode(response)
+
+
+def _parse_version_info(data):
+    try:
+        return data['info']
+    except KeyError:
+        raise APIError('non-comforming JSON API')
+
+
+def _get_yank_reason(files):
+    """The reason a release is yanked, or `None` if any file is not.
+    """
+    if not all(f.get('yanked') for f in files):
+        return None
+    reasons = set(f.get('yanked_reason') for f in files)
+    return '; '.join(sorted(r for r in reasons if r))
+
+
+def _parse_versions(data):
+    """Parse releases listed in a package's JSON.
+
+    Returns a `(versions, yanked)` tuple. `versions` is a `VersionIndex` of
+    the releases with files, and `yanked` maps versions with all their files
+    yanked to the reason (see `yanks.iter_unyanked()`).
+    """
+    try:
+        releases = data['releases']
+    except KeyError:
+        raise APIError('non-comforming JSON API')
+    versions, yanked = [], {}
+    for key, files in releases.items():
+        if not files:
+            continue
+        version = parse_version(key)
+        versions.append(version)
+        reason = _get_yank_reason(files)
+        if reason is not None:
+            yanked[version] = reason
+    return VersionIndex(versions), yanked
+
+
+def _get_specification_from(info):
+    return RequirementSpecification.from_data(
+        info.get('requires_dist') or [],
+        requires_python=(info.get('requires_python') or None),
+    )
+
+
+def _get_candidates_from(releases, requirement):
+    versions, yanked = releases
+    specifier = requirement.specifier
+    matched = iter_unyanked(
+        versions.filter(specifier), specifier, yanked, requirement.name,
+    )
+    return [
+        Candidate.from_requirement(requirement, version)
+        for version in matched
+    ]
+
+
+def _iter_candidates_from(releases, requirement, prereleases):
+    versions, yanked = releases
+    specifier = requirement.specifier
+    matched = iter_unyanked(
+        versions.iter_matching(specifier, prereleases), specifier, yanked,
+        requirement.name,
+    )
+    for version in matched:
+        yield Candidate.from_requirement(requirement, version)
+
+
+class IndexServer(BatchMixin):
+
+    def __init__(self, base_url, transport=None):
         self.base_url = base_url
+        if transport is None:
+            transport = Transport()
+        self.transport = transport
 
     def _get(self, *parts):
         """Access an API endpoint.
         """
-        url = posixpath.join(posixpath.join(self.base_url, *parts), 'json')
-        response = requests.get(url)
+        url = _get_api_url(self.base_url, *parts)
+        response = self.transport.get_metadata(url)
         return response
 
     @lru_cache(maxsize=PYPI_VERSION_CACHE_SIZE)
     def _get_version_info(self, package, ver):
         response = self._get(package, ver)
-        if response.status_code == 404:
-            raise VersionNotFound(package, ver)
-        elif not response.ok:
-            raise APIError(response.reason)
-        data = response.json()
-        try:
-            return data['info']
-        except KeyError:
-            raise APIError('non-comforming JSON API')
+        data = _read_json(response, VersionNotFound(package, ver))
+        return _parse_version_info(data)
 
     @lru_cache(maxsize=PYPI_PACKAGE_CACHE_SIZE)
     def _get_versions(self, package):
         response = self._get(package)
-        if response.status_code == 404:
-            raise PackageNotFound(package)
-        elif not response.ok:
-            raise APIError(response.reason)
-        data = response.json()
-        try:
-            releases = data['releases']
-        except KeyError:
-            raise APIError('non-comforming JSON API')
-        return [parse_version(k) for k, v in releases.items() if v]
+        data = _read_json(response, PackageNotFound(package))
+        return _parse_versions(data)
+
+    def get_specification(self, candidate):
+        """Get the dependency specification of this candidate.
+
+        Returns a `RequirementSpecification` instance.
+        """
+        info = self._get_version_info(candidate.name, str(candidate.version))
+        return _get_specification_from(info)
 
     def get_dependencies(self, candidate):
         """Discover dependencies for this candidate.
 
         Returns a collection of `Requirement` instances.
         """
-        info = self._get_version_info(candidate.name, str(candidate.version))
-        requires_dist = info.get('requires_dist')
-        if requires_dist is None:
-            return set()
-        reqset = RequirementSpecification.from_data(requires_dist)
-        return reqset.get_dependencies(candidate.extras)
+        spec = self.get_specification(candidate)
+        return spec.get_dependencies(candidate.extras)
 
     def get_candidates(self, requirement):
         """Find candidates for this requirement.
 
-        Returns a collection of `Candidate` instances.
+        Returns a list of `Candidate` instances, newest first.
         """
-        return set(
-            Candidate.pin_from(requirement, version)
-            for version in self._get_versions(requirement.name)
-        )
+        releases = self._get_versions(requirement.name)
+        return _get_candidates_from(releases, requirement)
+
+    def iter_candidates(self, requirement, prereleases=False):
+        """Iterate through candidates for this requirement, newest first.
+
+        Candidates are created lazily, see `simpleapi.IndexServer`.
+        """
+        releases = self._get_versions(requirement.name)
+        return _iter_candidates_from(releases, requirement, prereleases)
+
+
+register_cache('json_api.version_info', IndexServer._get_version_info)
+register_cache('json_api.versions', IndexServer._get_versions)
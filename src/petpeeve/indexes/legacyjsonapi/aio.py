@@ -0,0 +1,72 @@
+from petpeeve.aio import AsyncTransport, async_lru_cache
+
+from ..exceptions import PackageNotFound, VersionNotFound
+from . import (
+    PYPI_PACKAGE_CACHE_SIZE, PYPI_VERSION_CACHE_SIZE,
+    _get_api_url, _get_candidates_from, _get_specification_from,
+    _iter_candidates_from, _parse_version_info, _parse_versions, _read_json,
+)
+
+
+class AsyncIndexServer(object):
+    """asyncio counterpart of `IndexServer`.
+    """
+    def __init__(self, base_url, transport=None):
+        self.base_url = base_url
+        if transport is None:
+            transport = AsyncTransport()
+        self.transport = transport
+
+    async def _get(self, *parts):
+        """Access an API endpoint.
+        """
+        url = _get_api_url(self.base_url, *parts)
+        response = await self.transport.get_metadata(url)
+        return response
+
+    @async_lru_cache(maxsize=PYPI_VERSION_CACHE_SIZE)
+    async def _get_version_info(self, package, ver):
+        response = await self._get(package, ver)
+        data = _read_json(response, VersionNotFound(package, ver))
+        return _parse_version_info(data)
+
+    @async_lru_cache(maxsize=PYPI_PACKAGE_CACHE_SIZE)
+    async def _get_versions(self, package):
+        response = await self._get(package)
+        data = _read_json(response, PackageNotFound(package))
+        return _parse_versions(data)
+
+    async def get_specification(self, candidate):
+        """Get the dependency specification of this candidate.
+
+        Returns a `RequirementSpecification` instance.
+        """
+        info = await self._get_version_info(
+            candidate.name, str(candidate.version),
+        )
+        return _get_specification_from(info)
+
+    async def get_dependencies(self, candidate):
+        """Discover dependencies for this candidate.
+
+        Returns a collection of `Requirement` instances.
+        """
+        spec = await self.get_specification(candidate)
+        return spec.get_dependencies(candidate.extras)
+
+    async def get_candidates(self, requirement):
+        """Find candidates for this requirement.
+
+        Returns a list of `Candidate` instances, newest first.
+        """
+        releases = await self._get_versions(requirement.name)
+        return _get_candidates_from(releases, requirement)
+
+    async def iter_candidates(self, requirement, prereleases=False):
+        """Iterate through candidates for this requirement, newest first.
+
+        The version list is fetched asynchronously; iteration itself does no
+        I/O.
+        """
+        releases = await self._get_versions(requirement.name)
+        return _iter_candidates_from(releases, requirement, prereleases)
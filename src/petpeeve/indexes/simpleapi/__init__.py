@@ -1,14 +1,57 @@
+import functools
+import json
+import logging
 import posixpath
 
-from pip._vendor import requests, six
-from pip._vendor.packaging import specifiers as packaging_specifiers
+from pip._vendor import six
 
 from petpeeve._compat.functools import lru_cache
 from petpeeve.candidates import Candidate
-from petpeeve.links import parse_link, UnwantedLink
+from petpeeve.instrumentation import register_cache, timed
+from petpeeve.links import (
+    parse_link, parse_python_specifier, UnwantedLink, WheelNotFoundError,
+    EMPTY_SPECIFIER,
+)
 from petpeeve.requirements import RequirementSpecification
+from petpeeve.transports import Transport
+from petpeeve.versions import VersionIndex
 
+from ..batch import BatchMixin
 from ..exceptions import APIError, PackageNotFound, VersionNotFound
+from ..yanks import iter_unyanked
+
+
+logger = logging.getLogger('petpeeve.indexes')
+
+
+# Prefer the JSON API (PEP 691), but accept HTML as well.
+SIMPLE_API_ACCEPT = ', '.join([
+    'application/vnd.pypi.simple.v1+json',
+    'application/vnd.pypi.simple.v1+html;q=0.2',
+    'text/html;q=0.1',
+])
+
+SIMPLE_API_JSON_CONTENT_TYPE = 'application/vnd.pypi.simple.v1+json'
+
+
+def _parse_metadata_attr(value):
+    """Parse the metadata file attribute (PEP 658) into a checksum.
+
+    The value is either "true", or a checksum like "sha256=abcd". Returns
+    `None` if the file is not available.
+    """
+    if not value or value.lower() == 'false':
+        return None
+    if value.lower() == 'true':
+        return ''
+    return value
+
+
+def _resolve_url(base_url, url):
+    # Most indexes use absolute URLs. Skip the costly join for them.
+    if url.startswith(('https://', 'http://')):
+        return url
+    return six.moves.urllib_parse.urljoin(base_url, url)
 
 
 class SimplePageParser(six.moves.html_parser.HTMLParser):
@@ -17,95 +60,393 @@ class SimplePageParser(six.moves.html_parser.HTMLParser):
     def __init__(self, base_url):
         # Can't use super() because HTMLParser was an old-style class.
         six.moves.html_parser.HTMLParser.__init__(self)
-        self.base_url_parts = six.moves.urllib_parse.urlsplit(base_url)
+        self.base_url = base_url
         self.links = []
 
     def handle_starttag(self, tag, attrs):
         if tag != 'a':
             return
-        url_parts = None
-        python_specifier = packaging_specifiers.SpecifierSet('')
+        url = None
+        python_specifier = EMPTY_SPECIFIER
+        metadata_checksum = None
+        yanked = None
         for attr, value in attrs:
             if attr == 'href':
-                url_parts = six.moves.urllib_parse.urlsplit(value)
-                replacements = {
-                    fn: part
-                    for fn, part in zip(url_parts._fields, url_parts)
-                    if part or fn == 'fragment'
-                }
-                url_parts = self.base_url_parts._replace(**replacements)
+                url = _resolve_url(self.base_url, value)
             elif attr == 'data-requires-python':
-                python_specifier = packaging_specifiers.SpecifierSet(value)
-        if not url_parts:
+                python_specifier = parse_python_specifier(value)
+            elif attr == 'data-core-metadata':   # PEP 714.
+                metadata_checksum = _parse_metadata_attr(value)
+            elif attr == 'data-dist-info-metadata':  # PEP 658.
+                if metadata_checksum is None:
+                    metadata_checksum = _parse_metadata_attr(value)
+            elif attr == 'data-yanked':  # PEP 592.
+                yanked = value or ''
+        if not url:
             return
         try:
-            link = parse_link(url_parts, python_specifier)
+            link = parse_link(url, python_specifier, metadata_checksum, yanked)
         except UnwantedLink:
             return
         self.links.append(link)
 
 
+def _format_checksum(hashes):
+    """Format a PEP 691 hash mapping into a checksum like "sha256=abcd".
+    """
+    if not hashes:
+        return ''
+    name = 'sha256' if 'sha256' in hashes else sorted(hashes)[0]
+    return '{}={}'.format(name, hashes[name])
+
+
+def _parse_json_metadata_value(value):
+    if not value:
+        return None
+    if value is True:
+        return ''
+    return _format_checksum(value)
+
+
+def parse_json_page(page_url, data):
+    """Build links from a PEP 691 JSON simple page.
+
+    `data` is the decoded JSON content. Relative URLs are resolved against
+    `page_url`.
+    """
+    links = []
+    for entry in data['files']:
+        url = '{}#{}'.format(
+            _resolve_url(page_url, entry['url']).partition('#')[0],
+            _format_checksum(entry.get('hashes')),
+        )
+        python_specifier = parse_python_specifier(
+            entry.get('requires-python'),
+        )
+        metadata = entry.get('core-metadata')   # PEP 714.
+        if metadata is None:
+            metadata = entry.get('dist-info-metadata')
+        yanked = entry.get('yanked')
+        if yanked is True:
+            yanked = ''
+        elif not yanked:
+            yanked = None
+        try:
+            link = parse_link(
+                url, python_specifier,
+                _parse_json_metadata_value(metadata), yanked,
+            )
+        except UnwantedLink:
+            continue
+        links.append(link)
+    return links
+
+
 PYPI_PAGE_CACHE_SIZE = 64   # Should be reasonable?
 
 
-def _link_sort_key(link):
+def _link_sort_key(link, target=None):
+    """Sort key to find the best link to use.
+
+    Compatible wheels come first, best-matching tags first. Incompatible
+    wheels are next, since reading their metadata does not need a build.
+    Sdists come last. Yanked files come after all of those.
+    """
+    yanked = link.yanked is not None
     try:
-        is_binary_compatible = link.is_binary_compatible
+        get_compatibility_priority = link.get_compatibility_priority
     except AttributeError:
-        return 0
-    return 1 if is_binary_compatible() else -1
+        return (yanked, 2, 0)
+    priority = get_compatibility_priority(target)
+    if priority is None:
+        return (yanked, 1, 0)
+    return (yanked, 0, priority)
 
 
-def _get_dependencies_from(link, extras, offline):
-    wheel = link.as_wheel(offline=offline)
-    reqset = RequirementSpecification.from_wheel(wheel)
-    return reqset.get_dependencies(extras)
+class PackageLinks(object):
+    """Links found on a simple page, indexed by version.
 
+    The index is built when first needed, so a page is parsed into versions
+    only once, no matter how many candidates are looked up.
+    """
+    __slots__ = ['links', '_by_version', '_version_index', '_yanked',
+                 '_sorted']
 
-class IndexServer(object):
+    def __init__(self, links):
+        self.links = links
+        self._by_version = None
+        self._version_index = None
+        self._yanked = None
+        self._sorted = {}
 
-    def __init__(self, base_url):
+    def __repr__(self):
+        return '<{type} ({count} links)>'.format(
+            type=type(self).__name__,
+            count=len(self.links),
+        )
+
+    def __iter__(self):
+        return iter(self.links)
+
+    def __len__(self):
+        return len(self.links)
+
+    def __getitem__(self, i):
+        return self.links[i]
+
+    def _get_index(self):
+        if self._by_version is None:
+            by_version = {}
+            for link in self.links:
+                by_version.setdefault(link.info.version, []).append(link)
+            self._by_version = by_version
+        return self._by_version
+
+    @property
+    def versions(self):
+        """Distinct versions found on the page.
+        """
+        return list(self._get_index())
+
+    @property
+    def version_index(self):
+        """Distinct versions found on the page, as a `VersionIndex`.
+        """
+        if self._version_index is None:
+            self._version_index = VersionIndex(self._get_index())
+        return self._version_index
+
+    @property
+    def yanked(self):
+        """Versions with all their files yanked, mapped to the reason.
+
+        Reasons given on the files are joined; the reason may be empty.
+        """
+        if self._yanked is None:
+            yanked = {}
+            for version, links in self._get_index().items():
+                if any(link.yanked is None for link in links):
+                    continue
+                reasons = set(link.yanked for link in links)
+                yanked[version] = '; '.join(sorted(r for r in reasons if r))
+            self._yanked = yanked
+        return self._yanked
+
+    def get_for_version(self, version, target=None):
+        """Find links matching the version, sorted by preference.
+
+        Wheels are ranked by compatibility with `target`, a
+        `TargetEnvironment`, or the environment we run in if `None`.
+        """
+        key = (version, target)
+        try:
+            return self._sorted[key]
+        except KeyError:
+            pass
+        links = sorted(
+            self._get_index().get(version, []),
+            key=functools.partial(_link_sort_key, target=target),
+        )
+        self._sorted[key] = links
+        return links
+
+
+def _parse_package_page(package, base_url, response):
+    """Parse a simple page response into a `PackageLinks` instance.
+
+    Relative URLs are resolved against the response's URL, falling back to
+    `base_url` if it is not available.
+    """
+    if response.status_code == 404:
+        raise PackageNotFound(package)
+    elif not response.ok:
+        raise APIError(response.reason)
+    page_url = response.url or base_url
+    content_type = response.headers.get('Content-Type', '')
+    if content_type.startswith(SIMPLE_API_JSON_CONTENT_TYPE):
+        try:
+            return PackageLinks(_parse_json_text(page_url, response.text))
+        except (KeyError, TypeError, ValueError):
+            raise APIError('non-conforming JSON simple API')
+    return PackageLinks(_parse_html_text(page_url, response.text))
+
+
+@timed('simple.parse_json')
+def _parse_json_text(page_url, text):
+    return parse_json_page(page_url, json.loads(text))
+
+
+@timed('simple.parse_html')
+def _parse_html_text(page_url, text):
+    parser = SimplePageParser(base_url=page_url)
+    parser.feed(text)
+    return parser.links
+
+
+def _get_specification_from(link, offline, transport):
+    metadata = link.get_metadata(offline=offline, transport=transport)
+    return RequirementSpecification.from_metadata(
+        metadata, artifact=(link.checksum or None),
+    )
+
+
+def _get_specification_offline(links):
+    """Find dependencies with whatever artifact is available locally.
+
+    Links are tried in order of preference, so e.g. a wheel built from the
+    sdist is used if the preferred wheel was never downloaded.
+    """
+    for link in links:
+        try:
+            return _get_specification_from(link, True, None)
+        except WheelNotFoundError:
+            continue
+    raise WheelNotFoundError(links[0].filename)
+
+
+def _get_hashes_from(links):
+    return sorted(set(link.checksum for link in links if link.checksum))
+
+
+def _is_installable(link, target):
+    try:
+        is_binary_compatible = link.is_binary_compatible
+    except AttributeError:  # An sdist; a wheel can be built from it.
+        return True
+    return is_binary_compatible(target)
+
+
+def _get_install_link_from(candidate, links, target):
+    """Find the best link to install from, skipping incompatible wheels.
+
+    Yanked files are sorted last, so one is only used if nothing else is
+    available; the reason it was yanked is logged.
+    """
+    for link in links:
+        if not _is_installable(link, target):
+            continue
+        if link.yanked is not None:
+            logger.warning(
+                'Using yanked file %s; reason: %s', link.filename,
+                link.yanked or '<none given>',
+            )
+        return link
+    raise VersionNotFound(candidate.name, str(candidate.version))
+
+
+def _get_candidates_from(links, requirement):
+    specifier = requirement.specifier
+    versions = iter_unyanked(
+        links.version_index.filter(specifier), specifier, links.yanked,
+        requirement.name,
+    )
+    return [
+        Candidate.from_requirement(requirement, version)
+        for version in versions
+    ]
+
+
+def _iter_candidates_from(links, requirement, prereleases):
+    specifier = requirement.specifier
+    versions = iter_unyanked(
+        links.version_index.iter_matching(specifier, prereleases),
+        specifier, links.yanked, requirement.name,
+    )
+    for version in versions:
+        yield Candidate.from_requirement(requirement, version)
+
+
+class IndexServer(BatchMixin):
+    """A simple API (PEP 503) server.
+
+    Artifacts are selected for `target`, a `TargetEnvironment`. The
+    environment we run in is used if not given.
+    """
+    def __init__(self, base_url, transport=None, target=None):
         self.base_url = base_url
+        if transport is None:
+            transport = Transport()
+        self.transport = transport
+        self.target = target
 
     @lru_cache(maxsize=PYPI_PAGE_CACHE_SIZE)
     def _get_package_links(self, package):
         """Get links on a simple API page.
         """
         url = posixpath.join(self.base_url, package)
-        response = requests.get(url)
-        if response.status_code == 404:
-            raise PackageNotFound(package)
-        elif not response.ok:
-            raise APIError(response.reason)
-        parser = SimplePageParser(base_url=self.base_url)
-        parser.feed(response.text)
-        return parser.links
+        response = self.transport.get_metadata(
+            url, headers={'Accept': SIMPLE_API_ACCEPT},
+        )
+        return _parse_package_page(package, self.base_url, response)
 
     def _get_links(self, candidate):
-        return sorted((
-            link for link in self._get_package_links(candidate.name)
-            if link.info.version == candidate.version
-        ), key=_link_sort_key)
+        links = self._get_package_links(candidate.name)
+        return links.get_for_version(candidate.version, target=self.target)
+
+    def get_specification(self, candidate, offline=False):
+        """Get the dependency specification of this candidate.
+
+        Returns a `RequirementSpecification` instance.
+        """
+        if candidate.url:
+            link = parse_link(candidate.url)
+            return _get_specification_from(link, offline, self.transport)
+        links = self._get_links(candidate)
+        if not links:
+            raise VersionNotFound(candidate.name, str(candidate.version))
+        if offline:
+            return _get_specification_offline(links)
+        return _get_specification_from(links[0], offline, self.transport)
 
     def get_dependencies(self, candidate, offline=False):
         """Discover dependencies for this candidate.
 
         Returns a collection of `Requirement` instances.
         """
+        spec = self.get_specification(candidate, offline=offline)
+        return spec.get_dependencies(candidate.extras)
+
+    def get_hashes(self, candidate):
+        """Get checksums of all artifacts of this candidate.
+
+        Returns a sorted list of strings like "sha256=abcd", for use as
+        hashes in a lock. Artifacts listed without a checksum are left out.
+        """
         if candidate.url:
-            link = parse_link(candidate.url)
-            return _get_dependencies_from(link, candidate.extras, offline)
+            return _get_hashes_from([parse_link(candidate.url)])
+        return _get_hashes_from(self._get_links(candidate))
+
+    def get_install_link(self, candidate):
+        """Find the artifact to install this candidate from.
+
+        This is the wheel most compatible with the target, or an sdist to
+        build a wheel from if there is no compatible wheel. Raises
+        `VersionNotFound` if there is neither.
+        """
+        if candidate.url:
+            return parse_link(candidate.url)
         links = self._get_links(candidate)
-        if links:
-            return _get_dependencies_from(links[0], candidate.extras, offline)
-        raise VersionNotFound(candidate.name, str(candidate.version))
+        return _get_install_link_from(candidate, links, self.target)
 
     def get_candidates(self, requirement):
         """Find candidates for this requirement.
 
-        Returns a collection of `Candidate` instances.
+        Returns a list of `Candidate` instances, newest first.
         """
-        return set(
-            Candidate.pin_from(requirement, link.info.version)
-            for link in self._get_package_links(requirement.name)
-        )
+        links = self._get_package_links(requirement.name)
+        return _get_candidates_from(links, requirement)
+
+    def iter_candidates(self, requirement, prereleases=False):
+        """Iterate through candidates for this requirement, newest first.
+
+        Unlike `get_candidates`, a `Candidate` is only created when the
+        iterator gets to it, so a caller that only needs the first few does
+        not pay for the rest. Iterating again is cheap, since the versions
+        are cached. Pre-releases are skipped unless `prereleases` is true
+        or the specifier asks for them.
+        """
+        links = self._get_package_links(requirement.name)
+        return _iter_candidates_from(links, requirement, prereleases)
+
+
+register_cache('simple.package_links', IndexServer._get_package_links)
@@ -0,0 +1,112 @@
+import asyncio
+import posixpath
+
+from petpeeve.aio import AsyncTransport, async_lru_cache
+from petpeeve.links import parse_link
+from petpeeve.transports import Transport
+
+from ..exceptions import VersionNotFound
+from . import (
+    PYPI_PAGE_CACHE_SIZE, SIMPLE_API_ACCEPT,
+    _get_candidates_from, _get_hashes_from, _get_install_link_from,
+    _get_specification_from, _get_specification_offline,
+    _iter_candidates_from, _parse_package_page,
+)
+
+
+class AsyncIndexServer(object):
+    """asyncio counterpart of `IndexServer`.
+
+    Artifacts are downloaded in the loop's default executor, through
+    `sync_transport`, a `Transport`. If not given, one sharing the HTTP
+    cache of `transport` is created.
+    """
+    def __init__(
+            self, base_url, transport=None, target=None,
+            sync_transport=None):
+        self.base_url = base_url
+        if transport is None:
+            transport = AsyncTransport()
+        self.transport = transport
+        if sync_transport is None:
+            sync_transport = Transport(cache=transport.cache)
+        self.sync_transport = sync_transport
+        self.target = target
+
+    @async_lru_cache(maxsize=PYPI_PAGE_CACHE_SIZE)
+    async def _get_package_links(self, package):
+        """Get links on a simple API page.
+        """
+        url = posixpath.join(self.base_url, package)
+        response = await self.transport.get_metadata(
+            url, headers={'Accept': SIMPLE_API_ACCEPT},
+        )
+        return _parse_package_page(package, self.base_url, response)
+
+    async def _get_links(self, candidate):
+        links = await self._get_package_links(candidate.name)
+        return links.get_for_version(candidate.version, target=self.target)
+
+    async def get_specification(self, candidate, offline=False):
+        """Get the dependency specification of this candidate.
+
+        Returns a `RequirementSpecification` instance.
+
+        Artifacts are downloaded (and maybe built) in the loop's default
+        executor, since asyncio does not help with either.
+        """
+        loop = asyncio.get_event_loop()
+        if candidate.url:
+            link = parse_link(candidate.url)
+        else:
+            links = await self._get_links(candidate)
+            if not links:
+                raise VersionNotFound(candidate.name, str(candidate.version))
+            if offline:
+                return await loop.run_in_executor(
+                    None, _get_specification_offline, links,
+                )
+            link = links[0]
+        return await loop.run_in_executor(
+            None, _get_specification_from, link, offline,
+            self.sync_transport,
+        )
+
+    async def get_dependencies(self, candidate, offline=False):
+        """Discover dependencies for this candidate.
+
+        Returns a collection of `Requirement` instances.
+        """
+        spec = await self.get_specification(candidate, offline=offline)
+        return spec.get_dependencies(candidate.extras)
+
+    async def get_hashes(self, candidate):
+        """Get checksums of all artifacts of this candidate.
+        """
+        if candidate.url:
+            return _get_hashes_from([parse_link(candidate.url)])
+        return _get_hashes_from(await self._get_links(candidate))
+
+    async def get_install_link(self, candidate):
+        """Find the artifact to install this candidate from.
+        """
+        if candidate.url:
+            return parse_link(candidate.url)
+        links = await self._get_links(candidate)
+        return _get_install_link_from(candidate, links, self.target)
+
+    async def get_candidates(self, requirement):
+        """Find candidates for this requirement.
+
+        Returns a list of `Candidate` instances, newest first.
+        """
+        links = await self._get_package_links(requirement.name)
+        return _get_candidates_from(links, requirement)
+
+    async def iter_candidates(self, requirement, prereleases=False):
+        """Iterate through candidates for this requirement, newest first.
+
+        The page is fetched asynchronously; iteration itself does no I/O.
+        """
+        links = await self._get_package_links(requirement.name)
+        return _iter_candidates_from(links, requirement, prereleases)
@@ -0,0 +1,35 @@
+"""Skipping yanked releases, as PEP 592 asks.
+
+A version is yanked when every file of it is. Yanked versions are left out
+of candidate selection, unless a requirement pins one exactly with "==" or
+"===", so a project that needs it can still be installed.
+"""
+
+import logging
+
+from petpeeve.utils import is_version_pinned
+
+
+logger = logging.getLogger('petpeeve.indexes')
+
+
+def iter_unyanked(versions, specifier, yanked, name):
+    """Iterate through `versions`, skipping the yanked ones.
+
+    `yanked` maps yanked versions to the reason they are yanked, which may
+    be empty. A yanked version is kept if `specifier` pins it; the reason is
+    logged then.
+    """
+    for version in versions:
+        try:
+            reason = yanked[version]
+        except KeyError:
+            yield version
+            continue
+        if not is_version_pinned(specifier, version):
+            continue
+        logger.warning(
+            'Using yanked %s %s; reason: %s', name, version,
+            reason or '<none given>',
+        )
+        yield version
@@ -0,0 +1,597 @@
+"""Install wheels of resolved candidates into an environment.
+
+Installing has three stages: wheels are fetched into the wheel cache
+(downloaded, or built from sdists), unpacked into the environment's
+directories, and their Python files compiled to bytecode. Fetching and
+unpacking run on a thread pool, each wheel unpacked as soon as it is
+fetched. Compiling runs in separate processes, so it is not held back by
+the GIL.
+"""
+
+import base64
+import collections
+import email.parser
+import hashlib
+import io
+import logging
+import os
+import re
+import shutil
+import stat
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import zipfile
+
+from pip._vendor import six
+from pip._vendor.distlib.scripts import ScriptMaker
+from pip._vendor.packaging.utils import canonicalize_name
+from pip._vendor.packaging.version import parse as parse_version
+
+from ._compat.futures import ThreadPoolExecutor, as_completed
+from ._compat.importlib import cache_from_source
+from ._compat.os import makedirs
+from .builds import get_cpu_count
+from .links import WheelNotFoundError
+
+
+logger = logging.getLogger('petpeeve.installs')
+
+
+DEFAULT_INSTALL_WORKERS = 8
+
+INSTALLER_NAME = 'petpeeve'
+
+COPY_CHUNK_SIZE = 1 << 16
+
+# Wheel contents not to install; RECORD and INSTALLER are written anew.
+SKIPPED_METADATA = ['RECORD', 'RECORD.jws', 'RECORD.p7s', 'INSTALLER']
+
+_DIST_INFO_RE = re.compile(r'^(?P<name>.+?)-(?P<version>[^-]+)\.dist-info$')
+
+
+class InstallError(Exception):
+    """Installing a candidate failed.
+    """
+    def __init__(self, candidate, message):
+        super(InstallError, self).__init__(candidate, message)
+        self.candidate = candidate
+        self.message = message
+
+    def __str__(self):
+        return 'failed to install {}: {}'.format(self.candidate, self.message)
+
+
+def get_scheme(prefix=None):
+    """Get directories to install files into.
+
+    These are the running interpreter's, or those under `prefix` if given.
+    Returns a dict keyed by wheel data directory names: "purelib",
+    "platlib", "headers", "scripts" and "data". Each distribution puts its
+    headers into a subdirectory of "headers".
+    """
+    variables = None
+    if prefix is not None:
+        variables = {
+            'base': prefix, 'platbase': prefix,
+            'installed_base': prefix, 'installed_platbase': prefix,
+        }
+    paths = sysconfig.get_paths(vars=variables)
+    return {
+        'purelib': paths['purelib'],
+        'platlib': paths['platlib'],
+        'headers': paths['include'],
+        'scripts': paths['scripts'],
+        'data': paths['data'],
+    }
+
+
+def _list_installed(scheme):
+    """Find distributions installed in the scheme's library directories.
+
+    Returns a dict mapping each name (normalized) to a list of 2-tuples
+    `(dist_info_path, version)`.
+    """
+    installed = collections.defaultdict(list)
+    for libdir in sorted(set([scheme['purelib'], scheme['platlib']])):
+        try:
+            filenames = os.listdir(libdir)
+        except OSError:
+            continue
+        for fn in filenames:
+            match = _DIST_INFO_RE.match(fn)
+            if not match:
+                continue
+            name = canonicalize_name(match.group('name'))
+            version = parse_version(match.group('version'))
+            installed[name].append((os.path.join(libdir, fn), version))
+    return installed
+
+
+def _parse_record_path(line):
+    path = line.rstrip('\r\n').rsplit(',', 2)[0]
+    if path.startswith('"') and path.endswith('"'):
+        path = path[1:-1].replace('""', '"')
+    return path
+
+
+def _format_record_row(path, digest, size):
+    if ',' in path or '"' in path:
+        path = '"{}"'.format(path.replace('"', '""'))
+    return u'{},{},{}\n'.format(path, digest, size)
+
+
+class StashedUninstall(object):
+    """An installed distribution, with its files moved aside.
+
+    `stash()` moves the files listed in the RECORD (and their bytecode)
+    into a temporary directory. Then either `commit()` deletes them, or
+    `rollback()` puts them back. A distribution without a RECORD cannot be
+    removed; it is left alone, with a warning.
+
+    Directories are never removed here, since other threads may be
+    installing into them. `directories` lists those that may be left empty,
+    for `remove_empty_directories()` once nothing else is installing.
+    """
+    def __init__(self, dist_info):
+        self.dist_info = dist_info
+        self.directories = set()
+        self._stash_dir = None
+        self._moved = []
+
+    def __repr__(self):
+        return '<{type} {dist_info!r}>'.format(
+            type=type(self).__name__,
+            dist_info=self.dist_info,
+        )
+
+    def _read_record(self):
+        libdir = os.path.dirname(self.dist_info)
+        try:
+            with io.open(os.path.join(self.dist_info, 'RECORD'),
+                         encoding='utf-8') as f:
+                paths = [
+                    _parse_record_path(line) for line in f if line.strip()
+                ]
+        except (IOError, OSError):
+            return None
+        found = []
+        for path in paths:
+            path = os.path.normpath(os.path.join(libdir, path))
+            found.append(path)
+            if path.endswith('.py'):
+                found.append(cache_from_source(path))
+        return found
+
+    def _move(self, path):
+        stashed = os.path.join(self._stash_dir, str(len(self._moved)))
+        shutil.move(path, stashed)
+        self._moved.append((path, stashed))
+
+    def stash(self):
+        paths = self._read_record()
+        if paths is None:
+            logger.warning('Cannot uninstall %s without a RECORD',
+                           self.dist_info)
+            return
+        libdir = os.path.dirname(self.dist_info)
+        self._stash_dir = tempfile.mkdtemp(prefix='petpeeve-uninstall-')
+        try:
+            for path in paths:
+                if not os.path.lexists(path):   # Already gone.
+                    continue
+                self._move(path)
+                directory = os.path.dirname(path)
+                while directory.startswith(libdir) and directory != libdir:
+                    self.directories.add(directory)
+                    directory = os.path.dirname(directory)
+            if os.path.lexists(self.dist_info):
+                self._move(self.dist_info)
+        except (IOError, OSError):
+            self.rollback()
+            raise
+
+    def rollback(self):
+        """Move stashed files back where they were.
+        """
+        for path, stashed in reversed(self._moved):
+            makedirs(os.path.dirname(path))
+            shutil.move(stashed, path)
+        self._moved = []
+        self.directories = set()
+        self._remove_stash_dir()
+
+    def commit(self):
+        """Delete the stashed files.
+        """
+        self._moved = []
+        self._remove_stash_dir()
+
+    def _remove_stash_dir(self):
+        if self._stash_dir is not None:
+            shutil.rmtree(self._stash_dir, ignore_errors=True)
+            self._stash_dir = None
+
+
+def remove_empty_directories(directories):
+    """Remove the directories that are empty, deepest first.
+    """
+    for directory in sorted(set(directories), key=len, reverse=True):
+        try:
+            os.rmdir(directory)
+        except OSError:     # Not empty.
+            pass
+
+
+def uninstall(dist_info):
+    """Remove an installed distribution's files, as listed in its RECORD.
+
+    Directories left empty are removed too. A distribution without a
+    RECORD cannot be removed; it is left alone, with a warning. Do not call
+    this while something else installs into the same directories.
+    """
+    stash = StashedUninstall(dist_info)
+    stash.stash()
+    stash.commit()
+    remove_empty_directories(stash.directories)
+
+
+def _find_dist_info(names):
+    for name in names:
+        parts = name.split('/')
+        if (len(parts) == 2 and parts[0].endswith('.dist-info') and
+                parts[1] == 'WHEEL'):
+            return parts[0]
+    raise ValueError('no .dist-info directory found')
+
+
+def _read_text(zf, name):
+    return zf.read(name).decode('utf-8')
+
+
+def _parse_entry_points(text):
+    """Parse entry_points.txt into a dict of sections, of `(name, value)`.
+    """
+    sections = collections.defaultdict(list)
+    section = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith(('#', ';')):
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            section = line[1:-1].strip()
+            continue
+        name, sep, value = line.partition('=')
+        if section and sep:
+            sections[section].append((name.strip(), value.strip()))
+    return sections
+
+
+def _get_digest(hasher):
+    digest = base64.urlsafe_b64encode(hasher.digest()).rstrip(b'=')
+    return 'sha256=' + digest.decode('ascii')
+
+
+def _copy(src, path):
+    """Copy a file object into `path`, and get the copy's digest and size.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as dst:
+        while True:
+            chunk = src.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            dst.write(chunk)
+            size += len(chunk)
+    return _get_digest(hasher), size
+
+
+def _hash_file(path):
+    with open(path, 'rb') as f:
+        hasher = hashlib.sha256(f.read())
+    return _get_digest(hasher), os.path.getsize(path)
+
+
+def _fix_shebang(data):
+    """Point a "#!python" script to the interpreter we run in.
+    """
+    if not data.startswith(b'#!python'):
+        return data
+    first, newline, rest = data.partition(b'\n')
+    args = first[len(b'#!python'):]
+    if args.startswith(b'w'):
+        args = args[1:]
+    executable = sys.executable
+    if isinstance(executable, six.text_type):
+        executable = executable.encode(sys.getfilesystemencoding())
+    return b'#!' + executable + args + newline + rest
+
+
+def _make_executable(path):
+    mode = os.stat(path).st_mode
+    os.chmod(path, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def _get_destination(name, dist_info, scheme, libdir):
+    """Find where a file in a wheel goes.
+
+    Returns a 2-tuple `(path, is_script)`. Raises `ValueError` if the file
+    would end up outside its directory.
+    """
+    name_version = dist_info[:-len('.dist-info')]
+    data_dir = name_version + '.data'
+    parts = name.split('/')
+    is_script = False
+    if parts[0] != data_dir:
+        base = libdir
+    elif len(parts) < 3 or parts[1] not in scheme:
+        raise ValueError('unknown data directory in {}'.format(name))
+    else:
+        key, parts = parts[1], parts[2:]
+        base = scheme[key]
+        if key == 'headers':
+            base = os.path.join(base, name_version.rsplit('-', 1)[0])
+        is_script = (key == 'scripts')
+    path = os.path.normpath(os.path.join(base, *parts))
+    if not path.startswith(os.path.join(base, '')):
+        raise ValueError('unsafe path {}'.format(name))
+    return path, is_script
+
+
+def _make_entry_point_scripts(entry_points, directory):
+    """Write launcher scripts for console and GUI entry points.
+    """
+    if not (entry_points.get('console_scripts') or
+            entry_points.get('gui_scripts')):
+        return []
+    makedirs(directory)
+    maker = ScriptMaker(None, directory)
+    maker.clobber = True
+    maker.variants = set([''])
+    filenames = []
+    for section, options in [('console_scripts', None),
+                             ('gui_scripts', {'gui': True})]:
+        for name, value in entry_points.get(section, ()):
+            value = value.split('[', 1)[0].strip()  # Extras are not flags.
+            specification = '{} = {}'.format(name, value)
+            filenames.extend(maker.make(specification, options))
+    return filenames
+
+
+def install_wheel(path, scheme, compile=True):
+    """Unpack a wheel into the scheme's directories.
+
+    Scripts in the wheel get the running interpreter in their shebang, and
+    entry points get launcher scripts. An INSTALLER file and a RECORD are
+    written into the dist-info directory. The RECORD lists every file
+    written, and the bytecode `compile_bytecode()` will write for the Python
+    files if `compile` is true.
+
+    If unpacking fails, files written so far are removed again, and the
+    dist-info directory with them, so the distribution does not look
+    installed. Returns a list of the Python files installed, to compile.
+    """
+    written = []
+    try:
+        return _install_wheel(path, scheme, compile, written)
+    except Exception:
+        for dest, _, _ in written:
+            try:
+                os.remove(dest)
+            except OSError:
+                pass
+        # Only this distribution uses it; other directories may be shared
+        # with concurrent installs, and are left alone.
+        remove_empty_directories(
+            os.path.dirname(dest) for dest, _, _ in written
+            if os.path.basename(os.path.dirname(dest)).endswith('.dist-info')
+        )
+        raise
+
+
+def _install_wheel(path, scheme, compile, written):
+    with zipfile.ZipFile(path) as zf:
+        infos = [i for i in zf.infolist() if not i.filename.endswith('/')]
+        dist_info = _find_dist_info(i.filename for i in infos)
+        wheel = email.parser.Parser().parsestr(
+            _read_text(zf, dist_info + '/WHEEL'),
+        )
+        if wheel.get('Root-Is-Purelib', '').strip().lower() == 'true':
+            libdir = scheme['purelib']
+        else:
+            libdir = scheme['platlib']
+        skipped = set(dist_info + '/' + fn for fn in SKIPPED_METADATA)
+        entry_points = {}
+        if dist_info + '/entry_points.txt' in zf.namelist():
+            entry_points = _parse_entry_points(
+                _read_text(zf, dist_info + '/entry_points.txt'),
+            )
+
+        sources = []
+        for info in infos:
+            if info.filename in skipped:
+                continue
+            dest, is_script = _get_destination(
+                info.filename, dist_info, scheme, libdir,
+            )
+            makedirs(os.path.dirname(dest))
+            # Listed before writing, so a half-written file is cleaned up.
+            written.append((dest, '', ''))
+            with zf.open(info) as src:
+                if is_script:
+                    data = _fix_shebang(src.read())
+                    with open(dest, 'wb') as f:
+                        f.write(data)
+                    _make_executable(dest)
+                    written[-1] = (dest,) + _hash_file(dest)
+                else:
+                    written[-1] = (dest,) + _copy(src, dest)
+            if not is_script and dest.endswith('.py'):
+                sources.append(dest)
+
+    for script in _make_entry_point_scripts(entry_points, scheme['scripts']):
+        written.append((script,) + _hash_file(script))
+    installer = os.path.join(libdir, dist_info, 'INSTALLER')
+    written.append((installer, '', ''))
+    with open(installer, 'wb') as f:
+        f.write(INSTALLER_NAME.encode('ascii') + b'\n')
+    written[-1] = (installer,) + _hash_file(installer)
+
+    record = os.path.join(libdir, dist_info, 'RECORD')
+    rows = list(written)
+    if compile:
+        rows.extend((cache_from_source(p), '', '') for p in sources)
+    rows.append((record, '', ''))
+    written.append((record, '', ''))
+    with io.open(record, 'w', encoding='utf-8') as f:
+        for dest, digest, size in rows:
+            try:
+                dest = os.path.relpath(dest, libdir)
+            except ValueError:  # On another drive.
+                pass
+            dest = dest.replace(os.sep, '/')
+            f.write(_format_record_row(dest, digest, size))
+    return sources
+
+
+def _run_compileall(filenames):
+    """Compile files in a subprocess. Returns whether all compiled.
+    """
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'compileall', '-q', '-i', '-'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    data = '\n'.join(filenames)
+    if isinstance(data, six.text_type):
+        data = data.encode(sys.getfilesystemencoding())
+    output, _ = proc.communicate(data)
+    if proc.returncode != 0:
+        logger.warning('Failed to compile some files:\n%s',
+                       output.decode('utf-8', 'replace').rstrip())
+        return False
+    return True
+
+
+def compile_bytecode(filenames, processes=None):
+    """Compile Python files to bytecode, in parallel processes.
+
+    Files are split evenly among `processes` subprocesses (the number of
+    CPUs by default), each running `compileall` with the interpreter we run
+    in. Like pip, failing to compile is not an error; it is only logged.
+    Returns whether all files compiled.
+    """
+    filenames = list(filenames)
+    if processes is None:
+        processes = get_cpu_count()
+    chunks = [filenames[i::processes] for i in range(processes)]
+    chunks = [chunk for chunk in chunks if chunk]
+    if not chunks:
+        return True
+    with ThreadPoolExecutor(len(chunks)) as executor:
+        futures = [executor.submit(_run_compileall, c) for c in chunks]
+        return all([future.result() for future in futures])
+
+
+class Installer(object):
+    """Install wheels of resolved candidates into an environment.
+
+    `index` needs `get_install_link(candidate)` and a `transport`, like
+    `JSONEnabledIndex`. Files go into `scheme` (see `get_scheme()`), the
+    running interpreter's by default.
+
+    Wheels are fetched from the wheel cache, downloaded or built into it
+    first if needed, and unpacked on a pool of `workers` threads. Bytecode
+    is compiled afterwards in `processes` subprocesses (see
+    `compile_bytecode()`), or not at all if `compile` is false.
+
+    Other installed versions are moved aside before a wheel is unpacked,
+    and moved back if unpacking fails. They are only deleted, with the
+    directories left empty, after every worker is done.
+    """
+    def __init__(self, index, scheme=None, workers=DEFAULT_INSTALL_WORKERS,
+                 processes=None, compile=True):
+        self.index = index
+        if scheme is None:
+            scheme = get_scheme()
+        self.scheme = scheme
+        self.workers = workers
+        self.processes = processes
+        self.compile = compile
+
+    def _install(self, candidate, existing):
+        link = self.index.get_install_link(candidate)
+        try:
+            wheel = link.as_wheel(
+                offline=False, transport=self.index.transport,
+            )
+        except WheelNotFoundError:
+            raise InstallError(candidate, 'no wheel from {}'.format(
+                link.filename,
+            ))
+        stashes = []
+        try:
+            for dist_info in existing:
+                logger.info('Uninstalling %s', os.path.basename(dist_info))
+                stash = StashedUninstall(dist_info)
+                stash.stash()
+                stashes.append(stash)
+            path = os.path.join(wheel.dirname, wheel.filename)
+            sources = install_wheel(path, self.scheme, compile=self.compile)
+        except Exception:
+            for stash in reversed(stashes):
+                stash.rollback()
+            raise
+        return sources, stashes
+
+    def install(self, candidates):
+        """Install candidates, replacing other installed versions of them.
+
+        Candidates already installed at the same version are skipped.
+        Returns a list of the candidates installed. Raises `InstallError`
+        if any of them fails, after the others are installed.
+        """
+        installed = _list_installed(self.scheme)
+        pending = {}
+        sources = []
+        stashes = []
+        failures = []
+        with ThreadPoolExecutor(self.workers) as executor:
+            for candidate in candidates:
+                version = parse_version(str(candidate.version))
+                existing = installed.get(canonicalize_name(candidate.name), [])
+                if any(v == version for _, v in existing):
+                    logger.info('%s is already installed', candidate)
+                    continue
+                future = executor.submit(
+                    self._install, candidate, [p for p, _ in existing],
+                )
+                pending[future] = candidate
+            for future in as_completed(pending):
+                candidate = pending[future]
+                try:
+                    installed_sources, replaced = future.result()
+                except InstallError as e:
+                    logger.error('%s', e)
+                    failures.append(e)
+                except Exception as e:  # Anything from fetching or writing.
+                    logger.error('Failed to install %s: %s', candidate, e)
+                    failures.append(InstallError(candidate, str(e)))
+                else:
+                    sources.extend(installed_sources)
+                    stashes.extend(replaced)
+                    logger.info('Installed %s', candidate)
+        # Nothing is installing any more, so empty directories can go.
+        directories = set()
+        for stash in stashes:
+            stash.commit()
+            directories.update(stash.directories)
+        remove_empty_directories(directories)
+        if self.compile:
+            compile_bytecode(sources, self.processes)
+        if failures:
+            raise failures[0]
+        return sorted(pending.values(), key=str)
@@ -0,0 +1,192 @@
+"""Timings and counters of where the work goes, for profiling.
+
+Nothing is recorded until a `Profile` is enabled with `enable()`. Until
+then, instrumented code pays one global lookup per call and nothing else.
+
+Stages are timed with the `timed()` decorator, and events counted with
+`count()`. Hit rates of `lru_cache` functions registered with
+`register_cache()` are included in the report too.
+"""
+
+import bisect
+import functools
+import threading
+import time
+
+
+# Upper bounds of histogram buckets, in seconds.
+HISTOGRAM_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60]
+
+_profile = None
+
+_caches = {}
+
+
+def _get_cache_info(function):
+    try:
+        return function.cache_info()
+    except AttributeError:  # The no-op lru_cache on Python 2.
+        return None
+
+
+class StageTiming(object):
+    """Timing histogram of a stage.
+    """
+    __slots__ = ['count', 'total', 'min', 'max', 'buckets']
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(HISTOGRAM_BUCKETS, seconds)] += 1
+
+    def as_dict(self):
+        labels = ['<={}'.format(b) for b in HISTOGRAM_BUCKETS]
+        labels.append('>{}'.format(HISTOGRAM_BUCKETS[-1]))
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'histogram': {
+                label: n for label, n in zip(labels, self.buckets) if n
+            },
+        }
+
+
+class Profile(object):
+    """Timings and counters collected while enabled.
+
+    Callables added with `add_hook()` are called as `hook(stage, seconds)`
+    after each timed stage, from whatever thread ran the stage.
+    """
+    def __init__(self):
+        self.counters = {}
+        self.stages = {}
+        self.hooks = []
+        self._cache_baselines = {}
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, stage, seconds):
+        with self._lock:
+            try:
+                timing = self.stages[stage]
+            except KeyError:
+                timing = self.stages[stage] = StageTiming()
+            timing.add(seconds)
+        for hook in self.hooks:
+            hook(stage, seconds)
+
+    def start(self):
+        """Remember where the registered caches are, to report the change.
+        """
+        for name, function in _caches.items():
+            self._cache_baselines[name] = _get_cache_info(function)
+
+    def get_cache_statistics(self):
+        statistics = {}
+        for name, function in sorted(_caches.items()):
+            info = _get_cache_info(function)
+            if info is None:
+                continue
+            hits, misses = info.hits, info.misses
+            baseline = self._cache_baselines.get(name)
+            if baseline is not None:
+                hits -= baseline.hits
+                misses -= baseline.misses
+            statistics[name] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / float(hits + misses) if hits or misses
+                else None,
+                'size': info.currsize,
+                'max_size': info.maxsize,
+            }
+        return statistics
+
+    def as_dict(self):
+        with self._lock:
+            stages = {k: v.as_dict() for k, v in self.stages.items()}
+            counters = dict(self.counters)
+        return {
+            'stages': stages,
+            'counters': counters,
+            'lru_caches': self.get_cache_statistics(),
+        }
+
+
+def enable(profile=None):
+    """Start recording into `profile`, or a new `Profile` if not given.
+
+    Returns the profile.
+    """
+    global _profile
+    if profile is None:
+        profile = Profile()
+    profile.start()
+    _profile = profile
+    return profile
+
+
+def disable():
+    """Stop recording. Returns the profile recorded into, or `None`.
+    """
+    global _profile
+    profile, _profile = _profile, None
+    return profile
+
+
+def get_profile():
+    """Get the profile being recorded into, or `None` if disabled.
+    """
+    return _profile
+
+
+def register_cache(name, function):
+    """Report hit rates of `function`, wrapped by `lru_cache`, as `name`.
+    """
+    _caches[name] = function
+
+
+def count(name, value=1):
+    """Add `value` to the counter `name`, if recording.
+    """
+    profile = _profile
+    if profile is not None:
+        profile.count(name, value)
+
+
+def timed(stage):
+    """Decorator to record time spent in the function as `stage`.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            profile = _profile
+            if profile is None:
+                return f(*args, **kwargs)
+            start = time.time()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                profile.record(stage, time.time() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,160 @@
+import bisect
+import io
+import posixpath
+import zipfile
+
+from pip._vendor.distlib.metadata import (
+    METADATA_FILENAME, WHEEL_METADATA_FILENAME,
+)
+
+from .instrumentation import count, timed
+from .transports import Transport
+from .utils import load_metadata
+
+
+RANGE_CHUNK_SIZE = 64 * 1024    # Enough for most central directories.
+
+
+class RangeRequestNotSupported(OSError):
+    pass
+
+
+class LazyHTTPFile(object):
+    """A read-only, seekable file backed by HTTP range requests.
+
+    Only the parts actually read are downloaded. Each request fetches at
+    least `chunk_size` bytes to avoid lots of tiny round trips. The first
+    request fetches the file's tail, where a zip archive's central directory
+    is, and checks the server supports range requests at all.
+    """
+    def __init__(self, url, transport, chunk_size=RANGE_CHUNK_SIZE):
+        self.url = url
+        self.transport = transport
+        self.chunk_size = chunk_size
+        self._starts = []   # Sorted start offsets of downloaded segments.
+        self._segments = {}
+        self._pos = 0
+        self._length = None
+        self._fetch('bytes=-{}'.format(chunk_size))
+
+    def _fetch(self, range_spec):
+        response = self.transport.get(
+            self.url, headers={'Range': range_spec}, stream=True,
+        )
+        try:
+            response.raise_for_status()
+            content_range = response.headers.get('Content-Range', '')
+            if response.status_code != 206 or not content_range:
+                raise RangeRequestNotSupported(self.url)
+            # Content-Range: bytes <start>-<end>/<length>
+            span, _, length = content_range.split(' ', 1)[-1].partition('/')
+            start = int(span.split('-', 1)[0])
+            data = response.content
+        finally:
+            response.close()
+        count('http.bytes', len(data))
+        if length != '*':
+            self._length = int(length)
+        elif self._length is None:
+            # Seeking from the end needs the total length.
+            raise RangeRequestNotSupported(
+                '{} does not tell its length'.format(self.url),
+            )
+        if start not in self._segments:
+            bisect.insort(self._starts, start)
+        self._segments[start] = data
+
+    def _find(self, start, end):
+        """Find a downloaded segment containing [start, end).
+        """
+        i = bisect.bisect_right(self._starts, start) - 1
+        if i < 0:
+            return None
+        segment_start = self._starts[i]
+        data = self._segments[segment_start]
+        if segment_start + len(data) < end:
+            return None
+        return data[start - segment_start:end - segment_start]
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self._length + offset
+        else:
+            raise ValueError('invalid whence {!r}'.format(whence))
+        return self._pos
+
+    def read(self, size=-1):
+        end = self._length
+        if size is not None and size >= 0:
+            end = min(self._pos + size, self._length)
+        if end <= self._pos:
+            return b''
+        data = self._find(self._pos, end)
+        if data is None:
+            fetch_end = min(
+                max(end, self._pos + self.chunk_size), self._length,
+            )
+            self._fetch('bytes={}-{}'.format(self._pos, fetch_end - 1))
+            data = self._find(self._pos, end)
+            if data is None:
+                raise IOError('short read from {}'.format(self.url))
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        self._segments.clear()
+
+
+def _find_info_dir(zf):
+    for name in zf.namelist():
+        info_dir, _, basename = name.partition('/')
+        if info_dir.endswith('.dist-info') and basename == 'METADATA':
+            return info_dir
+    raise ValueError('Invalid wheel, because .dist-info is missing')
+
+
+def _read_remote_wheel_metadata(url, transport):
+    f = LazyHTTPFile(url, transport)
+    with zipfile.ZipFile(f) as zf:
+        info_dir = _find_info_dir(zf)
+        # Same lookup order as distlib.
+        for fn in [WHEEL_METADATA_FILENAME, METADATA_FILENAME, 'METADATA']:
+            try:
+                data = zf.read(posixpath.join(info_dir, fn))
+            except KeyError:
+                continue
+            metadata = load_metadata(data)
+            if metadata:
+                return metadata
+    raise ValueError('Invalid wheel, because metadata is missing')
+
+
+@timed('lazy_wheel.read_metadata')
+def get_remote_wheel_metadata(url, transport=None):
+    """Read metadata of a remote wheel without downloading all of it.
+
+    Only the zip central directory and the metadata file are fetched, with
+    HTTP range requests. The return value is a `distlib.metadata.Metadata`,
+    like `distlib.wheel.Wheel.metadata`.
+
+    Raises `RangeRequestNotSupported` if the server does not support range
+    requests, or does not tell the wheel's length, so the caller can fall
+    back to downloading the whole wheel.
+    """
+    if transport is None:
+        with Transport() as transport:
+            return _read_remote_wheel_metadata(url, transport)
+    return _read_remote_wheel_metadata(url, transport)
@@ -1,17 +1,60 @@
 import collections
-import functools
-import hashlib
-import sys
-import warnings
+import logging
+import zipfile
 
-from pip._vendor import six
+from pip._vendor import requests, six
 from pip._vendor.distlib.wheel import Wheel
+from pip._vendor.packaging import specifiers as packaging_specifiers
 from pip._vendor.packaging import version as packaging_version
-from wheel import pep425tags
 
+from ._compat.functools import lru_cache
+
+from .instrumentation import register_cache, timed
+from .lazywheels import get_remote_wheel_metadata, RangeRequestNotSupported
+from .sdists import get_sdist_metadata
+from .tags import get_wheel_priority
+from .transports import Transport
+from .utils import check_checksum, DownloadIntegrityError, load_metadata
 from .wheels import get_built_wheel_path, get_wheel_path
 
 
+logger = logging.getLogger('petpeeve.links')
+
+
+# Most links share a handful of distinct Python specifiers and versions, so
+# parse each once, and share the result between links.
+PARSE_CACHE_SIZE = 4096
+
+EMPTY_SPECIFIER = packaging_specifiers.SpecifierSet('')
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_python_specifier(value):
+    """Parse a Requires-Python value into a specifier set.
+
+    Parsed results are shared. Do not modify them.
+    """
+    if not value:
+        return EMPTY_SPECIFIER
+    return packaging_specifiers.SpecifierSet(value)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_version(value):
+    return packaging_version.parse(value)
+
+
+register_cache('links.python_specifier', parse_python_specifier)
+register_cache('links.version', _parse_version)
+
+
+@timed('wheel.read_metadata')
+def _read_wheel_metadata(wheel):
+    """Read metadata out of a `distlib.wheel.Wheel`.
+    """
+    return wheel.metadata
+
+
 class WheelNotFoundError(OSError):
     pass
 
@@ -21,17 +64,35 @@ class Link(object):
 
     Links are usually found in a Simple API page, but can also be specified
     directly in a Requirement with PEP 508's URL-based lookup.
+
+    `metadata_checksum` tells whether the index serves the distribution's
+    metadata as a standalone file (PEP 658). It is `None` if the file is not
+    available, or the file's checksum. The checksum may be empty if the
+    index does not provide one.
+
+    `yanked` is `None` if the file is not yanked (PEP 592), or the reason
+    why it is yanked, which may be empty.
+
+    A simple page can contain thousands of links, so this class uses slots,
+    and only parses the file name (into `info`) when it is first needed.
     """
+    __slots__ = [
+        'url', 'checksum', 'file_stem', 'extension', 'python_specifier',
+        'metadata_checksum', 'yanked', '_info',
+    ]
+
     def __init__(
             self, url, checksum,
             file_stem, file_extension,
-            python_specifier):
+            python_specifier, metadata_checksum=None, yanked=None):
         self.url = url
         self.checksum = checksum
         self.file_stem = file_stem
         self.extension = file_extension
         self.python_specifier = python_specifier
-        self.info = self.parse_for_info()
+        self.metadata_checksum = metadata_checksum
+        self.yanked = yanked
+        self._info = None
 
     def __repr__(self):
         return '<{type} {filename}>'.format(
@@ -43,6 +104,16 @@ class Link(object):
     def filename(self):
         return self.file_stem + self.extension
 
+    @property
+    def info(self):
+        if self._info is None:
+            self._info = self.parse_for_info()
+        return self._info
+
+    @property
+    def metadata_url(self):
+        return self.url + '.metadata'
+
     def parse_for_info(self):
         raise NotImplementedError
 
@@ -51,22 +122,62 @@ class Link(object):
         """
         if not self.checksum:
             return
-        htype, hvalue = self.checksum.split('=')
-        h = hashlib.new(htype)
-        h.update(data)
-        value = h.hexdigest()
-        if hvalue != value:
-            raise ValueError('expected {}, but got {}'.format(hvalue, value))
-
-    def as_wheel(self, offline=False):
+        check_checksum(data, self.checksum)
+
+    @timed('metadata_file.fetch')
+    def fetch_metadata(self, transport=None):
+        """Fetch the standalone metadata file served by the index (PEP 658).
+
+        The return value is a distlib.metadata.Metadata. The content is
+        verified against `metadata_checksum`.
+        """
+        if self.metadata_checksum is None:
+            raise ValueError('{} has no metadata file'.format(self.filename))
+        if transport is None:
+            with Transport() as transport:
+                response = transport.get_metadata(self.metadata_url)
+        else:
+            response = transport.get_metadata(self.metadata_url)
+        response.raise_for_status()
+        data = response.content
+        if self.metadata_checksum:
+            check_checksum(data, self.metadata_checksum)
+        return load_metadata(data)
+
+    def _fetch_metadata_or_none(self, transport):
+        if self.metadata_checksum is None:
+            return None
+        try:
+            return self.fetch_metadata(transport=transport)
+        except (requests.RequestException, DownloadIntegrityError) as e:
+            logger.warning('Failed to fetch metadata file of %s: %s', self, e)
+        return None
+
+    def as_wheel(self, offline=False, transport=None):
         """Build a representation of a local wheel artifact with the link.
 
         The return value is a distlib.wheel.Wheel. If `offline` if `True`,
         `WheelNotFoundError` is raised if the wheel is not found in the
-        local cache. Otherwise the wheel is downloaded.
+        local cache. Otherwise the wheel is downloaded with `transport`.
         """
         raise NotImplementedError
 
+    def get_metadata(self, offline=False, transport=None):
+        """Get metadata of the distribution the link points to.
+
+        The return value is a distlib.metadata.Metadata. Arguments are the
+        same as `as_wheel()`.
+
+        If the index serves the metadata as a standalone file (PEP 658), it
+        is used instead of the artifact.
+        """
+        if not offline:
+            metadata = self._fetch_metadata_or_none(transport)
+            if metadata is not None:
+                return metadata
+        wheel = self.as_wheel(offline=offline, transport=transport)
+        return _read_wheel_metadata(wheel)
+
 
 SourceInformation = collections.namedtuple('SourceInformation', [
     'distribution_name',
@@ -77,18 +188,41 @@ SourceInformation = collections.namedtuple('SourceInformation', [
 class SourceDistributionLink(Link):
     """Link to an sdist.
     """
+    __slots__ = []
+
     def parse_for_info(self):
         name, ver = self.file_stem.rsplit('-', 1)
-        return SourceInformation(name, packaging_version.parse(ver))
+        return SourceInformation(name, _parse_version(ver))
 
-    def as_wheel(self, offline=False):
-        if offline:     # TODO: Can we peek into the wheel cache here?
-            raise WheelNotFoundError(self.filename)
-        path = get_built_wheel_path(self)
+    def as_wheel(self, offline=False, transport=None):
+        path = get_built_wheel_path(self, offline, transport=transport)
         if not path:
             raise WheelNotFoundError(self.filename)
         return Wheel(path)
 
+    def get_metadata(self, offline=False, transport=None):
+        """Get metadata of the distribution the link points to.
+
+        Building a wheel can take minutes (e.g. for C extensions), so it is
+        the last resort. Before that, the standalone metadata file (PEP 658),
+        a wheel built before, and metadata read from the sdist itself (see
+        `get_sdist_metadata()`) are tried in turn.
+        """
+        if not offline:
+            metadata = self._fetch_metadata_or_none(transport)
+            if metadata is not None:
+                return metadata
+        try:
+            return _read_wheel_metadata(self.as_wheel(offline=True))
+        except WheelNotFoundError:
+            if offline:
+                raise
+        metadata = get_sdist_metadata(self, transport=transport)
+        if metadata is not None:
+            return metadata
+        wheel = self.as_wheel(offline=False, transport=transport)
+        return _read_wheel_metadata(wheel)
+
 
 WheelInformation = collections.namedtuple('WheelInformation', [
     'distribution_name',
@@ -103,6 +237,8 @@ WheelInformation = collections.namedtuple('WheelInformation', [
 class WheelDistributionLink(Link):
     """Link to a wheel.
     """
+    __slots__ = []
+
     def parse_for_info(self):
         """Parse the wheel's file name according to PEP427.
 
@@ -115,31 +251,58 @@ class WheelDistributionLink(Link):
         elif len(parts) == 5:
             name, ver, impl, abi, plat = parts
             build = None
-        version = packaging_version.parse(ver)
+        version = _parse_version(ver)
         return WheelInformation(name, version, build, impl, abi, plat)
 
-    def is_binary_compatible(self):
-        with warnings.catch_warnings():
-            # Ignore "Python ABI tag may be incorrect" warnings on Windows.
-            # Windows wheels don't specify those anyway.
-            if sys.platform.startswith('win'):
-                warnings.simplefilter('ignore')
-            supported_tags = pep425tags.get_supported()
-        wheel_tag = (
+    def get_compatibility_priority(self, target=None):
+        """Rank the wheel's compatibility with a target environment.
+
+        Returns a priority, lower being better, or `None` if the wheel is not
+        compatible. The environment we run in is used if `target` is `None`.
+        """
+        return get_wheel_priority(
             self.info.language_implementation_tag,
             self.info.abi_tag,
             self.info.platform_tag,
+            target=target,
         )
-        if wheel_tag not in supported_tags:
-            return False
-        return True
 
-    def as_wheel(self, offline=False):
-        path = get_wheel_path(self, offline)
+    def is_binary_compatible(self, target=None):
+        return self.get_compatibility_priority(target) is not None
+
+    def as_wheel(self, offline=False, transport=None):
+        path = get_wheel_path(self, offline, transport=transport)
         if not path:
             raise WheelNotFoundError(self.filename)
         return Wheel(path)
 
+    def get_metadata(self, offline=False, transport=None):
+        """Get metadata of the distribution the link points to.
+
+        The standalone metadata file (PEP 658) is preferred if the index
+        serves it. Otherwise, if the wheel is not in the local cache, only its
+        metadata is fetched with HTTP range requests, instead of downloading
+        the whole wheel. The wheel is downloaded only if the server does not
+        support that.
+        """
+        if not offline:
+            metadata = self._fetch_metadata_or_none(transport)
+            if metadata is not None:
+                return metadata
+        try:
+            return _read_wheel_metadata(self.as_wheel(offline=True))
+        except WheelNotFoundError:
+            if offline:
+                raise
+        try:
+            return get_remote_wheel_metadata(self.url, transport=transport)
+        except (RangeRequestNotSupported, zipfile.BadZipfile, ValueError) as e:
+            # ValueError: no metadata was found this way. The full download
+            # below tells for sure.
+            logger.debug('Failed to read metadata lazily: %s', e)
+        wheel = self.as_wheel(offline=False, transport=transport)
+        return _read_wheel_metadata(wheel)
+
 
 class UnwantedLink(ValueError):
     pass
@@ -162,24 +325,27 @@ def _select_link_klass(filename):
     """
     for ext, klass in WANTED_EXTENSIONS:
         if filename.endswith(ext):
-            return functools.partial(
-                klass,
-                file_stem=filename[:-len(ext)],
-                file_extension=ext,
-            )
+            return klass, filename[:-len(ext)], ext
     raise UnwantedLink(filename)
 
 
-def parse_link(url, python_specifier):
-    if isinstance(url, six.string_types):
-        parts = six.moves.urllib_parse.urlsplit(url)
-    else:
-        parts = url
-    checksum = parts.fragment
-    parts = parts._replace(fragment='')
+def parse_link(
+        url, python_specifier=EMPTY_SPECIFIER,
+        metadata_checksum=None, yanked=None):
+    """Build a link from URL.
+
+    `url` can be a string, or a `SplitResult`. The fragment, if present, is
+    used as the artifact's checksum.
+    """
+    if not isinstance(url, six.string_types):
+        url = six.moves.urllib_parse.urlunsplit(url)
+    url, _, checksum = url.partition('#')
+    filename = url.split('?', 1)[0].rsplit('/', 1)[-1]
 
-    klass = _select_link_klass(parts.path.rsplit('/', 1)[-1])
+    klass, file_stem, file_extension = _select_link_klass(filename)
     return klass(
-        url=six.moves.urllib_parse.urlunsplit(parts),
-        checksum=checksum, python_specifier=python_specifier,
+        url=url, checksum=checksum,
+        file_stem=file_stem, file_extension=file_extension,
+        python_specifier=python_specifier,
+        metadata_checksum=metadata_checksum, yanked=yanked,
     )
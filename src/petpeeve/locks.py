@@ -0,0 +1,331 @@
+"""Lock files, recording a resolution to reproduce or update it later.
+
+A lock is JSON. Besides the pins, it keeps each package's dependency
+specification and the dependency edges that were followed, so pins can be
+reused without asking the index about them again.
+
+A lock made for several environments (a universal lock) can pin different
+versions of a package in different environments. Each pin then carries a
+marker telling where it applies.
+"""
+
+import collections
+import json
+import logging
+import os
+import stat
+import tempfile
+
+from pip._vendor.packaging.markers import Marker
+from pip._vendor.packaging.utils import canonicalize_name
+from pip._vendor.packaging.version import parse as parse_version
+
+from ._compat.os import replace
+from .environments import MarkerEnvironment, get_marker
+from .requirements import (
+    Requirement, RequirementSpecification, dump_requirements,
+    load_requirements,
+)
+from .resolvers import ResolutionImpossible, UniversalResolution
+
+
+logger = logging.getLogger('petpeeve.locks')
+
+
+LOCK_FORMAT_VERSION = 2
+
+
+class LockFormatError(ValueError):
+    pass
+
+
+LockedPackage = collections.namedtuple('LockedPackage', [
+    'name',             # Normalized.
+    'version',          # Parsed.
+    'extras',           # Sorted list of extras selected.
+    'hashes',           # Checksums of artifacts, like "sha256=abcd".
+    'specification',    # RequirementSpecification of the version.
+    'dependencies',     # Dependee names, to requirement strings.
+    'marker',           # Environments the pin is for, or None for all.
+])
+
+
+def _dump_package(package):
+    spec = package.specification
+    return {
+        'version': str(package.version),
+        'extras': package.extras,
+        'hashes': package.hashes,
+        'specification': {
+            'requires_python': spec.requires_python,
+            'base': dump_requirements(spec.base),
+            'extras': {
+                extra: dump_requirements(requirements)
+                for extra, requirements in spec.extras.items()
+            },
+        },
+        'dependencies': package.dependencies,
+        'marker': package.marker,
+    }
+
+
+def _load_package(name, data):
+    spec = data['specification']
+    extras = collections.defaultdict(set, (
+        (extra, load_requirements(strings))
+        for extra, strings in spec['extras'].items()
+    ))
+    return LockedPackage(
+        name=name,
+        version=parse_version(data['version']),
+        extras=data['extras'],
+        hashes=data['hashes'],
+        specification=RequirementSpecification(
+            load_requirements(spec['base']), extras,
+            requires_python=spec['requires_python'],
+        ),
+        dependencies=data['dependencies'],
+        marker=data['marker'],
+    )
+
+
+def _find_locked(lock, name, version):
+    if lock is None:
+        return None
+    for package in lock.packages.get(name, ()):
+        if package.version == version:
+            return package
+    return None
+
+
+def _iter_pins(resolution):
+    """Iterate through pins of a resolution, like `UniversalResolution`.
+    """
+    if isinstance(resolution, UniversalResolution):
+        for pin in resolution.iter_pins():
+            yield pin
+        return
+    for name, candidate in sorted(resolution.candidates.items()):
+        yield name, candidate.version, [(None, resolution)]
+
+
+def _get_file_mode(filename):
+    """Permissions of the file, or those a new file gets by default.
+
+    `tempfile.mkstemp()` creates files readable by the owner only.
+    """
+    try:
+        return stat.S_IMODE(os.stat(filename).st_mode)
+    except OSError:
+        pass
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+class Lock(object):
+    """Pinned packages resolved from `requirements`.
+
+    `requirements` is a list of `Requirement` instances. `packages` maps
+    each distribution name (normalized) to a list of `LockedPackage`, one
+    for each version pinned. `environments` is the list of
+    `MarkerEnvironment` a universal lock was made for, or `None`.
+    """
+    def __init__(self, requirements, packages, environments=None):
+        self.requirements = requirements
+        self.packages = packages
+        self.environments = environments
+
+    def __repr__(self):
+        return '<{type} ({count} packages)>'.format(
+            type=type(self).__name__,
+            count=len(self.packages),
+        )
+
+    @classmethod
+    def from_resolution(cls, requirements, resolution, index=None,
+                        previous=None):
+        """Build a lock from a `Resolution` or `UniversalResolution`.
+
+        Hashes of a package are copied from the `previous` lock if it has
+        the same version, or asked from `index` (with `get_hashes()`).
+        Packages get no hashes if neither has them.
+
+        In a universal lock, a package pinned to the same version in every
+        environment gets one entry without a marker. Otherwise each version
+        gets an entry with a marker for the environments it is pinned in.
+        """
+        environments = getattr(resolution, 'environments', None)
+        packages = collections.defaultdict(list)
+        for name, version, found in _iter_pins(resolution):
+            extras = set()
+            dependencies = collections.defaultdict(set)
+            for _, resolved in found:
+                extras.update(resolved.candidates[name].extras)
+                edges = resolved.dependencies.get(name, {})
+                for dependee, dependee_requirements in edges.items():
+                    dependencies[dependee].update(dependee_requirements)
+            old = _find_locked(previous, name, version)
+            if old is not None:
+                hashes = old.hashes
+            elif index is not None:
+                hashes = index.get_hashes(found[0][1].candidates[name])
+            else:
+                hashes = []
+            marker = None
+            if environments is not None:
+                marker = get_marker([e for e, _ in found], environments)
+            packages[name].append(LockedPackage(
+                name=name,
+                version=version,
+                extras=sorted(extras),
+                hashes=hashes,
+                specification=found[0][1].specifications[name],
+                dependencies={
+                    dependee: dump_requirements(dependee_requirements)
+                    for dependee, dependee_requirements
+                    in dependencies.items()
+                },
+                marker=marker,
+            ))
+        return cls(list(requirements), dict(packages), environments)
+
+    @classmethod
+    def load(cls, f):
+        try:
+            data = json.load(f)
+            if data['version'] != LOCK_FORMAT_VERSION:
+                raise LockFormatError(
+                    'unsupported lock version {!r}'.format(data['version']),
+                )
+            environments = data['environments']
+            if environments is not None:
+                environments = [
+                    MarkerEnvironment(e['values'], name=e['name'])
+                    for e in environments
+                ]
+            return cls(
+                [Requirement.parse(s)[0] for s in data['requirements']],
+                {
+                    name: [_load_package(name, p) for p in packages]
+                    for name, packages in data['packages'].items()
+                },
+                environments,
+            )
+        except (KeyError, TypeError, AttributeError) as e:
+            raise LockFormatError('malformed lock: {}'.format(e))
+
+    def dump(self, f):
+        environments = None
+        if self.environments is not None:
+            environments = [
+                {'name': e.name, 'values': e.values}
+                for e in self.environments
+            ]
+        data = {
+            'version': LOCK_FORMAT_VERSION,
+            'requirements': [str(r) for r in self.requirements],
+            'environments': environments,
+            'packages': {
+                name: [_dump_package(p) for p in packages]
+                for name, packages in self.packages.items()
+            },
+        }
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+    @classmethod
+    def read(cls, filename):
+        with open(filename) as f:
+            return cls.load(f)
+
+    def write(self, filename):
+        """Write the lock to a file, replacing it atomically.
+
+        The file keeps its permissions if it exists, or gets the default
+        ones for a new file, since it is meant to be shared.
+        """
+        directory = os.path.dirname(os.path.abspath(filename))
+        mode = _get_file_mode(filename)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                self.dump(f)
+            os.chmod(temp_path, mode)
+            replace(temp_path, filename)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def get_pins(self, environment):
+        """Get packages pinned in an environment.
+
+        `environment` is a `MarkerEnvironment`. Returns a dict mapping each
+        name to a `LockedPackage`.
+        """
+        pins = {}
+        for name, packages in self.packages.items():
+            for package in packages:
+                if (package.marker is None or
+                        Marker(package.marker).evaluate(environment.values)):
+                    pins[name] = package
+                    break
+        return pins
+
+    def get_affected(self, requirements):
+        """Find locked packages that changed requirements may affect.
+
+        These are packages named by requirements added or removed since the
+        lock was made, and everything they depend on, following the locked
+        dependencies. Returns a set of names.
+        """
+        changed = set(self.requirements).symmetric_difference(requirements)
+        pending = [canonicalize_name(r.name) for r in changed]
+        affected = set()
+        while pending:
+            name = pending.pop()
+            if name in affected:
+                continue
+            affected.add(name)
+            for package in self.packages.get(name, ()):
+                pending.extend(package.dependencies)
+        return affected
+
+
+def resolve_incremental(resolver, requirements, lock, preferences=None):
+    """Resolve requirements again, keeping pins unaffected by changes.
+
+    Pins not reachable from changed requirements are kept as they are, and
+    taken from the lock instead of the index, so only the affected part of
+    the graph is resolved again; the rest prefer their locked versions. If
+    the kept pins turn out to conflict with the changes, everything is
+    resolved again, still preferring the locked versions.
+
+    Pins are read for the resolver's environment, so a universal lock can
+    be used to resolve for each of its environments. Versions in
+    `preferences` are preferred for packages the lock does not pin.
+
+    `resolver` is a `Resolver`. Returns a `Resolution`.
+    """
+    requirements = list(requirements)
+    affected = lock.get_affected(requirements)
+    pins = lock.get_pins(resolver.environment)
+    preferences = dict(preferences or {})
+    preferences.update(
+        (name, package.version) for name, package in pins.items()
+    )
+    locked = {
+        name: package for name, package in pins.items()
+        if name not in affected
+    }
+    logger.info('Keeping %d of %d locked packages', len(locked), len(pins))
+    try:
+        return resolver.resolve(
+            requirements, locked=locked, preferences=preferences,
+        )
+    except ResolutionImpossible:
+        if not locked:
+            raise
+        logger.info('Locked packages conflict with the changes, '
+                    'resolving everything')
+    return resolver.resolve(requirements, preferences=preferences)
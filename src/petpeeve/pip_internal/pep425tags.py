@@ -0,0 +1,3 @@
+from ._not import from_pip_import
+
+get_supported = from_pip_import('pep425tags', 'get_supported')
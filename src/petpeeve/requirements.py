@@ -1,38 +1,115 @@
 import collections
-import re
+import copy
+import os
 import warnings
+import weakref
 
 from pip._vendor import six
-from pip._vendor.packaging.markers import Marker
+from pip._vendor.packaging.markers import Marker, Op, Value, Variable
 from pip._vendor.packaging.requirements import Requirement as BaseRequirement
+from pip._vendor.packaging.utils import canonicalize_name
 
+from ._compat.functools import lru_cache
+from .instrumentation import register_cache
 
-# I heard Warehouse and Wheel always put the extra marker at the end, and the
-# operator is always ==, so we cheat a little (a lot?) here.
-EXTRA_RE = re.compile(
-    r"""^(?P<requirement>.+?)(?:extra\s*==\s*['"](?P<extra>.+?)['"])$""",
-)
+
+# The same strings show up in every version of a package, so this is well
+# worth it in a large resolution.
+PARSE_CACHE_SIZE = 8192
+
+# Parsed requirements are shared, so identical ones can share one object.
+# Entries go away when nothing else references the requirement.
+_interned = weakref.WeakValueDictionary()
+
+
+def _intern(requirement):
+    return _interned.setdefault(requirement.key, requirement)
+
+
+def _get_extra(item):
+    """Get the extra's name if a marker tree item is `extra == "name"`.
+    """
+    while isinstance(item, list) and len(item) == 1:   # Parenthesized.
+        item = item[0]
+    if not isinstance(item, tuple) or len(item) != 3:
+        return None
+    lhs, op, rhs = item
+    if not isinstance(op, Op) or op.value != '==':
+        return None
+    if isinstance(lhs, Value) and isinstance(rhs, Variable):
+        lhs, rhs = rhs, lhs
+    if not isinstance(lhs, Variable) or lhs.value != 'extra':
+        return None
+    if not isinstance(rhs, Value):
+        return None
+    return rhs.value
+
+
+def _split_extra(marker):
+    """Split an `extra == "name"` expression out of a marker.
+
+    Only a single extra expression joined to the rest with "and" can be
+    split out; anything else is left as-is. Returns a 2-tuple `(marker,
+    extra)`. `marker` is the remaining marker, or `None` if nothing is left.
+    """
+    items = marker._markers
+    if 'or' in items:
+        return marker, None
+    found = [(i, _get_extra(item)) for i, item in enumerate(items)]
+    found = [(i, extra) for i, extra in found if extra]
+    if len(found) != 1:
+        return marker, None
+    i, extra = found[0]
+    if i > 0:   # Drop the "and" before, or after if the extra comes first.
+        items = items[:i - 1] + items[i + 1:]
+    else:
+        items = items[i + 2:]
+    if not items:
+        return None, extra
+    rest = Marker.__new__(Marker)
+    rest._markers = items
+    return rest, extra
 
 
 class Requirement(BaseRequirement):
     """Extended requirement representation.
 
     This adds helper functions to the basic requirement class, and makes it
-    hashable and works in a set.
+    hashable and works in a set. Identity is decided by `key`, computed once
+    on creation, so hashing and comparison are cheap. Requirements returned
+    by `parse()` are interned, and should be treated as immutable; use
+    `with_marker()` to get a modified one.
     """
+    def __init__(self, requirement_string):
+        super(Requirement, self).__init__(requirement_string)
+        self._set_key()
+
+    def _set_key(self):
+        self.key = (
+            canonicalize_name(self.name),
+            frozenset(self.extras),
+            str(self.specifier),
+            self.url,
+            str(self.marker) if self.marker else None,
+        )
+        self._hash = hash(self.key)
+
     @classmethod
+    @lru_cache(maxsize=PARSE_CACHE_SIZE)
     def parse(cls, s):
         """Parse both modern and "legacy" requirement styles.
 
-        Old requirements append the extra key at the end of the environment
-        markers, e.g.::
+        Old requirements append the extra key to the environment markers,
+        e.g.::
 
             PySocks (!=1.5.7,>=1.5.6); extra == 'socks'
 
-        This uses a very naive pattern-matching logic to strip that last part
-        out of the environment markers.
-
         This kind of formats are used in old wheels and the PyPI's JSON API.
+        The `extra == '...'` expression is split out of the parsed marker
+        tree, so the requirement is only parsed once.
+
+        Results are cached by the string, so parsing the same string again
+        returns the same (shared) requirement.
 
         Returns a 2-tuple `(requirement, extra)`. The first member is a
         `Requirement` instance, and the second the extra's name. If no extra is
@@ -40,25 +117,51 @@ class Requirement(BaseRequirement):
         """
         requirement = cls(s)
         if not requirement.marker:  # Short circuit to favour the common case.
-            return requirement, None
-        match = EXTRA_RE.match(s)
-        if not match:   # No final "extra" expression, yay.
-            return requirement, None
-        extra = match.group('extra')
-        if not extra:
-            return requirement, None
-        s = match.group('requirement').rstrip()
-        if s.endswith('and'):
-            s = s[:-3].rstrip()
-        if s.endswith(';'):
-            s = s[:-1].rstrip()
-        return cls(s), extra
+            return _intern(requirement), None
+        marker, extra = _split_extra(requirement.marker)
+        if extra:
+            requirement.marker = marker
+            requirement._set_key()
+        return _intern(requirement), extra
+
+    def with_marker(self, marker):
+        """Get a copy of this requirement with the marker replaced.
+        """
+        requirement = copy.copy(self)
+        requirement.marker = marker
+        requirement._set_key()
+        return _intern(requirement)
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
 
     def __eq__(self, other):
-        return str(self) == str(other)
+        if self is other:
+            return True
+        if not isinstance(other, Requirement):
+            return NotImplemented
+        return self.key == other.key
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+
+register_cache('requirements.parse', Requirement.parse)
+
+
+def dump_requirements(requirements):
+    """Turn requirements into a sorted list of strings, for storage.
+    """
+    return sorted(str(r) for r in requirements)
+
+
+def load_requirements(strings):
+    """Turn strings from `dump_requirements()` back into requirements.
+    """
+    return set(Requirement.parse(s)[0] for s in strings)
 
 
 def _add_requires(entry, base, extras):
@@ -79,7 +182,7 @@ def _add_requires(entry, base, extras):
                 m = Marker('({}) and ({})'.format(environment, r.marker))
             else:
                 m = Marker(environment)
-            r.marker = m
+            r = r.with_marker(m)
         if not e_extra and not r_extra:
             base.add(r)
         elif e_extra:
@@ -88,17 +191,34 @@ def _add_requires(entry, base, extras):
             extras[r_extra].add(r)
 
 
+def _get_requires_python(metadata):
+    # distlib only exposes this through the underlying metadata object.
+    legacy = getattr(metadata, '_legacy', None)
+    if legacy is not None:
+        value = legacy.get('Requires-Python')
+    else:
+        value = metadata._data.get('requires_python')
+    if not value or value == 'UNKNOWN':
+        return None
+    return value
+
+
 class RequirementSpecification(object):
     """A representation of dependencies of a distribution.
 
     This representation is abstract, i.e. completely independent from the
     execution environment. Our resolver needs this to give a machine-agnostic
     dependency tree.
+
+    `requires_python` is the distribution's Requires-Python value, or `None`.
+    `artifact` is the checksum of the artifact the specification was read
+    from (e.g. "sha256=..."), if it is known.
     """
-    def __init__(self, base, extras):
+    def __init__(self, base, extras, requires_python=None, artifact=None):
         self.base = base
         self.extras = extras
-        # TODO: We probably want to include some other metadata as well?
+        self.requires_python = requires_python
+        self.artifact = artifact
 
     @classmethod
     def empty(cls):
@@ -111,16 +231,28 @@ class RequirementSpecification(object):
         `wheel` is a `distlib.wheel.Wheel` instance. The metadata is read to
         build the instance.
         """
+        return cls.from_metadata(wheel.metadata)
+
+    @classmethod
+    def from_metadata(cls, metadata, artifact=None):
+        """Build a dependency set from distribution metadata.
+
+        `metadata` is a `distlib.metadata.Metadata` instance.
+        """
         base = set()
         extras = collections.defaultdict(set)
-        for entry in wheel.metadata.run_requires:
+        for entry in metadata.run_requires:
             if isinstance(entry, six.text_type):
                 entry = {'requires': [entry]}
             _add_requires(entry, base, extras)
-        return cls(base, extras)
+        return cls(
+            base, extras,
+            requires_python=_get_requires_python(metadata),
+            artifact=artifact,
+        )
 
     @classmethod
-    def from_data(cls, requires_dist):
+    def from_data(cls, requires_dist, requires_python=None, artifact=None):
         """Build a dependency set with data obtained from an API.
 
         `requires_dist` is a sequence, e.g. decoded from a JSON API.
@@ -135,7 +267,9 @@ class RequirementSpecification(object):
                 extra_reqs = extras[extra]
                 extra_reqs.add(requirement)
                 extras[extra] = extra_reqs
-        return cls(base, extras)
+        return cls(
+            base, extras, requires_python=requires_python, artifact=artifact,
+        )
 
     def get_dependencies(self, extras):
         deps = set(self.base)
@@ -151,3 +285,47 @@ class RequirementSpecification(object):
             else:
                 deps.update(extra_deps)
         return deps
+
+
+def _iter_logical_lines(f):
+    """Join continued lines, and strip comments and blank lines.
+    """
+    buf = []
+    for line in f:
+        line = line.rstrip('\n')
+        if line.endswith('\\'):
+            buf.append(line[:-1])
+            continue
+        buf.append(line)
+        line = ''.join(buf)
+        buf = []
+        if line.lstrip().startswith('#'):
+            continue
+        line = line.split(' #', 1)[0].strip()
+        if line:
+            yield line
+
+
+def read_requirements_file(filename):
+    """Read requirements from a requirements.txt-style file.
+
+    Files included with "-r" are read too. Other options (e.g. "-e",
+    "--index-url") are not supported, and skipped with a warning. Returns a
+    list of `Requirement` instances, in order.
+    """
+    requirements = []
+    with open(filename) as f:
+        lines = list(_iter_logical_lines(f))
+    for line in lines:
+        if line.startswith(('-r ', '--requirement ', '--requirement=')):
+            included = line.split(None, 1)[-1].split('=', 1)[-1].strip()
+            included = os.path.join(os.path.dirname(filename), included)
+            requirements.extend(read_requirements_file(included))
+        elif line.startswith('-'):
+            warnings.warn('ignoring unsupported line {!r} in {}'.format(
+                line, filename,
+            ))
+        else:
+            requirement, _ = Requirement.parse(line)
+            requirements.append(requirement)
+    return requirements
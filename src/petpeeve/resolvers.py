@@ -0,0 +1,1071 @@
+"""Dependency resolution with conflict-driven clause learning (PubGrub).
+
+The algorithm follows Natalie Weizenbaum's PubGrub, as described in
+https://github.com/dart-lang/pub/blob/master/doc/solver.md. Instead of
+backtracking chronologically when a conflict is found, the resolver derives
+the root cause of the conflict as a new incompatibility, and jumps back
+directly to the decision responsible for it. The learned incompatibility
+keeps it from making the same mistake again.
+
+Every package has a finite list of known versions (those the index lists),
+so a set of versions is an integer bitmask: bit `i + 1` stands for the
+`i`-th oldest version, and bit 0 (`NOT_SELECTED`) for the package not being
+part of the solution at all. Negation is a complement within the package's
+universe, and set operations are integer operations.
+
+Extras are modelled as separate packages: `foo[bar]` at a version depends on
+`foo` at exactly that version, and the requirements of the extra.
+"""
+
+import collections
+import functools
+import logging
+import threading
+
+from pip._vendor.packaging.utils import canonicalize_name
+
+from ._compat.futures import SERIAL, ThreadPoolExecutor
+from .candidates import Candidate
+from .environments import MarkerEnvironment
+from .indexes.exceptions import PackageNotFound
+from .links import parse_link
+from .requirements import Requirement
+from .utils import iter_pins
+from .versions import VersionIndex
+
+
+logger = logging.getLogger('petpeeve.resolvers')
+
+
+DEFAULT_PREFETCH_DEPTH = 1
+
+DEFAULT_PREFETCH_WORKERS = 8
+
+NOT_SELECTED = 1
+
+ROOT_VERSION = 'root'
+
+
+def _iter_positions(versions):
+    """Iterate through positions of versions in a bitmask, oldest first.
+    """
+    i = 0
+    versions >>= 1
+    while versions:
+        if versions & 1:
+            yield i
+        versions >>= 1
+        i += 1
+
+
+def _count(versions):
+    return bin(versions).count('1')
+
+
+class Package(collections.namedtuple('Package', ['name', 'extra'])):
+    """A node in the dependency graph: a distribution, or one of its extras.
+
+    `name` is canonicalized. The root package (the user's requirements) has
+    `name` `None`.
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        if self.name is None:
+            return '<root>'
+        if self.extra:
+            return '{}[{}]'.format(self.name, self.extra)
+        return self.name
+
+    @property
+    def base(self):
+        return Package(self.name, None)
+
+
+ROOT = Package(None, None)
+
+
+class Term(object):
+    """A statement about a package: it is selected in one of `versions`.
+
+    `versions` is a bitmask over `known`, the package's versions, oldest
+    first. A term is positive if it requires the package to be selected.
+    """
+    __slots__ = ['package', 'versions', 'known']
+
+    def __init__(self, package, versions, known):
+        self.package = package
+        self.versions = versions
+        self.known = known
+
+    def __repr__(self):
+        return 'Term({!r}, {})'.format(str(self.package), self)
+
+    def __str__(self):
+        if self.positive:
+            return '{} {}'.format(self.package, self._format(self.versions))
+        excluded = ~self.versions & ((2 << len(self.known)) - 2)
+        if _count(excluded) == len(self.known):
+            return 'no {}'.format(self.package)
+        return 'not {} {}'.format(self.package, self._format(excluded))
+
+    def _format(self, versions):
+        shown = [self.known[i] for i in _iter_positions(versions)]
+        if len(shown) > 4:
+            return '{{{} ... {} ({} versions)}}'.format(
+                shown[0], shown[-1], len(shown),
+            )
+        return '{{{}}}'.format(', '.join(str(v) for v in shown))
+
+    @property
+    def positive(self):
+        return not self.versions & NOT_SELECTED
+
+
+class Incompatibility(object):
+    """A set of terms that must not all be true at the same time.
+
+    `cause` is a string naming how it came to be; for derived ones
+    ("conflict"), `causes` are the two incompatibilities it is derived from.
+    Dependencies keep the `requirement` they come from, to explain failures.
+    Terms about the same package are merged by intersecting their versions.
+    """
+    __slots__ = ['terms', 'cause', 'causes', 'requirement']
+
+    def __init__(self, terms, cause, causes=(), requirement=None):
+        merged = collections.OrderedDict()
+        for term in terms:
+            if term.package in merged:
+                versions = merged[term.package].versions & term.versions
+                merged[term.package] = Term(term.package, versions, term.known)
+            else:
+                merged[term.package] = term
+        self.terms = list(merged.values())
+        self.cause = cause
+        self.causes = causes
+        self.requirement = requirement
+
+    def __repr__(self):
+        return '<{type} {cause}: {terms}>'.format(
+            type=type(self).__name__,
+            cause=self.cause,
+            terms=self,
+        )
+
+    def __str__(self):
+        terms = self.terms
+        if not terms:
+            return 'version solving failed'
+        if self.cause == 'no-versions':
+            return '{} depends on {}, which matches no versions'.format(
+                terms[0], self.requirement,
+            )
+        if self.requirement is not None:
+            return '{} depends on {}'.format(terms[0], self.requirement)
+        if len(terms) == 1:
+            return '{} is forbidden ({})'.format(terms[0], self.cause)
+        return ' and '.join(str(t) for t in terms) + ' are incompatible'
+
+    def is_failure(self):
+        if not self.terms:
+            return True
+        if len(self.terms) == 1:
+            term = self.terms[0]
+            return term.package == ROOT and term.positive
+        return False
+
+    def iter_external(self):
+        """Iterate through the external facts this is derived from.
+        """
+        seen = set()
+        stack = [self]
+        while stack:
+            incompat = stack.pop()
+            if id(incompat) in seen:
+                continue
+            seen.add(id(incompat))
+            if incompat.causes:
+                stack.extend(reversed(incompat.causes))
+            else:
+                yield incompat
+
+
+class Assignment(object):
+    """A term in the partial solution: either a decision or a derivation.
+    """
+    __slots__ = ['term', 'decision_level', 'index', 'cause']
+
+    def __init__(self, term, decision_level, index, cause):
+        self.term = term
+        self.decision_level = decision_level
+        self.index = index
+        self.cause = cause
+
+    @property
+    def is_decision(self):
+        return self.cause is None
+
+
+class PartialSolution(object):
+    """Assignments made so far, in order.
+
+    `get_universe(package)` returns the bitmask of all possible values of a
+    package, including `NOT_SELECTED`.
+    """
+    def __init__(self, get_universe):
+        self.get_universe = get_universe
+        self.assignments = []
+        self.decision_level = 0
+        self.decisions = collections.OrderedDict()
+        self._by_package = collections.defaultdict(list)
+        self._allowed = {}
+
+    def get_allowed(self, package):
+        try:
+            return self._allowed[package]
+        except KeyError:
+            return self.get_universe(package)
+
+    def _assign(self, term, cause):
+        assignment = Assignment(
+            term, self.decision_level, len(self.assignments), cause,
+        )
+        self.assignments.append(assignment)
+        self._by_package[term.package].append(assignment)
+        self._allowed[term.package] = (
+            self.get_allowed(term.package) & term.versions
+        )
+
+    def decide(self, term):
+        self.decision_level += 1
+        self.decisions[term.package] = term.versions
+        self._assign(term, None)
+
+    def derive(self, term, cause):
+        self._assign(term, cause)
+
+    def backtrack(self, decision_level):
+        """Remove assignments made after `decision_level`.
+        """
+        changed = set()
+        while (self.assignments and
+                self.assignments[-1].decision_level > decision_level):
+            assignment = self.assignments.pop()
+            package = assignment.term.package
+            self._by_package[package].pop()
+            if assignment.is_decision:
+                del self.decisions[package]
+            changed.add(package)
+        for package in changed:
+            assignments = self._by_package[package]
+            if not assignments:
+                del self._allowed[package]
+                continue
+            allowed = self.get_universe(package)
+            for assignment in assignments:
+                allowed &= assignment.term.versions
+            self._allowed[package] = allowed
+        self.decision_level = decision_level
+
+    def satisfies(self, term):
+        return not self.get_allowed(term.package) & ~term.versions
+
+    def relation(self, term):
+        """Relation between the solution and a term.
+
+        Returns "satisfied", "contradicted", or "inconclusive".
+        """
+        allowed = self.get_allowed(term.package)
+        if not allowed & ~term.versions:
+            return 'satisfied'
+        if not allowed & term.versions:
+            return 'contradicted'
+        return 'inconclusive'
+
+    def satisfier(self, term):
+        """Find the earliest assignment that makes the term satisfied.
+        """
+        allowed = self.get_universe(term.package)
+        for assignment in self._by_package[term.package]:
+            allowed &= assignment.term.versions
+            if not allowed & ~term.versions:
+                return assignment
+        raise RuntimeError('{} is not satisfied'.format(term))
+
+    def iter_undecided(self):
+        """Iterate through packages required but not yet decided.
+        """
+        for package, allowed in self._allowed.items():
+            if not allowed & NOT_SELECTED and package not in self.decisions:
+                yield package
+
+
+class ResolutionImpossible(Exception):
+    """Resolution failed. `incompatibility` explains why.
+    """
+    def __init__(self, incompatibility):
+        super(ResolutionImpossible, self).__init__(incompatibility)
+        self.incompatibility = incompatibility
+
+    def __str__(self):
+        lines = ['no solution, because:']
+        lines.extend(
+            '  {}'.format(incompat)
+            for incompat in self.incompatibility.iter_external()
+        )
+        return '\n'.join(lines)
+
+
+class DirectURLError(ValueError):
+    """A direct URL requirement (`foo @ https://...`) cannot be used.
+    """
+
+
+ResolutionStatistics = collections.namedtuple('ResolutionStatistics', [
+    'decisions',        # States explored: versions tried.
+    'backtracks',
+    'conflicts',
+    'learned',          # Incompatibilities derived from conflicts.
+    'packages',
+    'prefetched',       # Speculative fetches started.
+    'prefetch_hits',    # Speculative fetches the resolver ended up using.
+])
+
+
+class Resolution(object):
+    """Result of a resolution.
+
+    `candidates` maps each selected distribution name to a `Candidate`, and
+    `specifications` to its `RequirementSpecification`. `dependencies` maps
+    each name to the names it depends on, each with the set of requirements
+    that make the dependency.
+    """
+    def __init__(self, candidates, specifications, dependencies, statistics):
+        self.candidates = candidates
+        self.specifications = specifications
+        self.dependencies = dependencies
+        self.statistics = statistics
+
+    def __repr__(self):
+        return '<{type} ({count} candidates)>'.format(
+            type=type(self).__name__,
+            count=len(self.candidates),
+        )
+
+
+class UniversalResolution(object):
+    """Result of resolving for several environments.
+
+    `environments` is a list of `MarkerEnvironment`, and `resolutions` a
+    list of each one's `Resolution`. Environments with the same marker
+    values share one.
+    """
+    def __init__(self, environments, resolutions):
+        self.environments = environments
+        self.resolutions = resolutions
+
+    def __repr__(self):
+        return '<{type} ({count} environments)>'.format(
+            type=type(self).__name__,
+            count=len(self.environments),
+        )
+
+    def iter_pins(self):
+        """Iterate through pinned versions, with where they are pinned.
+
+        Yields 3-tuples `(name, version, resolutions)`, sorted by name and
+        version. `resolutions` is a list of `(environment, resolution)`
+        pairs, for each environment the version is pinned in.
+        """
+        pins = collections.defaultdict(list)
+        for environment, resolution in zip(
+                self.environments, self.resolutions):
+            for name, candidate in resolution.candidates.items():
+                pins[(name, candidate.version)].append(
+                    (environment, resolution),
+                )
+        for (name, version), found in sorted(pins.items()):
+            yield name, version, found
+
+
+class Resolver(object):
+    """Resolve requirements against an index.
+
+    `index` needs `iter_candidates(requirement, prereleases)` and
+    `get_specification(candidate)`, like `JSONEnabledIndex`. Markers are
+    evaluated against `environment`, a `MarkerEnvironment` or a dict like
+    `packaging.markers.default_environment()`. The environment we run in is
+    used if not given. Pre-releases are only considered if `prereleases` is
+    true, a requirement names one explicitly (e.g. ">=2.0b1"), or nothing
+    else matches, like `SpecifierSet.filter()`. Yanked versions (PEP 592)
+    are left out by the index, unless a top-level requirement pins one with
+    "==" or "===".
+
+    A direct URL requirement (`foo @ https://.../foo-1.0.whl`) pins the
+    package to the artifact at the URL, with the version in its file name.
+    The resolved candidate carries the URL. Dependencies may only refer to
+    a URL that is also a top-level requirement.
+
+    While the resolver works, metadata of the newest allowed version of each
+    package on the frontier is fetched speculatively on a pool of
+    `prefetch_workers` threads, with the version lists of its dependencies.
+    With a `prefetch_depth` above 1, the newest matching versions of those
+    dependencies are prefetched too, that many levels down. 0 disables
+    prefetching, which is also off if threads are not available.
+    """
+    def __init__(self, index, environment=None, prereleases=False,
+                 prefetch_depth=DEFAULT_PREFETCH_DEPTH,
+                 prefetch_workers=DEFAULT_PREFETCH_WORKERS):
+        self.index = index
+        if environment is None:
+            environment = MarkerEnvironment.current()
+        elif not isinstance(environment, MarkerEnvironment):
+            environment = MarkerEnvironment(environment)
+        self.environment = environment
+        self.prereleases = prereleases
+        self.prefetch_depth = 0 if SERIAL else prefetch_depth
+        self.prefetch_workers = prefetch_workers
+        self._version_indexes = {}
+        self._specifications = {}
+        self._matching = {}
+        self._root_requirements = []
+        self._locked = {}
+        self._urls = {}
+        self._pins = {}
+        self._preferences = {}
+        self._executor = None
+        self._prefetched = {}
+        self._prefetch_lock = threading.Lock()
+
+    # Index access.
+
+    def _fetch_version_index(self, name, pin=''):
+        # Pre-releases are filtered per requirement, in `_get_matching()`.
+        # The index leaves out yanked versions unless `pin` pins them.
+        requirements = [Requirement.parse(name)[0]]
+        if pin:
+            requirements.append(Requirement.parse(name + pin)[0])
+        try:
+            return VersionIndex(
+                c.version
+                for requirement in requirements
+                for c in self.index.iter_candidates(requirement, True)
+            )
+        except PackageNotFound:
+            logger.warning('Package %s not found', name)
+            return VersionIndex([])
+
+    def _prefetch_version_index(self, name):
+        pin = self._pins.get(name, '')
+        return self._prefetch(
+            ('versions', name, pin), self._fetch_version_index, name, pin,
+        )
+
+    def _get_version_index(self, package):
+        try:
+            return self._version_indexes[package.base]
+        except KeyError:
+            pass
+        if package.name in self._locked:
+            index = VersionIndex([self._locked[package.name].version])
+            self._version_indexes[package.base] = index
+            return index
+        if package.name in self._urls:
+            index = VersionIndex([self._urls[package.name][1]])
+            self._version_indexes[package.base] = index
+            return index
+        pin = self._pins.get(package.name, '')
+        index = self._fetch(
+            ('versions', package.name, pin),
+            self._fetch_version_index, package.name, pin,
+        )
+        self._version_indexes[package.base] = index
+        return index
+
+    def _get_known(self, package):
+        """Get versions of a package, oldest first.
+        """
+        if package == ROOT:
+            return _ROOT_KNOWN
+        return self._get_version_index(package).versions
+
+    def _get_universe(self, package):
+        return (2 << len(self._get_known(package))) - 1
+
+    def _term(self, package, versions):
+        return Term(package, versions, self._get_known(package))
+
+    def _inverse(self, term):
+        return self._term(
+            term.package, self._get_universe(term.package) & ~term.versions,
+        )
+
+    def _get_specification(self, package, version):
+        key = (package.name, version)
+        try:
+            return self._specifications[key]
+        except KeyError:
+            pass
+        pin = self._locked.get(package.name)
+        if pin is not None and pin.version == version:
+            self._specifications[key] = pin.specification
+            return pin.specification
+        url = self._urls.get(package.name, (None, None))[0]
+        spec = self._fetch(
+            ('specification', package.name, version, url),
+            self.index.get_specification,
+            Candidate(package.name, version, url=url),
+        )
+        self._specifications[key] = spec
+        return spec
+
+    # Speculative prefetching.
+
+    def _fetch(self, key, func, *args):
+        """Use the prefetched result for `key`, or call `func` to get it.
+        """
+        with self._prefetch_lock:
+            future = self._prefetched.get(key)
+        if future is None:
+            return func(*args)
+        self._stats['prefetch_hits'] += 1
+        return future.result()
+
+    def _prefetch(self, key, func, *args):
+        """Start calling `func` in the background, unless already started.
+
+        Returns the future, or `None` if prefetching is off.
+        """
+        with self._prefetch_lock:
+            if self._executor is None:
+                return None
+            try:
+                return self._prefetched[key]
+            except KeyError:
+                pass
+            future = self._executor.submit(func, *args)
+            self._prefetched[key] = future
+            self._stats['prefetched'] += 1
+        return future
+
+    def _prefetch_specification(self, name, version, depth):
+        if (name, version) in self._specifications or name in self._locked:
+            return
+        if name in self._urls:
+            return
+        future = self._prefetch(
+            ('specification', name, version, None),
+            self.index.get_specification, Candidate(name, version),
+        )
+        if future is not None:
+            future.add_done_callback(functools.partial(
+                self._prefetch_dependencies, depth,
+            ))
+
+    def _prefetch_dependencies(self, depth, future):
+        """Prefetch what picking a prefetched version would need next.
+        """
+        if future.cancelled() or future.exception() is not None:
+            return
+        for requirement in future.result().base:
+            if not self._applies(requirement):
+                continue
+            name = canonicalize_name(requirement.name)
+            if name in self._locked or name in self._urls:
+                continue
+            try:
+                index = self._version_indexes[Package(name, None)]
+            except KeyError:
+                pass
+            else:
+                self._prefetch_preferred(
+                    name, requirement.specifier, depth - 1, index,
+                )
+                continue
+            versions_future = self._prefetch_version_index(name)
+            if versions_future is not None and depth > 1:
+                versions_future.add_done_callback(functools.partial(
+                    self._on_version_index, name, requirement.specifier,
+                    depth - 1,
+                ))
+
+    def _on_version_index(self, name, specifier, depth, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._prefetch_preferred(name, specifier, depth, future.result())
+
+    def _prefetch_preferred(self, name, specifier, depth, index):
+        if depth < 1:
+            return
+        prereleases = self.prereleases or None
+        for version in index.iter_matching(specifier, prereleases):
+            self._prefetch_specification(name, version, depth)
+            break
+
+    def _prefetch_frontier(self):
+        """Prefetch the version each undecided package would get next.
+        """
+        for package in self._solution.iter_undecided():
+            if package == ROOT:
+                continue
+            allowed = self._solution.get_allowed(package)
+            version = self._get_known(package)[allowed.bit_length() - 2]
+            self._prefetch_specification(
+                package.name, version, self.prefetch_depth,
+            )
+
+    def _start_prefetching(self):
+        if self.prefetch_depth > 0:
+            self._executor = ThreadPoolExecutor(self.prefetch_workers)
+
+    def _stop_prefetching(self):
+        with self._prefetch_lock:
+            executor, self._executor = self._executor, None
+            pending = [
+                key for key, future in self._prefetched.items()
+                if not future.done()
+            ]
+            futures = [self._prefetched.pop(key) for key in pending]
+        # Outside the lock: cancelling runs callbacks, which may take it.
+        for future in futures:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _get_matching(self, package, specifier):
+        """Versions of the package matching a specifier, as a bitmask.
+
+        Matching pre-releases are left out, unless they are allowed, the
+        specifier names one, or no final release matches.
+        """
+        key = (package.base, str(specifier))
+        try:
+            return self._matching[key]
+        except KeyError:
+            pass
+        index = self._get_version_index(package)
+        if not specifier:
+            positions = range(len(index))
+        else:
+            positions = index.iter_positions(specifier)
+        matching = prereleases = 0
+        for i in positions:
+            if index.versions[i].is_prerelease:
+                prereleases |= 2 << i
+            else:
+                matching |= 2 << i
+        if self.prereleases or specifier.prereleases or not matching:
+            matching |= prereleases
+        self._matching[key] = matching
+        return matching
+
+    def _applies(self, requirement):
+        return self.environment.applies(requirement)
+
+    def _is_python_compatible(self, spec):
+        requires_python = getattr(spec, 'requires_python', None)
+        return self.environment.allows_python(requires_python)
+
+    def _iter_packages(self, requirement):
+        """Packages a requirement is about: the base, and one per extra.
+        """
+        name = canonicalize_name(requirement.name)
+        yield Package(name, None)
+        for extra in sorted(requirement.extras):
+            yield Package(name, extra)
+
+    def _get_dependencies(self, this):
+        """Get incompatibilities from dependencies of a package version.
+
+        `this` is a term selecting one version. Returns a list of
+        `Incompatibility` instances.
+        """
+        package = this.package
+        version = this.known[this.versions.bit_length() - 2]
+        incompats = []
+        if package == ROOT:
+            requirements = self._root_requirements
+        else:
+            try:
+                spec = self._get_specification(package, version)
+            except Exception as e:  # Anything from the index.
+                logger.warning('Failed to get dependencies of %s %s: %s',
+                               package, version, e)
+                return [Incompatibility([this], 'unavailable')]
+            if not self._is_python_compatible(spec):
+                return [Incompatibility([this], 'requires-python')]
+            if not package.extra:
+                requirements = spec.base
+            else:
+                if package.extra not in spec.extras:
+                    logger.warning('%s %s has no extra %r',
+                                   package.name, version, package.extra)
+                requirements = spec.extras.get(package.extra, ())
+                # The extra requires its distribution at the same version.
+                base = self._term(package.base, this.versions)
+                incompats.append(Incompatibility(
+                    [this, self._inverse(base)], 'dependency',
+                    requirement='{}=={}'.format(package.name, version),
+                ))
+        for requirement in sorted(requirements, key=str):
+            if not self._applies(requirement):
+                continue
+            if requirement.url and package != ROOT:
+                self._check_url(requirement, package, version)
+            for dependee in self._iter_packages(requirement):
+                matching = self._get_matching(dependee, requirement.specifier)
+                if not matching:
+                    incompats.append(Incompatibility(
+                        [this], 'no-versions', requirement=requirement,
+                    ))
+                    break
+                term = self._term(dependee, matching)
+                incompats.append(Incompatibility(
+                    [this, self._inverse(term)], 'dependency',
+                    requirement=requirement,
+                ))
+        return incompats
+
+    def _collect_urls(self, requirements):
+        """Map names of direct URL requirements to `(url, version)`.
+        """
+        urls = {}
+        for requirement in requirements:
+            if not requirement.url or not self._applies(requirement):
+                continue
+            name = canonicalize_name(requirement.name)
+            try:
+                version = parse_link(requirement.url).info.version
+            except ValueError:
+                raise DirectURLError(
+                    'cannot tell the version of {} from its URL'.format(
+                        requirement,
+                    ),
+                )
+            found = urls.get(name)
+            if found is not None and found[0] != requirement.url:
+                raise DirectURLError('conflicting URLs for {}: {} and {}'
+                                     .format(name, found[0], requirement.url))
+            urls[name] = (requirement.url, version)
+        return urls
+
+    def _collect_pins(self, requirements):
+        """Map names to exact pins ("==" or "===") in their requirements.
+
+        Only these may pick a yanked version.
+        """
+        pins = collections.defaultdict(list)
+        for requirement in requirements:
+            if requirement.url or not self._applies(requirement):
+                continue
+            specs = [str(spec) for spec in iter_pins(requirement.specifier)]
+            if specs:
+                pins[canonicalize_name(requirement.name)].extend(specs)
+        return {name: ','.join(sorted(specs)) for name, specs in pins.items()}
+
+    def _check_url(self, requirement, package, version):
+        name = canonicalize_name(requirement.name)
+        found = self._urls.get(name)
+        if found is None or found[0] != requirement.url:
+            raise DirectURLError(
+                '{} {} depends on {}, which is not a top-level '
+                'requirement'.format(package.name, version, requirement),
+            )
+
+    # The algorithm.
+
+    def _add_incompatibility(self, incompat):
+        for term in incompat.terms:
+            self._incompatibilities[term.package].append(incompat)
+
+    def _propagate(self, package):
+        changed = [package]
+        while changed:
+            package = changed.pop()
+            incompats = self._incompatibilities[package]
+            for incompat in reversed(incompats):
+                result = self._propagate_incompatibility(incompat)
+                if result is _CONFLICT:
+                    root_cause = self._resolve_conflict(incompat)
+                    result = self._propagate_incompatibility(root_cause)
+                    assert result is not _CONFLICT and result is not None
+                    changed = [result]
+                    break
+                elif result is not None:
+                    changed.append(result)
+
+    def _propagate_incompatibility(self, incompat):
+        unsatisfied = None
+        for term in incompat.terms:
+            relation = self._solution.relation(term)
+            if relation == 'contradicted':
+                return None
+            elif relation == 'inconclusive':
+                if unsatisfied is not None:
+                    return None
+                unsatisfied = term
+        if unsatisfied is None:
+            return _CONFLICT
+        self._solution.derive(self._inverse(unsatisfied), incompat)
+        return unsatisfied.package
+
+    def _resolve_conflict(self, incompat):
+        logger.debug('Conflict: %s', incompat)
+        self._stats['conflicts'] += 1
+        new_incompat = False
+        while not incompat.is_failure():
+            most_recent_term = None
+            most_recent_satisfier = None
+            difference = None
+            previous_level = 1
+            for term in incompat.terms:
+                satisfier = self._solution.satisfier(term)
+                if most_recent_satisfier is None:
+                    most_recent_term = term
+                    most_recent_satisfier = satisfier
+                elif most_recent_satisfier.index < satisfier.index:
+                    previous_level = max(
+                        previous_level, most_recent_satisfier.decision_level,
+                    )
+                    most_recent_term = term
+                    most_recent_satisfier = satisfier
+                    difference = None
+                else:
+                    previous_level = max(
+                        previous_level, satisfier.decision_level,
+                    )
+                if most_recent_term is term:
+                    # The satisfier may say more than the term needs; what is
+                    # left must be satisfied by something else.
+                    versions = (
+                        most_recent_satisfier.term.versions & ~term.versions
+                    )
+                    if versions:
+                        difference = self._term(term.package, versions)
+                        satisfier = self._solution.satisfier(
+                            self._inverse(difference),
+                        )
+                        previous_level = max(
+                            previous_level, satisfier.decision_level,
+                        )
+            if (previous_level < most_recent_satisfier.decision_level or
+                    most_recent_satisfier.is_decision):
+                self._stats['backtracks'] += 1
+                self._solution.backtrack(previous_level)
+                if new_incompat:
+                    self._add_incompatibility(incompat)
+                return incompat
+
+            cause = most_recent_satisfier.cause
+            terms = [t for t in incompat.terms if t is not most_recent_term]
+            terms.extend(
+                t for t in cause.terms
+                if t.package != most_recent_satisfier.term.package
+            )
+            if difference is not None:
+                terms.append(self._inverse(difference))
+            # Terms that are always true add nothing to the conjunction.
+            terms = [
+                t for t in terms
+                if t.versions != self._get_universe(t.package)
+            ]
+            incompat = Incompatibility(terms, 'conflict', (incompat, cause))
+            new_incompat = True
+            self._stats['learned'] += 1
+            logger.debug('Learned: %s', incompat)
+        raise ResolutionImpossible(incompat)
+
+    def _get_preferred(self, package, allowed):
+        """Get a term selecting the version to try first.
+
+        This is the preferred version if there is one and it is allowed, or
+        the newest allowed version. Propagation always leaves one.
+        """
+        preference = self._preferences.get(package.name)
+        if preference is not None:
+            i = self._get_version_index(package).position(preference)
+            if i is not None and allowed & (2 << i):
+                return self._term(package, 2 << i)
+        return self._term(package, 1 << (allowed.bit_length() - 1))
+
+    def _choose_package(self):
+        """Pick the next package to decide, and try a version of it.
+
+        Returns the package to propagate, or `None` if everything required
+        is decided.
+        """
+        undecided = list(self._solution.iter_undecided())
+        if not undecided:
+            return None
+        # Fewest choices first: they are the most likely to conflict.
+        package = min(undecided, key=lambda p: (
+            _count(self._solution.get_allowed(p)), str(p),
+        ))
+        allowed = self._solution.get_allowed(package)
+        this = self._get_preferred(package, allowed)
+
+        conflict = False
+        for incompat in self._get_dependencies(this):
+            self._add_incompatibility(incompat)
+            conflict = conflict or all(
+                t.package == package or self._solution.satisfies(t)
+                for t in incompat.terms
+            )
+        if not conflict:
+            logger.debug('Selecting %s', this)
+            self._stats['decisions'] += 1
+            self._solution.decide(this)
+        return package
+
+    def resolve(self, requirements, locked=None, preferences=None):
+        """Resolve requirements, an iterable of `Requirement` instances.
+
+        `locked` maps distribution names (normalized) to pins to keep, each
+        with a `version` and its `specification`, like `LockedPackage`. A
+        locked package can only get that version, and the index is not
+        consulted about it. `preferences` maps names to versions to try
+        before the newest, e.g. from a previous resolution.
+
+        Returns a `Resolution` instance. Raises `ResolutionImpossible` if
+        the requirements cannot be satisfied together, or `DirectURLError`
+        if a direct URL requirement cannot be used.
+        """
+        self._root_requirements = list(requirements)
+        locked = locked or {}
+        urls = self._collect_urls(self._root_requirements)
+        pins = self._collect_pins(self._root_requirements)
+        # Forget what was pinned last time, or is pinned now; it was not
+        # read from the index, or must not be. Exact pins may let yanked
+        # versions in, so their version lists are read again too.
+        pinned = set(self._locked) | set(locked)
+        pinned.update(self._urls, urls)
+        pinned.update(
+            name for name in set(self._pins) | set(pins)
+            if self._pins.get(name) != pins.get(name)
+        )
+        for name in pinned:
+            self._version_indexes.pop(Package(name, None), None)
+        for name in set(self._urls) | set(urls):
+            for key in [k for k in self._specifications if k[0] == name]:
+                del self._specifications[key]
+        if pinned:
+            self._matching = {}
+        self._locked = locked
+        self._urls = urls
+        self._pins = pins
+        self._preferences = preferences or {}
+        self._incompatibilities = collections.defaultdict(list)
+        self._solution = PartialSolution(self._get_universe)
+        self._stats = collections.Counter()
+        self._add_incompatibility(Incompatibility(
+            [self._term(ROOT, NOT_SELECTED)], 'root',
+        ))
+        self._start_prefetching()
+        try:
+            package = ROOT
+            while package is not None:
+                self._propagate(package)
+                if self._executor is not None:
+                    self._prefetch_frontier()
+                package = self._choose_package()
+        finally:
+            self._stop_prefetching()
+        return self._build_resolution()
+
+    def resolve_universal(self, requirements, environments, resolve=None,
+                          preferences=None):
+        """Resolve requirements for several target environments.
+
+        `environments` is a list of `MarkerEnvironment` instances. Each
+        distinct environment is resolved in turn, sharing everything fetched
+        from the index, so after the first only what differs between them
+        is fetched. Versions picked for earlier environments are preferred,
+        to keep pins the same across environments where possible.
+
+        `resolve` is called to resolve for each environment, with the
+        requirements and a `preferences` keyword argument; `resolve()` by
+        default. Returns a `UniversalResolution`. Raises
+        `ResolutionImpossible` if any environment has no solution.
+        """
+        original = self.environment
+        preferences = dict(preferences or {})
+        if resolve is None:
+            resolve = self.resolve
+        resolutions = {}
+        try:
+            for environment in environments:
+                if environment.key in resolutions:
+                    continue
+                logger.info('Resolving for %s', environment.name)
+                self.environment = environment
+                resolution = resolve(requirements, preferences=preferences)
+                resolutions[environment.key] = resolution
+                for name, candidate in resolution.candidates.items():
+                    preferences.setdefault(name, candidate.version)
+        finally:
+            self.environment = original
+        return UniversalResolution(environments, [
+            resolutions[environment.key] for environment in environments
+        ])
+
+    def _build_resolution(self):
+        decisions = self._solution.decisions
+        candidates = {}
+        extras = collections.defaultdict(set)
+        for package, versions in decisions.items():
+            if package == ROOT:
+                continue
+            elif package.extra:
+                extras[package.name].add(package.extra)
+            else:
+                known = self._get_known(package)
+                candidates[package.name] = known[versions.bit_length() - 2]
+        dependencies = collections.defaultdict(
+            lambda: collections.defaultdict(set),
+        )
+        for package, incompats in self._incompatibilities.items():
+            for incompat in incompats:
+                if (incompat.cause != 'dependency' or
+                        len(incompat.terms) != 2):
+                    continue
+                depender, dependee = incompat.terms
+                # Each is listed under both packages; count it once.
+                if depender.package != package or package == ROOT:
+                    continue
+                if not decisions.get(package, 0) & depender.versions:
+                    continue
+                if dependee.package.name == package.name:
+                    continue
+                dependencies[package.name][dependee.package.name].add(
+                    incompat.requirement,
+                )
+        resolved = {
+            name: Candidate(
+                name, version, extras=extras.get(name),
+                url=self._urls.get(name, (None, None))[0],
+            )
+            for name, version in candidates.items()
+        }
+        specifications = {
+            name: self._specifications[(name, version)]
+            for name, version in candidates.items()
+        }
+        statistics = ResolutionStatistics(
+            decisions=self._stats['decisions'],
+            backtracks=self._stats['backtracks'],
+            conflicts=self._stats['conflicts'],
+            learned=self._stats['learned'],
+            packages=len(self._version_indexes),
+            prefetched=self._stats['prefetched'],
+            prefetch_hits=self._stats['prefetch_hits'],
+        )
+        return Resolution(
+            resolved, specifications,
+            {name: dict(deps) for name, deps in dependencies.items()},
+            statistics,
+        )
+
+
+_ROOT_KNOWN = [ROOT_VERSION]
+
+_CONFLICT = object()
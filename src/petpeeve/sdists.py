@@ -0,0 +1,317 @@
+import collections
+import email.parser
+import logging
+import os
+import posixpath
+import shutil
+import sys
+import tarfile
+import tempfile
+import threading
+import zipfile
+
+from petpeeve.pip_internal.utils.misc import unpack_file
+
+from .builds import BuildError, get_default_scheduler, run_build
+from .instrumentation import timed
+from .utils import download_file, load_metadata
+from .wheels import PipLink
+
+try:
+    from pip._vendor import pytoml as toml
+except ImportError:
+    try:
+        from pip._vendor import tomli as toml
+    except ImportError:
+        from pip._vendor import toml
+
+
+logger = logging.getLogger('petpeeve.sdists')
+
+
+# Metadata prepared from this many sdists is kept, so it is not prepared
+# again the next time it is asked for.
+PREPARED_METADATA_CACHE_SIZE = 256
+
+# Requires-Dist in PKG-INFO can be trusted from this version on (PEP 643).
+STATIC_METADATA_VERSION = (2, 2)
+
+# Runs a PEP 517 backend's prepare_metadata_for_build_wheel hook. Arguments
+# are the backend, the output directory, and the backend-path entries.
+PREPARE_METADATA_SCRIPT = """
+import importlib, os, sys
+backend_name, metadata_dir = sys.argv[1:3]
+sys.path[:0] = [os.path.abspath(p) for p in sys.argv[3:]]
+module_name, _, obj_path = backend_name.partition(':')
+backend = importlib.import_module(module_name)
+for name in filter(None, obj_path.split('.')):
+    backend = getattr(backend, name)
+backend.prepare_metadata_for_build_wheel(metadata_dir)
+"""
+
+# Like pip, so setup.py scripts importing only distutils get setuptools too.
+EGG_INFO_SCRIPT = """
+import setuptools, sys
+__file__ = 'setup.py'
+sys.argv[0] = __file__
+with open(__file__) as f:
+    code = f.read().replace('\\r\\n', '\\n')
+exec(compile(code, __file__, 'exec'))
+"""
+
+
+def _parse_metadata_version(value):
+    try:
+        return tuple(int(p) for p in value.strip().split('.'))
+    except ValueError:
+        return ()
+
+
+def _is_static(data):
+    """Check whether PKG-INFO content reliably lists the dependencies.
+    """
+    headers = email.parser.Parser().parsestr(
+        data.decode('utf-8', 'replace'), headersonly=True,
+    )
+    version = _parse_metadata_version(headers.get('Metadata-Version', ''))
+    if version < STATIC_METADATA_VERSION:
+        return False
+    dynamic = headers.get_all('Dynamic') or []
+    return not any(d.strip().lower() == 'requires-dist' for d in dynamic)
+
+
+def _is_top_level(name, basename):
+    """Check if an archive member is `basename` in the top-level directory.
+
+    sdists contain a single directory, named after the distribution.
+    """
+    dirname, filename = posixpath.split(name)
+    return filename == basename and dirname and '/' not in dirname
+
+
+def _read_archive_member(path, basename):
+    """Read a file in the archive's top-level directory.
+
+    Returns `None` if it is not found.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for name in zf.namelist():
+                if _is_top_level(name, basename):
+                    return zf.read(name)
+        return None
+    with tarfile.open(path) as tf:
+        for member in tf:
+            if member.isfile() and _is_top_level(member.name, basename):
+                return tf.extractfile(member).read()
+    return None
+
+
+def read_pkg_info(path):
+    """Read static metadata from an sdist's PKG-INFO without unpacking it.
+
+    Returns a `distlib.metadata.Metadata` instance, or `None` if the sdist
+    does not have PKG-INFO with static dependencies (Metadata 2.2+, with
+    Requires-Dist not marked as dynamic).
+    """
+    try:
+        data = _read_archive_member(path, 'PKG-INFO')
+    except (tarfile.TarError, zipfile.BadZipfile, IOError, OSError) as e:
+        logger.debug('Failed to read PKG-INFO from %s: %s', path, e)
+        return None
+    if data is None or not _is_static(data):
+        return None
+    return load_metadata(data)
+
+
+def _get_build_backend(source_dir):
+    """Read the PEP 517 build backend from pyproject.toml.
+
+    Returns a 2-tuple `(backend, backend_path)`, or `(None, [])` if the
+    project does not declare a backend.
+    """
+    try:
+        with open(os.path.join(source_dir, 'pyproject.toml')) as f:
+            content = f.read()
+    except (IOError, OSError):
+        return None, []
+    try:
+        data = toml.loads(content)
+    except Exception as e:  # Each TOML library has its own error class.
+        logger.debug('Failed to parse pyproject.toml: %s', e)
+        return None, []
+    build_system = data.get('build-system', {})
+    return (
+        build_system.get('build-backend'),
+        build_system.get('backend-path', []),
+    )
+
+
+def _find_info_dir(directory, suffix):
+    for name in os.listdir(directory):
+        if name.endswith(suffix):
+            return os.path.join(directory, name)
+    raise ValueError('no {} directory produced'.format(suffix))
+
+
+def _prepare_metadata_pep517(source_dir, backend, backend_path, name, timeout):
+    metadata_dir = tempfile.mkdtemp()
+    try:
+        run_build(
+            [sys.executable, '-c', PREPARE_METADATA_SCRIPT,
+             backend, metadata_dir] + list(backend_path),
+            cwd=source_dir, name=name, timeout=timeout,
+        )
+        info_dir = _find_info_dir(metadata_dir, '.dist-info')
+        with open(os.path.join(info_dir, 'METADATA'), 'rb') as f:
+            return load_metadata(f.read())
+    finally:
+        shutil.rmtree(metadata_dir, ignore_errors=True)
+
+
+def _iter_requires_dist(requires_txt):
+    """Convert setuptools' requires.txt into Requires-Dist entries.
+
+    Sections look like `[extra]`, `[:marker]`, or `[extra:marker]`.
+    """
+    extra = marker = None
+    for line in requires_txt.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('['):
+            extra, _, marker = line.strip('[]').partition(':')
+            continue
+        markers = []
+        if marker:
+            markers.append('({})'.format(marker))
+        if extra:
+            markers.append('extra == "{}"'.format(extra))
+        if markers:
+            line = '{}; {}'.format(line, ' and '.join(markers))
+        yield line
+
+
+def _prepare_metadata_egg_info(source_dir, name, timeout):
+    egg_base = tempfile.mkdtemp()
+    try:
+        run_build(
+            [sys.executable, '-c', EGG_INFO_SCRIPT,
+             'egg_info', '--egg-base', egg_base],
+            cwd=source_dir, name=name, timeout=timeout,
+        )
+        info_dir = _find_info_dir(egg_base, '.egg-info')
+        with open(os.path.join(info_dir, 'PKG-INFO'), 'rb') as f:
+            headers = email.parser.Parser().parsestr(
+                f.read().decode('utf-8', 'replace'), headersonly=True,
+            )
+        try:
+            with open(os.path.join(info_dir, 'requires.txt')) as f:
+                requires_txt = f.read()
+        except (IOError, OSError):
+            requires_txt = ''
+    finally:
+        shutil.rmtree(egg_base, ignore_errors=True)
+    lines = [
+        'Metadata-Version: 2.1',
+        'Name: {}'.format(headers['Name']),
+        'Version: {}'.format(headers['Version']),
+    ]
+    lines.extend(
+        'Requires-Dist: {}'.format(r)
+        for r in _iter_requires_dist(requires_txt)
+    )
+    return load_metadata('\n'.join(lines).encode('utf-8'))
+
+
+@timed('sdist.prepare_metadata')
+def _prepare_metadata(link, transport, timeout):
+    """Get metadata of an sdist, without building a wheel if possible.
+
+    Returns a `distlib.metadata.Metadata` instance, or `None` if only a
+    wheel build can tell.
+    """
+    container = tempfile.mkdtemp()
+    try:
+        sdist_path = download_file(
+            link.url, filename=link.filename, container=container,
+            checksum=link.checksum, transport=transport,
+        )
+        metadata = read_pkg_info(sdist_path)
+        if metadata is not None:
+            logger.debug('Read static metadata from %s', link.filename)
+            return metadata
+
+        source_dir = os.path.join(container, 'source')
+        unpack_file(sdist_path, source_dir, None, PipLink(link))
+        backend, backend_path = _get_build_backend(source_dir)
+        if backend:
+            try:
+                return _prepare_metadata_pep517(
+                    source_dir, backend, backend_path, link.filename, timeout,
+                )
+            except (BuildError, ValueError, IOError, OSError) as e:
+                logger.debug('PEP 517 metadata hook failed: %s', e)
+        if not os.path.exists(os.path.join(source_dir, 'setup.py')):
+            return None
+        try:
+            return _prepare_metadata_egg_info(
+                source_dir, link.filename, timeout,
+            )
+        except (BuildError, KeyError, ValueError, IOError, OSError) as e:
+            logger.debug('egg_info failed: %s', e)
+        return None
+    finally:
+        shutil.rmtree(container, ignore_errors=True)
+
+
+_prepared = collections.OrderedDict()
+
+_prepared_lock = threading.Lock()
+
+
+def _get_metadata_key(link):
+    return ('metadata', link.url, link.checksum)
+
+
+def submit_metadata(link, transport=None, scheduler=None):
+    """Schedule preparing metadata of the sdist link.
+
+    This runs on `scheduler`, a `BuildScheduler`, or the default one if not
+    given, like wheel builds. Returns a future resolving to a
+    `distlib.metadata.Metadata` instance, or `None` if a wheel needs to be
+    built to know.
+    """
+    if scheduler is None:
+        scheduler = get_default_scheduler()
+    return scheduler.submit(
+        _get_metadata_key(link), _prepare_metadata, link, transport,
+        scheduler.timeout,
+    )
+
+
+def get_sdist_metadata(link, transport=None):
+    """Get metadata of the sdist link, without building a wheel if possible.
+
+    Static PKG-INFO (Metadata 2.2+) is read straight from the archive.
+    Otherwise the PEP 517 `prepare_metadata_for_build_wheel` hook is called
+    if the project declares a backend, and `setup.py egg_info` is run as the
+    last resort. Returns `None` if none of these work.
+
+    The work runs on the default build scheduler. Results for links with a
+    checksum are remembered, so asking again does not repeat it.
+    """
+    key = _get_metadata_key(link)
+    with _prepared_lock:
+        if key in _prepared:
+            # Re-insert to mark as recently used.
+            metadata = _prepared[key] = _prepared.pop(key)
+            return metadata
+    metadata = submit_metadata(link, transport=transport).result()
+    # A URL without a checksum can point to anything; don't remember it.
+    if link.checksum:
+        with _prepared_lock:
+            _prepared[key] = metadata
+            if len(_prepared) > PREPARED_METADATA_CACHE_SIZE:
+                _prepared.popitem(last=False)
+    return metadata
@@ -0,0 +1,70 @@
+import collections
+import sys
+import warnings
+
+from .pip_internal import pep425tags
+
+
+TargetEnvironment = collections.namedtuple('TargetEnvironment', [
+    'versions',         # Python versions without dots, e.g. ('37', '36').
+    'platform',         # e.g. 'win_amd64'.
+    'implementation',   # e.g. 'cp'.
+    'abi',              # e.g. 'cp37m'.
+])
+TargetEnvironment.__new__.__defaults__ = (None, None, None, None)
+
+
+def _get_supported_tags(target):
+    with warnings.catch_warnings():
+        # Ignore "Python ABI tag may be incorrect" warnings on Windows.
+        # Windows wheels don't specify those anyway.
+        if sys.platform.startswith('win'):
+            warnings.simplefilter('ignore')
+        if target is None:
+            return pep425tags.get_supported()
+        return pep425tags.get_supported(
+            versions=(list(target.versions) if target.versions else None),
+            platform=target.platform,
+            impl=target.implementation,
+            abi=target.abi,
+        )
+
+
+_tag_priorities = {}
+
+
+def get_tag_priorities(target=None):
+    """Get supported tags of a target environment, ranked.
+
+    Returns a mapping of each supported `(implementation, abi, platform)`
+    triple to its priority. Lower numbers are better. The environment we
+    run in is used if `target` (a `TargetEnvironment`) is `None`.
+
+    This is only calculated once for each target.
+    """
+    try:
+        return _tag_priorities[target]
+    except KeyError:
+        pass
+    priorities = {}
+    for i, tag in enumerate(_get_supported_tags(target)):
+        priorities.setdefault(tag, i)
+    _tag_priorities[target] = priorities
+    return priorities
+
+
+def get_wheel_priority(implementation_tag, abi_tag, platform_tag, target=None):
+    """Find the best priority of a wheel's tags in a target environment.
+
+    Each tag can be a compressed tag set (PEP 425), e.g. "py2.py3". Returns
+    `None` if the wheel is not compatible at all.
+    """
+    priorities = get_tag_priorities(target)
+    best = None
+    for impl in implementation_tag.split('.'):
+        for abi in abi_tag.split('.'):
+            for plat in platform_tag.split('.'):
+                priority = priorities.get((impl, abi, plat))
+                if priority is not None and (best is None or priority < best):
+                    best = priority
+    return best
@@ -0,0 +1,69 @@
+from pip._vendor import requests
+from pip._vendor.requests.adapters import HTTPAdapter
+
+from .instrumentation import count, timed
+
+
+# Should be reasonable?
+DEFAULT_POOL_CONNECTIONS = 10   # Number of hosts to keep connections for.
+DEFAULT_POOL_MAXSIZE = 10       # Connections to keep alive per host.
+DEFAULT_TIMEOUT = 30
+
+
+class Transport(object):
+    """HTTP transport shared by everything talking to an index.
+
+    This wraps a single `requests.Session` so connections are pooled and kept
+    alive between requests, instead of doing a TCP (and TLS) handshake for
+    each one.
+
+    `pool_connections` is the number of hosts to keep pools for, and
+    `pool_maxsize` the number of connections kept for each host. If
+    `pool_block` is true, `pool_maxsize` is also a hard limit of concurrent
+    connections to a host. `timeout` is passed to each request, unless the
+    caller specifies its own.
+
+    If `cache` (an `HTTPCache` instance) is given, metadata requests made
+    with `get_metadata()` go through it.
+    """
+    def __init__(
+            self, pool_connections=DEFAULT_POOL_CONNECTIONS,
+            pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_block=False,
+            max_retries=0, timeout=DEFAULT_TIMEOUT, cache=None):
+        self.timeout = timeout
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+            pool_block=pool_block, max_retries=max_retries,
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    @timed('http.request')
+    def get(self, url, **kwargs):
+        """Send a GET request. Arguments are the same as `requests.get`.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        response = self.session.get(url, **kwargs)
+        count('http.requests')
+        # A streamed body is read, and counted, later by the caller.
+        if not kwargs.get('stream'):
+            count('http.bytes', len(response.content))
+        return response
+
+    def get_metadata(self, url, headers=None):
+        """GET a metadata document, e.g. a simple page, through the cache.
+        """
+        if self.cache is None:
+            return self.get(url, headers=headers)
+        return self.cache.get(url, fetch=self.get, headers=headers)
@@ -1,34 +1,119 @@
 import atexit
+import codecs
+import hashlib
+import io
 import os
 import shutil
 import tempfile
 
+from pip._vendor.distlib.metadata import Metadata
+
+from ._compat.os import makedirs, replace
+from .instrumentation import count
+
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
 
 class DownloadIntegrityError(ValueError):
     pass
 
 
-def download_file(url, filename=None, container=None, check=None):
-    from pip._vendor import requests
-    response = requests.get(url, stream=True)
+def new_checksum_hash(checksum):
+    """Create a hash object to verify data against a checksum.
+
+    `checksum` is in form `<hash name>=<hex digest>`, e.g. "sha256=abcd".
+    Returns a 2-tuple `(hash, expected_digest)`.
+    """
+    htype, hvalue = checksum.split('=', 1)
+    return hashlib.new(htype), hvalue
+
+
+def check_checksum(data, checksum):
+    """Check data against a checksum.
+
+    Raises `DownloadIntegrityError` if the data does not match.
+    """
+    h, expected = new_checksum_hash(checksum)
+    h.update(data)
+    if h.hexdigest() != expected:
+        raise DownloadIntegrityError('expected {}, but got {}'.format(
+            expected, h.hexdigest(),
+        ))
+
+
+def load_metadata(data):
+    """Load distribution metadata, e.g. content of a METADATA file.
+
+    Returns a `distlib.metadata.Metadata` instance.
+    """
+    wrapper = codecs.getreader('utf-8')
+    return Metadata(fileobj=wrapper(io.BytesIO(data)))
+
+
+def download_file(
+        url, filename=None, container=None, checksum=None, transport=None):
+    """Download a file from URL.
+
+    The content is streamed in chunks into a temporary file in `container`
+    (a new temporary directory if not given), and only renamed into place
+    after it is verified against `checksum`, so memory usage does not grow
+    with the file size, and a half-downloaded file is never visible.
+
+    `transport` is used to send the request. A plain `requests.get` call is
+    made if it is not given.
+    """
+    if transport is None:
+        from pip._vendor import requests
+        response = requests.get(url, stream=True)
+    else:
+        response = transport.get(url, stream=True)
     response.raise_for_status()
 
     if not filename:
         filename = url.rsplit('/', 1)[-1]
-    data = response.content
-    if callable(check):
-        try:
-            check(data)
-        except ValueError as e:
-            raise DownloadIntegrityError(str(e))
     if container is None:
         container = tempfile.mkdtemp()
         atexit.register(shutil.rmtree, container, ignore_errors=True)
     else:
-        os.makedirs(container)
-    path = os.path.join(container, filename)
-    with open(path, 'wb') as f:
-        f.write(data)
+        makedirs(container)
+    if checksum:
+        h, expected = new_checksum_hash(checksum)
+    else:
+        h = expected = None
+
+    fd, temp_path = tempfile.mkstemp(
+        dir=container, prefix='.{}.'.format(filename), suffix='.part',
+    )
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            # Read raw data. Servers may apply Content-Encoding to archives,
+            # but we want the file as-is to match the checksum.
+            chunks = response.raw.stream(
+                DOWNLOAD_CHUNK_SIZE, decode_content=False,
+            )
+            try:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if h is not None:
+                        h.update(chunk)
+                    f.write(chunk)
+            finally:
+                # Streamed bodies are not counted by `Transport.get()`.
+                count('http.bytes', size)
+        if h is not None and h.hexdigest() != expected:
+            raise DownloadIntegrityError('expected {}, but got {}'.format(
+                expected, h.hexdigest(),
+            ))
+        path = os.path.join(container, filename)
+        replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    finally:
+        response.close()
     return path
 
 
@@ -36,3 +121,23 @@ def is_version_specified(specifier, version):
     for _ in specifier.filter([version]):
         return True
     return False
+
+
+def iter_pins(specifier):
+    """Iterate through clauses of `specifier` naming an exact version.
+
+    These are "===" clauses, and "==" ones without a wildcard.
+    """
+    for spec in specifier:
+        if spec.operator == '===':
+            yield spec
+        elif spec.operator == '==' and not spec.version.endswith('.*'):
+            yield spec
+
+
+def is_version_pinned(specifier, version):
+    """Whether `specifier` matches `version` and pins an exact version.
+    """
+    for _ in iter_pins(specifier):
+        return is_version_specified(specifier, version)
+    return False
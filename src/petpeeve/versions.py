@@ -0,0 +1,148 @@
+import bisect
+
+from pip._vendor.packaging.specifiers import Specifier
+from pip._vendor.packaging.version import InvalidVersion, Version
+
+
+def _get_compatible_upper_bound(version):
+    """Get the exclusive upper bound of `~=version`, e.g. 3.dev0 for ~=2.3.
+    """
+    prefix = version.release[:-1]
+    prefix = prefix[:-1] + (prefix[-1] + 1,)
+    return Version('{}!{}.dev0'.format(
+        version.epoch, '.'.join(str(p) for p in prefix),
+    ))
+
+
+def _get_bounds(specifier, versions):
+    """Narrow sorted versions to the range allowed by a specifier set.
+
+    Only range clauses (<, <=, >, >=, ~=) and exact matches are used; they
+    are necessary conditions for a version to match, so everything outside
+    the range can be skipped without checking. Returns a 2-tuple `(lo, hi)`.
+    """
+    lo, hi = 0, len(versions)
+    for spec in specifier:
+        if not isinstance(spec, Specifier):     # Legacy clause, no shortcut.
+            continue
+        op = spec.operator
+        if op not in ('<', '<=', '>', '>=', '~=', '=='):
+            continue
+        if spec.version.endswith('.*'):
+            continue
+        try:
+            bound = Version(spec.version)
+        except InvalidVersion:
+            continue
+        if op == '==':
+            # Matches are the version and its local variants (1.0+abc),
+            # which sort right after it.
+            lo = max(lo, bisect.bisect_left(versions, bound, lo, hi))
+            end = lo
+            while end < hi and spec.contains(versions[end], True):
+                end += 1
+            hi = end
+        elif op in ('>=', '~='):
+            lo = max(lo, bisect.bisect_left(versions, bound, lo, hi))
+            if op == '~=' and len(bound.release) > 1:
+                upper = _get_compatible_upper_bound(bound)
+                hi = min(hi, bisect.bisect_left(versions, upper, lo, hi))
+        elif op == '>':
+            lo = max(lo, bisect.bisect_right(versions, bound, lo, hi))
+        elif op == '<':
+            hi = min(hi, bisect.bisect_left(versions, bound, lo, hi))
+        else:
+            hi = min(hi, bisect.bisect_right(versions, bound, lo, hi))
+        if lo >= hi:
+            break
+    return lo, hi
+
+
+class VersionIndex(object):
+    """Sorted, distinct versions of a package.
+
+    Versions are parsed once when the index is built. `filter()` narrows
+    them down with bisect before running the full specifier check, so only
+    versions in the allowed range are looked at.
+    """
+    __slots__ = ['versions']
+
+    def __init__(self, versions):
+        self.versions = sorted(set(versions))
+
+    def __repr__(self):
+        return '<{type} ({count} versions)>'.format(
+            type=type(self).__name__,
+            count=len(self.versions),
+        )
+
+    def __iter__(self):
+        return iter(self.versions)
+
+    def __len__(self):
+        return len(self.versions)
+
+    def __contains__(self, version):
+        return self.position(version) is not None
+
+    def position(self, version):
+        """Get the position of a version in `versions`, or `None`.
+        """
+        i = bisect.bisect_left(self.versions, version)
+        if i < len(self.versions) and self.versions[i] == version:
+            return i
+        return None
+
+    def filter(self, specifier, prereleases=None):
+        """Find versions matching a `SpecifierSet`, newest first.
+
+        Pre-releases are handled like `SpecifierSet.filter()`.
+        """
+        lo, hi = _get_bounds(specifier, self.versions)
+        if lo >= hi:
+            return []
+        matched = specifier.filter(
+            reversed(self.versions[lo:hi]), prereleases=prereleases,
+        )
+        return list(matched)
+
+    def iter_positions(self, specifier):
+        """Iterate through positions in `versions` of matching versions.
+
+        Positions are yielded in ascending order. Pre-releases match like
+        final releases, for callers that already chose which versions to
+        consider.
+        """
+        lo, hi = _get_bounds(specifier, self.versions)
+        for i in range(lo, hi):
+            if specifier.contains(self.versions[i], prereleases=True):
+                yield i
+
+    def iter_matching(self, specifier, prereleases=False):
+        """Iterate through versions matching a `SpecifierSet`, newest first.
+
+        Versions are checked one by one as the iterator advances, so
+        stopping early skips the rest of the work.
+
+        Pre-releases are only yielded if `prereleases` is true, or the
+        specifier explicitly mentions one (e.g. ">=2.0b1"). If `prereleases`
+        is `None`, matching pre-releases are also yielded if no final
+        releases match, like `SpecifierSet.filter()`.
+        """
+        lo, hi = _get_bounds(specifier, self.versions)
+        allow_prereleases = prereleases or specifier.prereleases
+        found_prereleases = []
+        yielded = False
+        for i in range(hi - 1, lo - 1, -1):
+            version = self.versions[i]
+            if not specifier.contains(version, prereleases=True):
+                continue
+            if version.is_prerelease and not allow_prereleases:
+                if prereleases is None and not yielded:
+                    found_prereleases.append(version)
+                continue
+            yielded = True
+            yield version
+        if not yielded:
+            for version in found_prereleases:
+                yield version
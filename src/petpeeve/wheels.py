@@ -1,7 +1,6 @@
 import atexit
 import os
 import shutil
-import subprocess
 import sys
 import tempfile
 import warnings
@@ -9,6 +8,10 @@ import warnings
 from petpeeve.pip_internal import cache, index, locations
 from petpeeve.pip_internal.utils.misc import unpack_file
 
+from ._compat.os import makedirs, replace
+from .builds import BuildError, get_default_scheduler, run_build
+from .instrumentation import count, timed
+from .tags import get_wheel_priority
 from .utils import download_file
 
 
@@ -37,52 +40,131 @@ class PipLink(object):
         return self.__link.checksum.split('=', 1)[-1]
 
 
-def get_wheel_path(link, offline):
-    """Get the wheel from cache, or download it into the cache and return it.
+def _get_cache_dir(link):
+    """Get the wheel cache directory for a link.
+
+    This is pip's own wheel cache, keyed by the link's URL and checksum, so
+    wheels pip built from an sdist are found too, and vice versa.
     """
     wheel_cache = cache.SimpleWheelCache(
         locations.USER_CACHE_DIR,
         index.FormatControl(set(), set()),
     )
-    cache_dir = wheel_cache.get_path_for_link(PipLink(link))
+    return wheel_cache.get_path_for_link(PipLink(link))
+
+
+def get_wheel_path(link, offline, transport=None):
+    """Get the wheel from cache, or download it into the cache and return it.
+    """
+    cache_dir = _get_cache_dir(link)
     cache_path = os.path.join(cache_dir, link.filename)
     if os.path.exists(cache_path):
         return cache_path
     elif offline:
         return None
-    downloaded_path = download_file(
-        link.url, filename=link.filename, check=link.check_download,
+    # Download straight into the cache, so no cross-device move is needed.
+    return download_file(
+        link.url, filename=link.filename, container=cache_dir,
+        checksum=link.checksum, transport=transport,
     )
-    if not os.path.exists(cache_dir):
-        os.makedirs(cache_dir)
-    shutil.move(downloaded_path, cache_path)
-    return cache_path
 
 
-def get_built_wheel_path(link):
+def _get_wheel_priority(filename):
+    impl, abi, plat = filename[:-len('.whl')].split('-')[-3:]
+    return get_wheel_priority(impl, abi, plat)
+
+
+def find_built_wheel_path(link):
+    """Find a wheel built from the sdist link in the wheel cache.
+
+    Returns the path to the most compatible wheel, or `None` if no
+    compatible wheels are found.
+    """
+    cache_dir = _get_cache_dir(link)
+    try:
+        filenames = os.listdir(cache_dir)
+    except OSError:
+        return None
+    found = []
+    for fn in filenames:
+        if not fn.endswith('.whl'):
+            continue
+        try:
+            priority = _get_wheel_priority(fn)
+        except ValueError:  # Not a valid wheel name.
+            continue
+        if priority is not None:
+            found.append((priority, fn))
+    if not found:
+        return None
+    return os.path.join(cache_dir, min(found)[1])
+
+
+@timed('sdist.build_wheel')
+def _build_wheel(link, transport, timeout):
     """Download an sdist from link, and build a wheel out of it.
+
+    The wheel is stored into the wheel cache. Returns the path to it, or
+    `None` if the build fails.
     """
     sdist_path = download_file(
-        link.url, filename=link.filename, check=link.check_download,
+        link.url, filename=link.filename, checksum=link.checksum,
+        transport=transport,
     )
-    container = os.path.dirname(sdist_path)
 
     unpacked_dir = tempfile.mkdtemp()
     atexit.register(shutil.rmtree, unpacked_dir, ignore_errors=True)
     unpack_file(sdist_path, unpacked_dir, None, PipLink(link))
 
-    wheel_content_dir = tempfile.mkdtemp()
-    atexit.register(shutil.rmtree, wheel_content_dir, ignore_errors=True)
-    proc = subprocess.Popen(
-        [sys.executable, 'setup.py', 'bdist_wheel', '-d', container],
-        cwd=unpacked_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-    )
-    stdout, stderr = proc.communicate()
-    if proc.returncode != 0:
-        warnings.warn('failed to build wheel\n{}'.format(stderr))
+    # Build into the cache directory, so the wheel can be renamed into place.
+    cache_dir = _get_cache_dir(link)
+    makedirs(cache_dir)
+    wheel_content_dir = tempfile.mkdtemp(dir=cache_dir, prefix='.build-')
+    try:
+        run_build(
+            [sys.executable, 'setup.py', 'bdist_wheel',
+             '-d', wheel_content_dir],
+            cwd=unpacked_dir, name=link.filename, timeout=timeout,
+        )
+        for fn in os.listdir(wheel_content_dir):
+            if fn.endswith('.whl'):
+                path = os.path.join(cache_dir, fn)
+                replace(os.path.join(wheel_content_dir, fn), path)
+                return path
+    except BuildError as e:
+        warnings.warn('failed to build wheel\n{}'.format(e))
         return None
-    for fn in os.listdir(container):
-        if fn != os.path.basename(sdist_path):
-            return os.path.join(container, fn)
+    finally:
+        shutil.rmtree(wheel_content_dir, ignore_errors=True)
     warnings.warn('failed to find built wheel')
     return None
+
+
+def submit_build(link, transport=None, scheduler=None):
+    """Schedule building a wheel from the sdist link.
+
+    The build runs on `scheduler`, a `BuildScheduler`, or the default one if
+    not given. Returns a future resolving to the built wheel's path (or
+    `None` if the build fails). A build already in flight for the same link
+    is shared.
+    """
+    if scheduler is None:
+        scheduler = get_default_scheduler()
+    return scheduler.submit(
+        _get_cache_dir(link), _build_wheel, link, transport, scheduler.timeout,
+    )
+
+
+@timed('sdist.get_built_wheel')
+def get_built_wheel_path(link, offline=False, transport=None):
+    """Get a wheel built from the sdist link.
+
+    A wheel built before is taken from the wheel cache. Otherwise, unless
+    `offline` is true, the sdist is downloaded and a wheel is built from it
+    and stored into the cache, so it does not need to be built again.
+    """
+    path = find_built_wheel_path(link)
+    count('wheel_cache.hits' if path else 'wheel_cache.misses')
+    if path or offline:
+        return path
+    return submit_build(link, transport=transport).result()